@@ -0,0 +1,324 @@
+import os
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time, timedelta
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route, Mount
+from database import database_url, async_database_url, engine_options, apply_sqlite_pragmas, async_write_transaction
+from models import User, Doctor, Patient, Department, Appointment, DoctorAvailability, FreeSlot
+from booking import windows_statement, booked_times_statement, slot_error, is_slot_conflict, ALREADY_BOOKED
+from stats import track_counters
+from slots import track_slot_index
+
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+SECRET_KEY = os.environ.get('SESSION_SECRET', 'dev-secret-key-please-change')
+TOKEN_MAX_AGE = int(os.environ.get('API_TOKEN_MAX_AGE', 12 * 3600))
+MAX_PAGE = 100
+MAX_RANGE_DAYS = 31
+
+class ApiSession(Session):
+    pass
+
+# Same counters and free-slot index upkeep as db.session in the Flask app;
+# the listeners run inside the async session's greenlet-backed flush.
+track_counters(ApiSession)
+track_slot_index(ApiSession)
+
+def _engine_url():
+    # Flask-SQLAlchemy resolves a relative SQLite path against instance/.
+    url = make_url(database_url())
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:' \
+            and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(INSTANCE_PATH, url.database))
+    return url.render_as_string(hide_password=False)
+
+def create_engine():
+    url = _engine_url()
+    engine = create_async_engine(async_database_url(url), **engine_options(url))
+    if url.startswith('sqlite') and os.environ.get('SQLITE_TUNING', '1') != '0':
+        event.listen(engine.sync_engine, 'connect', lambda dbapi_connection, record: apply_sqlite_pragmas(dbapi_connection))
+    return engine
+
+engine = create_engine()
+sessions = async_sessionmaker(engine, sync_session_class=ApiSession, expire_on_commit=False)
+tokens = URLSafeTimedSerializer(SECRET_KEY, salt='healflow-api-token')
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+async def api_error(request, exc):
+    return JSONResponse({'error': exc.message}, status_code=exc.status)
+
+def _int_arg(request, name, default=None, minimum=1, maximum=None):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ApiError(400, f'{name} must be an integer')
+    value = max(value, minimum)
+    return min(value, maximum) if maximum else value
+
+def _date_arg(request, name, default):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(400, f'{name} must be YYYY-MM-DD')
+
+def _time(value):
+    return value.strftime('%H:%M')
+
+def doctor_json(row):
+    return {
+        'id': row.id,
+        'full_name': row.full_name,
+        'department_id': row.department_id,
+        'department': row.department,
+        'qualification': row.qualification,
+        'experience_years': row.experience_years,
+        'consultation_fee': row.consultation_fee,
+    }
+
+def appointment_json(appointment):
+    return {
+        'id': appointment.id,
+        'patient_id': appointment.patient_id,
+        'doctor_id': appointment.doctor_id,
+        'date': appointment.appointment_date.isoformat(),
+        'time': _time(appointment.appointment_time),
+        'status': appointment.status,
+        'reason': appointment.reason,
+        'updated_at': appointment.updated_at.isoformat() if appointment.updated_at else None,
+    }
+
+async def current_identity(request, session):
+    # Bearer tokens from POST /api/v1/auth/token; the role and profile id are
+    # re-read so a deleted or deactivated account loses access at once.
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        raise ApiError(401, 'Missing bearer token')
+    try:
+        user_id = tokens.loads(header[len('Bearer '):], max_age=TOKEN_MAX_AGE)['uid']
+    except SignatureExpired:
+        raise ApiError(401, 'Token expired')
+    except (BadSignature, KeyError, TypeError):
+        raise ApiError(401, 'Invalid token')
+    row = (await session.execute(
+        select(User.id, User.role, User.active, Doctor.id.label('doctor_id'), Patient.id.label('patient_id'))
+        .outerjoin(Doctor, Doctor.user_id == User.id).outerjoin(Patient, Patient.user_id == User.id)
+        .where(User.id == user_id)
+    )).first()
+    if row is None or row.active is False:
+        raise ApiError(401, 'Account is not active')
+    return row
+
+def _doctor_query():
+    return select(
+        Doctor.id, Doctor.full_name, Doctor.department_id, Department.name.label('department'),
+        Doctor.qualification, Doctor.experience_years, Doctor.consultation_fee
+    ).join(Department, Doctor.department_id == Department.id)
+
+async def issue_token(request):
+    try:
+        data = await request.json()
+        username, password = data['username'], data['password']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError(400, 'username and password are required')
+    async with sessions() as session:
+        user = (await session.execute(select(User).where(User.username == username))).scalar_one_or_none()
+    # Password hashing is CPU bound; keep it off the event loop.
+    if user is None or not user.active or not await run_in_threadpool(user.check_password, password):
+        raise ApiError(401, 'Invalid username or password')
+    return JSONResponse({'token': tokens.dumps({'uid': user.id}), 'expires_in': TOKEN_MAX_AGE, 'role': user.role})
+
+async def list_doctors(request):
+    limit = _int_arg(request, 'limit', 25, maximum=MAX_PAGE)
+    after = _int_arg(request, 'after', minimum=0)
+    department_id = _int_arg(request, 'department_id')
+    search = request.query_params.get('search', '').strip()
+    query = _doctor_query()
+    if department_id:
+        query = query.where(Doctor.department_id == department_id)
+    if search:
+        query = query.where(Doctor.full_name.ilike(f'%{search}%') | Department.name.ilike(f'%{search}%'))
+    if after:
+        query = query.where(Doctor.id > after)
+    async with sessions() as session:
+        await current_identity(request, session)
+        rows = (await session.execute(query.order_by(Doctor.id).limit(limit + 1))).all()
+    return JSONResponse({
+        'items': [doctor_json(row) for row in rows[:limit]],
+        'next_after': rows[limit - 1].id if len(rows) > limit else None,
+    })
+
+async def get_doctor(request):
+    async with sessions() as session:
+        await current_identity(request, session)
+        row = (await session.execute(_doctor_query().where(Doctor.id == request.path_params['doctor_id']))).first()
+    if row is None:
+        raise ApiError(404, 'Doctor not found')
+    return JSONResponse(doctor_json(row))
+
+async def doctor_availability(request):
+    doctor_id = request.path_params['doctor_id']
+    today = date.today()
+    start = max(_date_arg(request, 'start', today), today)
+    end = min(_date_arg(request, 'end', start + timedelta(days=7)), start + timedelta(days=MAX_RANGE_DAYS))
+    now = datetime.now()
+    async with sessions() as session:
+        await current_identity(request, session)
+        if (await session.execute(select(Doctor.id).where(Doctor.id == doctor_id))).first() is None:
+            raise ApiError(404, 'Doctor not found')
+        windows = (await session.execute(
+            select(DoctorAvailability.date, DoctorAvailability.start_time, DoctorAvailability.end_time).where(
+                DoctorAvailability.doctor_id == doctor_id,
+                DoctorAvailability.date >= start,
+                DoctorAvailability.date <= end,
+                DoctorAvailability.is_available == True
+            ).order_by(DoctorAvailability.date, DoctorAvailability.start_time)
+        )).all()
+        slots = (await session.execute(
+            select(FreeSlot.date, FreeSlot.start_time).where(
+                FreeSlot.doctor_id == doctor_id,
+                FreeSlot.date >= start,
+                FreeSlot.date <= end,
+                tuple_(FreeSlot.date, FreeSlot.start_time) > tuple_(now.date(), now.time())
+            ).order_by(FreeSlot.date, FreeSlot.start_time)
+        )).all()
+    return JSONResponse({
+        'doctor_id': doctor_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'windows': [{'date': d.isoformat(), 'start_time': _time(s), 'end_time': _time(e)} for d, s, e in windows],
+        'free_slots': [{'date': d.isoformat(), 'time': _time(t)} for d, t in slots],
+    })
+
+def _scoped(query, identity):
+    if identity.role == 'patient':
+        return query.where(Appointment.patient_id == identity.patient_id)
+    if identity.role == 'doctor':
+        return query.where(Appointment.doctor_id == identity.doctor_id)
+    return query
+
+async def list_appointments(request):
+    limit = _int_arg(request, 'limit', 25, maximum=MAX_PAGE)
+    before = _int_arg(request, 'before')
+    status = request.query_params.get('status')
+    query = select(Appointment)
+    if status:
+        query = query.where(Appointment.status == status)
+    if before:
+        query = query.where(Appointment.id < before)
+    async with sessions() as session:
+        identity = await current_identity(request, session)
+        rows = (await session.execute(
+            _scoped(query, identity).order_by(Appointment.id.desc()).limit(limit + 1)
+        )).scalars().all()
+    return JSONResponse({
+        'items': [appointment_json(a) for a in rows[:limit]],
+        'next_before': rows[limit - 1].id if len(rows) > limit else None,
+    })
+
+async def _load_appointment(session, identity, appointment_id):
+    appointment = (await session.execute(
+        _scoped(select(Appointment).where(Appointment.id == appointment_id), identity)
+    )).scalar_one_or_none()
+    if appointment is None:
+        raise ApiError(404, 'Appointment not found')
+    return appointment
+
+async def get_appointment(request):
+    async with sessions() as session:
+        identity = await current_identity(request, session)
+        appointment = await _load_appointment(session, identity, request.path_params['appointment_id'])
+    return JSONResponse(appointment_json(appointment))
+
+async def create_appointment(request):
+    try:
+        data = await request.json()
+        doctor_id = int(data['doctor_id'])
+        day = date.fromisoformat(data['date'])
+        at = time.fromisoformat(data['time'])
+        reason = data.get('reason')
+    except (ValueError, KeyError, TypeError):
+        raise ApiError(400, 'doctor_id, date (YYYY-MM-DD) and time (HH:MM) are required')
+
+    async def book(session):
+        # Re-run from scratch on a lock retry; on SQLite the slot checks then
+        # read inside the write lock. The claim is still the INSERT, as in
+        # booking.book_slot.
+        windows = (await session.execute(windows_statement(doctor_id, day))).all()
+        booked = (await session.execute(booked_times_statement(doctor_id, day))).scalars().all()
+        error = slot_error(day, at, windows, booked)
+        if error:
+            raise ApiError(409 if error == ALREADY_BOOKED else 422, error)
+        appointment = Appointment(patient_id=identity.patient_id, doctor_id=doctor_id, appointment_date=day,
+                                  appointment_time=at, reason=reason, status='Booked')
+        session.add(appointment)
+        await session.commit()
+        return appointment
+
+    async with sessions() as session:
+        identity = await current_identity(request, session)
+        if identity.role != 'patient':
+            raise ApiError(403, 'Only patients can book appointments')
+        try:
+            appointment = await async_write_transaction(session, book)
+        except IntegrityError as e:
+            await session.rollback()
+            if not is_slot_conflict(e):
+                raise
+            raise ApiError(409, ALREADY_BOOKED)
+        await session.refresh(appointment)
+    return JSONResponse(appointment_json(appointment), status_code=201)
+
+async def cancel_appointment(request):
+    async def cancel(session):
+        appointment = await _load_appointment(session, identity, request.path_params['appointment_id'])
+        if appointment.status != 'Booked':
+            raise ApiError(409, f'Appointment is already {appointment.status.lower()}')
+        appointment.status = 'Cancelled'
+        await session.commit()
+        return appointment
+
+    async with sessions() as session:
+        identity = await current_identity(request, session)
+        if identity.role not in ('patient', 'doctor'):
+            raise ApiError(403, 'Only the patient or doctor can cancel an appointment')
+        appointment = await async_write_transaction(session, cancel)
+        await session.refresh(appointment)
+    return JSONResponse(appointment_json(appointment))
+
+routes = [
+    Mount('/api/v1', routes=[
+        Route('/auth/token', issue_token, methods=['POST']),
+        Route('/doctors', list_doctors),
+        Route('/doctors/{doctor_id:int}', get_doctor),
+        Route('/doctors/{doctor_id:int}/availability', doctor_availability),
+        Route('/appointments', list_appointments),
+        Route('/appointments', create_appointment, methods=['POST']),
+        Route('/appointments/{appointment_id:int}', get_appointment),
+        Route('/appointments/{appointment_id:int}/cancel', cancel_appointment, methods=['POST']),
+    ]),
+]
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+app = Starlette(routes=routes, exception_handlers={ApiError: api_error}, lifespan=lifespan)
@@ -1,25 +1,94 @@
-from flask import Flask, render_template, redirect, url_for, flash, request
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, Doctor, Patient, Department, Appointment, Treatment, DoctorAvailability, LabBooking
+from models import (db, User, Doctor, Patient, Department, Appointment, Treatment, DoctorAvailability, LabBooking, LabTest,
+                    HealthPackage, ImportJob)
 from forms import (LoginForm, PatientRegistrationForm, PatientProfileForm, 
-                   DoctorForm, DepartmentForm, AppointmentForm, TreatmentForm, DoctorAvailabilityForm)
+                   DoctorForm, DepartmentForm, AppointmentForm, TreatmentForm, DoctorAvailabilityForm, ImportForm,
+                   LabTestForm, HealthPackageForm, LabItemForm)
 from datetime import datetime, date, timedelta, time
 from functools import wraps
+from sqlalchemy.orm import joinedload, contains_eager
+from database import database_url, engine_options, init_sqlite_tuning, init_cursor_hooks, write_transaction
+from replicas import replica_binds, init_replicas, read_only
+from metrics import init_metrics, metrics
+from slowlog import init_slow_query_log, top_offenders
+from profiler import init_profiler, profile_dir
+from conditional import init_conditional, conditional_page, appointment_version
+from queries import (APPOINTMENT_SORT_KEY, appointment_listing, doctor_listing, patient_listing, recent_appointments_query, doctor_appointments_query,
+                     doctor_upcoming_query, patient_appointments_query, patient_upcoming_query,
+                     patient_history_query, assigned_patients_query, doctors_available_query, availability_by_doctor,
+                     init_query_budget)
+from pagination import keyset_paginate, InvalidCursor
+from stats import init_stats, dashboard_counts
+from booking import book_slot, SlotUnavailable
+from importer import import_dir, save_upload, queue_import, start_import, job_errors
+from exporter import generate_csv, generate_jsonl
+from search import init_search, filter_patients, filter_doctors, ranked_ids, fts_enabled
+from slots import init_slots, free_slots_for_doctor, earliest_free_slots
+from typeahead import init_typeahead, suggest_doctors, suggest_patients
+from catalog import (init_catalog, lab_catalog, invalidate_catalog, ensure_catalog, add_to_cart, UnknownCatalogItem, catalog_cache,
+                     open_cart_query, cart_summary, checkout_cart, lab_revenue_report, OPEN_STATUS)
+from directory import (init_directory, department_summaries, department_choices, doctor_summaries, doctors_in_department,
+                       invalidate_directory, directory_cache)
+import hmac
 import os
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-please-change')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+app.config['SQLALCHEMY_BINDS'] = replica_binds()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_TUNING'] = os.environ.get('SQLITE_TUNING', '1') != '0'
+app.config['SQL_QUERY_BUDGET'] = int(os.environ.get('SQL_QUERY_BUDGET', 25))
+app.config['DIRECTORY_CACHE_TTL'] = int(os.environ.get('DIRECTORY_CACHE_TTL', 300))
+app.config['CATALOG_CACHE_TTL'] = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+app.config['RECONCILE_INTERVAL'] = int(os.environ.get('RECONCILE_INTERVAL', 900))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG')
+app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN')
+app.config['PROFILE_MIN_INTERVAL'] = float(os.environ.get('PROFILE_MIN_INTERVAL', 10))
 
 db.init_app(app)
+init_sqlite_tuning(app)
+init_replicas(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+init_query_budget(app)
+init_metrics(app)
+init_slow_query_log(app)
+init_cursor_hooks(app)
+init_profiler(app)
+init_conditional(app)
+init_stats(app)
+init_directory(app)
+init_slots(app)
+init_search(app)
+init_typeahead(app)
+init_catalog(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # Doctor/patient rows ride along in the same SELECT, so views can use
+    # current_user.doctor / current_user.patient without another query.
+    return User.query.options(
+        joinedload(User.doctor), joinedload(User.patient)
+    ).filter_by(id=int(user_id)).first()
+
+def current_profile():
+    if not current_user.is_authenticated:
+        return None
+    if current_user.role == 'doctor':
+        return current_user.doctor
+    if current_user.role == 'patient':
+        return current_user.patient
+    return None
+
+@app.context_processor
+def inject_current_profile():
+    return {'current_profile': current_profile()}
 
 def admin_required(f):
     @wraps(f)
@@ -83,28 +152,33 @@ def register():
     
     form = PatientRegistrationForm()
     if form.validate_on_submit():
-        existing_user = User.query.filter((User.username == form.username.data) | (User.email == form.email.data)).first()
-        if existing_user:
+        def create_patient():
+            existing_user = User.query.filter((User.username == form.username.data) | (User.email == form.email.data)).first()
+            if existing_user:
+                return None
+            
+            user = User(username=form.username.data, email=form.email.data, role='patient')
+            user.set_password(form.password.data)
+            db.session.add(user)
+            db.session.flush()
+            
+            patient = Patient(
+                user_id=user.id,
+                full_name=form.full_name.data,
+                phone=form.phone.data,
+                date_of_birth=form.date_of_birth.data,
+                gender=form.gender.data,
+                address=form.address.data,
+                blood_group=form.blood_group.data
+            )
+            db.session.add(patient)
+            db.session.commit()
+            return patient
+        
+        if write_transaction(create_patient) is None:
             flash('Username or email already exists. Please choose different credentials.', 'danger')
             return render_template('register.html', form=form)
         
-        user = User(username=form.username.data, email=form.email.data, role='patient')
-        user.set_password(form.password.data)
-        db.session.add(user)
-        db.session.flush()
-        
-        patient = Patient(
-            user_id=user.id,
-            full_name=form.full_name.data,
-            phone=form.phone.data,
-            date_of_birth=form.date_of_birth.data,
-            gender=form.gender.data,
-            address=form.address.data,
-            blood_group=form.blood_group.data
-        )
-        db.session.add(patient)
-        db.session.commit()
-        
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('login'))
     
@@ -120,24 +194,19 @@ def logout():
 @app.route('/admin/dashboard')
 @login_required
 @admin_required
+@read_only
 def admin_dashboard():
-    total_doctors = Doctor.query.count()
-    total_patients = Patient.query.count()
-    total_appointments = Appointment.query.count()
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.appointment_date >= date.today(),
-        Appointment.status == 'Booked'
-    ).count()
-    
-    recent_consultations = Appointment.query.order_by(Appointment.created_at.desc()).limit(5).all()
-    medical_specialists = Doctor.query.limit(5).all()
+    counts = dashboard_counts()
+    
+    recent_consultations = recent_appointments_query(5).all()
+    medical_specialists = doctor_summaries()[:5]
     registered_patients = Patient.query.limit(5).all()
     
     return render_template('admin/dashboard.html', 
-                         total_doctors=total_doctors,
-                         total_patients=total_patients,
-                         total_appointments=total_appointments,
-                         upcoming_appointments=upcoming_appointments,
+                         total_doctors=counts['doctors'],
+                         total_patients=counts['patients'],
+                         total_appointments=counts['appointments'],
+                         upcoming_appointments=counts['upcoming'],
                          recent_appointments=recent_consultations,
                          doctors=medical_specialists,
                          patients=registered_patients)
@@ -145,8 +214,9 @@ def admin_dashboard():
 @app.route('/admin/departments')
 @login_required
 @admin_required
+@read_only
 def admin_departments():
-    departments = Department.query.all()
+    departments = department_summaries()
     return render_template('admin/departments.html', departments=departments)
 
 @app.route('/admin/department/add', methods=['GET', 'POST'])
@@ -155,63 +225,171 @@ def admin_departments():
 def admin_add_department():
     form = DepartmentForm()
     if form.validate_on_submit():
-        existing_dept = Department.query.filter_by(name=form.name.data).first()
-        if existing_dept:
+        def create_department():
+            if Department.query.filter_by(name=form.name.data).first():
+                return None
+            department = Department(name=form.name.data, description=form.description.data)
+            db.session.add(department)
+            db.session.commit()
+            return department
+        
+        if write_transaction(create_department) is None:
             flash('Department already exists.', 'danger')
             return render_template('admin/add_department.html', form=form)
-        
-        department = Department(name=form.name.data, description=form.description.data)
-        db.session.add(department)
-        db.session.commit()
+        invalidate_directory()
         flash('Department added successfully!', 'success')
         return redirect(url_for('admin_departments'))
     
     return render_template('admin/add_department.html', form=form)
 
+@app.route('/admin/lab-catalog')
+@login_required
+@admin_required
+def admin_lab_catalog():
+    tests = LabTest.query.order_by(LabTest.id).all()
+    packages = HealthPackage.query.order_by(HealthPackage.id).all()
+    return render_template('admin/lab_catalog.html', tests=tests, packages=packages,
+                           test_form=LabTestForm(prefix='test'), package_form=HealthPackageForm(prefix='package'),
+                           item_form=LabItemForm())
+
+@app.route('/admin/lab-catalog/test/add', methods=['POST'])
+@login_required
+@admin_required
+def admin_add_lab_test():
+    form = LabTestForm(prefix='test')
+    
+    def create_test():
+        if LabTest.query.filter_by(name=form.name.data).first():
+            return None
+        test = LabTest(name=form.name.data, description=form.description.data, price=form.price.data)
+        db.session.add(test)
+        db.session.commit()
+        return test
+    
+    if not form.validate_on_submit():
+        flash('Invalid lab test details.', 'danger')
+    elif write_transaction(create_test) is None:
+        flash('Lab test already exists.', 'danger')
+    else:
+        invalidate_catalog()
+        flash('Lab test added successfully!', 'success')
+    return redirect(url_for('admin_lab_catalog'))
+
+@app.route('/admin/lab-catalog/package/add', methods=['POST'])
+@login_required
+@admin_required
+def admin_add_health_package():
+    form = HealthPackageForm(prefix='package')
+    
+    def create_package():
+        if HealthPackage.query.filter_by(name=form.name.data).first():
+            return None
+        package = HealthPackage(name=form.name.data, features=form.features.data, price=form.price.data,
+                                icon=form.icon.data or None)
+        db.session.add(package)
+        db.session.commit()
+        return package
+    
+    if not form.validate_on_submit():
+        flash('Invalid package details.', 'danger')
+    elif write_transaction(create_package) is None:
+        flash('Package already exists.', 'danger')
+    else:
+        invalidate_catalog()
+        flash('Package added successfully!', 'success')
+    return redirect(url_for('admin_lab_catalog'))
+
+@app.route('/admin/lab-catalog/<kind>/<int:item_id>', methods=['POST'])
+@login_required
+@admin_required
+def admin_update_lab_item(kind, item_id):
+    model = {'test': LabTest, 'package': HealthPackage}.get(kind)
+    if model is None:
+        return redirect(url_for('admin_lab_catalog'))
+    item = model.query.get_or_404(item_id)
+    form = LabItemForm()
+    if not form.validate_on_submit():
+        flash('Invalid price.', 'danger')
+        return redirect(url_for('admin_lab_catalog'))
+    
+    def update_item():
+        item.price = form.price.data
+        item.active = form.active.data
+        db.session.commit()
+    
+    write_transaction(update_item)
+    invalidate_catalog()
+    flash(f'{item.name} updated.', 'success')
+    return redirect(url_for('admin_lab_catalog'))
+
+@app.route('/admin/lab-revenue')
+@login_required
+@admin_required
+@read_only
+def admin_lab_revenue():
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else today - timedelta(days=29)
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else today
+    except ValueError:
+        flash('Dates must be YYYY-MM-DD.', 'danger')
+        return redirect(url_for('admin_lab_revenue'))
+    
+    report = lab_revenue_report(start, end)
+    return render_template('admin/lab_revenue.html', report=report, start=start, end=end)
+
 @app.route('/admin/doctors')
 @login_required
 @admin_required
+@read_only
 def admin_doctors():
     search = request.args.get('search', '')
+    query = doctor_listing()
     if search:
-        doctors = Doctor.query.filter(
-            (Doctor.full_name.ilike(f'%{search}%')) |
-            (Department.name.ilike(f'%{search}%'))
-        ).join(Department).all()
-    else:
-        doctors = Doctor.query.all()
+        query = filter_doctors(query, search)
+    try:
+        page = keyset_paginate(query, (Doctor.id,), request.args)
+    except InvalidCursor:
+        flash('Invalid page link.', 'danger')
+        return redirect(url_for('admin_doctors', search=search or None))
     
-    return render_template('admin/doctors.html', doctors=doctors, search=search)
+    return render_template('admin/doctors.html', doctors=page.items, page=page, search=search)
 
 @app.route('/admin/doctor/add', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def admin_add_doctor():
     form = DoctorForm()
-    form.department_id.choices = [(d.id, d.name) for d in Department.query.all()]
+    form.department_id.choices = department_choices()
     
     if form.validate_on_submit():
-        existing_user = User.query.filter((User.username == form.username.data) | (User.email == form.email.data)).first()
-        if existing_user:
+        def create_doctor():
+            existing_user = User.query.filter((User.username == form.username.data) | (User.email == form.email.data)).first()
+            if existing_user:
+                return None
+            
+            user = User(username=form.username.data, email=form.email.data, role='doctor')
+            user.set_password(form.password.data if form.password.data else 'doctor123')
+            db.session.add(user)
+            db.session.flush()
+            
+            doctor = Doctor(
+                user_id=user.id,
+                full_name=form.full_name.data,
+                department_id=form.department_id.data,
+                phone=form.phone.data,
+                qualification=form.qualification.data,
+                experience_years=form.experience_years.data,
+                consultation_fee=form.consultation_fee.data
+            )
+            db.session.add(doctor)
+            db.session.commit()
+            return doctor
+        
+        if write_transaction(create_doctor) is None:
             flash('Username or email already exists.', 'danger')
             return render_template('admin/add_doctor.html', form=form)
-        
-        user = User(username=form.username.data, email=form.email.data, role='doctor')
-        user.set_password(form.password.data if form.password.data else 'doctor123')
-        db.session.add(user)
-        db.session.flush()
-        
-        doctor = Doctor(
-            user_id=user.id,
-            full_name=form.full_name.data,
-            department_id=form.department_id.data,
-            phone=form.phone.data,
-            qualification=form.qualification.data,
-            experience_years=form.experience_years.data,
-            consultation_fee=form.consultation_fee.data
-        )
-        db.session.add(doctor)
-        db.session.commit()
+        invalidate_directory()
         
         flash('Doctor added successfully!', 'success')
         return redirect(url_for('admin_doctors'))
@@ -224,21 +402,25 @@ def admin_add_doctor():
 def admin_edit_doctor(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
     form = DoctorForm(obj=doctor)
-    form.department_id.choices = [(d.id, d.name) for d in Department.query.all()]
+    form.department_id.choices = department_choices()
     
     if form.validate_on_submit():
-        doctor.full_name = form.full_name.data
-        doctor.department_id = form.department_id.data
-        doctor.phone = form.phone.data
-        doctor.qualification = form.qualification.data
-        doctor.experience_years = form.experience_years.data
-        doctor.consultation_fee = form.consultation_fee.data
-        
-        doctor.user.email = form.email.data
-        if form.password.data:
-            doctor.user.set_password(form.password.data)
+        def save_doctor():
+            doctor.full_name = form.full_name.data
+            doctor.department_id = form.department_id.data
+            doctor.phone = form.phone.data
+            doctor.qualification = form.qualification.data
+            doctor.experience_years = form.experience_years.data
+            doctor.consultation_fee = form.consultation_fee.data
+            
+            doctor.user.email = form.email.data
+            if form.password.data:
+                doctor.user.set_password(form.password.data)
+            
+            db.session.commit()
         
-        db.session.commit()
+        write_transaction(save_doctor)
+        invalidate_directory()
         flash('Doctor updated successfully!', 'success')
         return redirect(url_for('admin_doctors'))
     
@@ -251,74 +433,162 @@ def admin_edit_doctor(doctor_id):
 @admin_required
 def admin_delete_doctor(doctor_id):
     doctor = Doctor.query.get_or_404(doctor_id)
-    user = doctor.user
-    db.session.delete(doctor)
-    db.session.delete(user)
-    db.session.commit()
+    
+    def delete_doctor():
+        user = doctor.user
+        db.session.delete(doctor)
+        db.session.delete(user)
+        db.session.commit()
+    
+    write_transaction(delete_doctor)
+    invalidate_directory()
     flash('Doctor deleted successfully!', 'success')
     return redirect(url_for('admin_doctors'))
 
 @app.route('/admin/patients')
 @login_required
 @admin_required
+@read_only
 def admin_patients():
     search = request.args.get('search', '')
+    query = patient_listing()
     if search:
-        patients = Patient.query.filter(
-            (Patient.full_name.ilike(f'%{search}%')) |
-            (Patient.phone.ilike(f'%{search}%')) |
-            (User.email.ilike(f'%{search}%'))
-        ).join(User).all()
-    else:
-        patients = Patient.query.all()
+        query = filter_patients(query, search)
+    try:
+        page = keyset_paginate(query, (Patient.id,), request.args)
+    except InvalidCursor:
+        flash('Invalid page link.', 'danger')
+        return redirect(url_for('admin_patients', search=search or None))
     
-    return render_template('admin/patients.html', patients=patients, search=search)
+    return render_template('admin/patients.html', patients=page.items, page=page, search=search)
 
 @app.route('/admin/patient/delete/<int:patient_id>', methods=['POST'])
 @login_required
 @admin_required
 def admin_delete_patient(patient_id):
     patient = Patient.query.get_or_404(patient_id)
-    user = patient.user
-    db.session.delete(patient)
-    db.session.delete(user)
-    db.session.commit()
+    
+    def delete_patient():
+        user = patient.user
+        db.session.delete(patient)
+        db.session.delete(user)
+        db.session.commit()
+    
+    write_transaction(delete_patient)
     flash('Patient deleted successfully!', 'success')
     return redirect(url_for('admin_patients'))
 
 @app.route('/admin/appointments')
 @login_required
 @admin_required
+@read_only
 def admin_appointments():
-    appointments = Appointment.query.order_by(Appointment.appointment_date.desc(), Appointment.appointment_time.desc()).all()
-    return render_template('admin/appointments.html', appointments=appointments)
+    try:
+        page = keyset_paginate(appointment_listing(), APPOINTMENT_SORT_KEY, request.args, descending=True)
+    except InvalidCursor:
+        flash('Invalid page link.', 'danger')
+        return redirect(url_for('admin_appointments'))
+    return render_template('admin/appointments.html', appointments=page.items, page=page)
+
+@app.route('/admin/export/appointments')
+@login_required
+@admin_required
+@read_only
+def admin_export_appointments():
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+    except ValueError:
+        flash('Export dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('admin_appointments'))
+    
+    if request.args.get('format') == 'jsonl':
+        body, mimetype, extension = generate_jsonl(start, end), 'application/x-ndjson', 'jsonl'
+    else:
+        body, mimetype, extension = generate_csv(start, end), 'text/csv', 'csv'
+    filename = f'appointments-{date.today().isoformat()}.{extension}'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_import():
+    # The upload is saved and imported on a background thread; the job page
+    # shows its progress.
+    form = ImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        path = save_upload(upload, import_dir(app))
+        job = write_transaction(lambda: queue_import(form.kind.data, upload.filename, path))
+        start_import(app, job.id)
+        flash(f'Importing {upload.filename} in the background.', 'info')
+        return redirect(url_for('admin_import_job', job_id=job.id))
+    jobs = ImportJob.query.order_by(ImportJob.id.desc()).limit(10).all()
+    return render_template('admin/import.html', form=form, jobs=jobs)
+
+@app.route('/admin/import/<int:job_id>')
+@login_required
+@admin_required
+def admin_import_job(job_id):
+    job = ImportJob.query.get_or_404(job_id)
+    return render_template('admin/import_job.html', job=job, errors=job_errors(job))
+
+@app.route('/admin/cache-stats')
+@login_required
+@admin_required
+def admin_cache_stats():
+    return jsonify(directory=directory_cache.stats(), catalog=catalog_cache.stats())
+
+@app.route('/admin/slow-queries')
+@login_required
+@admin_required
+def admin_slow_queries():
+    return render_template('admin/slow_queries.html', offenders=top_offenders(),
+                           threshold=app.config.get('SLOW_QUERY_MS'))
+
+@app.route('/admin/profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    directory = profile_dir(app)
+    names = sorted(os.listdir(directory), reverse=True) if os.path.isdir(directory) else []
+    return jsonify(profiles=[{'name': name, 'url': url_for('admin_profile_download', name=name)} for name in names[:100]])
+
+@app.route('/admin/profiles/<name>')
+@login_required
+@admin_required
+def admin_profile_download(name):
+    return send_from_directory(profile_dir(app), name, mimetype='text/plain', as_attachment=True)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    # Scrapers authenticate with METRICS_TOKEN; without one, admins only.
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    elif not current_user.is_authenticated or current_user.role != 'admin':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/doctor/dashboard')
 @login_required
 @doctor_required
+@read_only
 def doctor_dashboard():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_user.doctor
     
     today = date.today()
     next_week = today + timedelta(days=7)
     
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.doctor_id == doctor.id,
-        Appointment.appointment_date >= today,
-        Appointment.status == 'Booked'
-    ).order_by(Appointment.appointment_date, Appointment.appointment_time).all()
+    upcoming_appointments = doctor_upcoming_query(doctor.id, today).all()
     
-    assigned_patients = db.session.query(Patient).join(Appointment).filter(
-        Appointment.doctor_id == doctor.id
-    ).distinct().all()
+    assigned_patients = assigned_patients_query(doctor.id).all()
     
     patients_count = len(assigned_patients)
     
-    availabilities = DoctorAvailability.query.filter(
-        DoctorAvailability.doctor_id == doctor.id,
-        DoctorAvailability.date >= today,
-        DoctorAvailability.date <= next_week
-    ).order_by(DoctorAvailability.date).all()
+    availabilities = availability_by_doctor([doctor.id], today, next_week)[doctor.id]
     
     return render_template('doctor/dashboard.html', 
                          doctor=doctor,
@@ -330,18 +600,17 @@ def doctor_dashboard():
 @app.route('/doctor/appointments')
 @login_required
 @doctor_required
+@read_only
 def doctor_appointments():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).order_by(
-        Appointment.appointment_date.desc(), Appointment.appointment_time.desc()
-    ).all()
-    return render_template('doctor/appointments.html', appointments=appointments)
+    doctor = current_user.doctor
+    return conditional_page(appointment_version(doctor_id=doctor.id), lambda: render_template(
+        'doctor/appointments.html', appointments=doctor_appointments_query(doctor.id).all()))
 
 @app.route('/doctor/appointment/<int:appointment_id>/complete', methods=['GET', 'POST'])
 @login_required
 @doctor_required
 def doctor_complete_appointment(appointment_id):
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_user.doctor
     appointment = Appointment.query.get_or_404(appointment_id)
     
     if appointment.doctor_id != doctor.id:
@@ -350,15 +619,18 @@ def doctor_complete_appointment(appointment_id):
     
     form = TreatmentForm()
     if form.validate_on_submit():
-        treatment = Treatment(
-            appointment_id=appointment.id,
-            diagnosis=form.diagnosis.data,
-            prescription=form.prescription.data,
-            notes=form.notes.data
-        )
-        appointment.status = 'Completed'
-        db.session.add(treatment)
-        db.session.commit()
+        def record_treatment():
+            treatment = Treatment(
+                appointment_id=appointment.id,
+                diagnosis=form.diagnosis.data,
+                prescription=form.prescription.data,
+                notes=form.notes.data
+            )
+            appointment.status = 'Completed'
+            db.session.add(treatment)
+            db.session.commit()
+        
+        write_transaction(record_treatment)
         flash('Appointment marked as completed and treatment recorded!', 'success')
         return redirect(url_for('doctor_appointments'))
     
@@ -368,30 +640,30 @@ def doctor_complete_appointment(appointment_id):
 @login_required
 @doctor_required
 def doctor_cancel_appointment(appointment_id):
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_user.doctor
     appointment = Appointment.query.get_or_404(appointment_id)
     
     if appointment.doctor_id != doctor.id:
         flash('Access denied.', 'danger')
         return redirect(url_for('doctor_appointments'))
     
-    appointment.status = 'Cancelled'
-    db.session.commit()
+    def cancel():
+        appointment.status = 'Cancelled'
+        db.session.commit()
+    
+    write_transaction(cancel)
     flash('Appointment cancelled successfully!', 'success')
     return redirect(url_for('doctor_appointments'))
 
 @app.route('/doctor/patient/<int:patient_id>/history')
 @login_required
 @doctor_required
+@read_only
 def doctor_patient_history(patient_id):
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_user.doctor
     patient = Patient.query.get_or_404(patient_id)
     
-    appointments = Appointment.query.filter_by(
-        patient_id=patient_id,
-        doctor_id=doctor.id,
-        status='Completed'
-    ).order_by(Appointment.appointment_date.desc()).all()
+    appointments = patient_history_query(patient_id, doctor_id=doctor.id).all()
     
     return render_template('doctor/patient_history.html', patient=patient, appointments=appointments)
 
@@ -399,18 +671,21 @@ def doctor_patient_history(patient_id):
 @login_required
 @doctor_required
 def doctor_availability():
-    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    doctor = current_user.doctor
     form = DoctorAvailabilityForm()
     
     if form.validate_on_submit():
-        availability = DoctorAvailability(
-            doctor_id=doctor.id,
-            date=form.date.data,
-            start_time=form.start_time.data,
-            end_time=form.end_time.data
-        )
-        db.session.add(availability)
-        db.session.commit()
+        def add_availability():
+            availability = DoctorAvailability(
+                doctor_id=doctor.id,
+                date=form.date.data,
+                start_time=form.start_time.data,
+                end_time=form.end_time.data
+            )
+            db.session.add(availability)
+            db.session.commit()
+        
+        write_transaction(add_availability)
         flash('Availability added successfully!', 'success')
         return redirect(url_for('doctor_availability'))
     
@@ -427,43 +702,22 @@ def doctor_availability():
 @app.route('/patient/dashboard')
 @login_required
 @patient_required
+@read_only
 def patient_dashboard():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    departments = Department.query.all()
+    patient = current_user.patient
+    departments = department_summaries()
     
     today = date.today()
     next_week = today + timedelta(days=7)
     
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.patient_id == patient.id,
-        Appointment.appointment_date >= today,
-        Appointment.status == 'Booked'
-    ).order_by(Appointment.appointment_date, Appointment.appointment_time).all()
+    upcoming_appointments = patient_upcoming_query(patient.id, today).all()
     
     # Get history for dashboard
-    history = Appointment.query.filter_by(
-        patient_id=patient.id,
-        status='Completed'
-    ).order_by(Appointment.appointment_date.desc()).limit(5).all()
+    history = patient_history_query(patient.id).limit(5).all()
     
-    doctors_available = Doctor.query.join(DoctorAvailability).filter(
-        DoctorAvailability.date >= today,
-        DoctorAvailability.date <= next_week
-    ).distinct().all()
+    doctors_available = doctors_available_query(today, next_week).all()
 
-    # Mock Data for New Features
-    health_packages = [
-        {'name': 'Full Body Checkup', 'price': 2999, 'features': ['Blood Test', 'X-Ray', 'ECG', 'Consultation'], 'icon': 'bi-person-check'},
-        {'name': 'Heart Health', 'price': 4999, 'features': ['Lipid Profile', 'ECG', 'Echo', 'Cardiologist Consult'], 'icon': 'bi-heart-pulse'},
-        {'name': 'Diabetes Care', 'price': 1999, 'features': ['HbA1c', 'Sugar Fasting', 'Diet Plan', 'Diabetologist Consult'], 'icon': 'bi-droplet'}
-    ]
-
-    lab_tests = [
-        {'name': 'CBC (Complete Blood Count)', 'price': 300},
-        {'name': 'Thyroid Profile', 'price': 500},
-        {'name': 'Vitamin D Test', 'price': 1000},
-        {'name': 'Liver Function Test', 'price': 400}
-    ]
+    catalog = lab_catalog()
 
     patient_stories = [
         {'name': 'Priya Sharma', 'condition': 'Cardiac Surgery', 'img': 'P', 'text': 'The care I received at HealFlow was exceptional. The doctors were attentive and the facilities were world-class.'},
@@ -477,26 +731,29 @@ def patient_dashboard():
                          upcoming_appointments=upcoming_appointments,
                          history=history,
                          doctors_available=doctors_available,
-                         health_packages=health_packages,
-                         lab_tests=lab_tests,
+                         health_packages=catalog.packages,
+                         lab_tests=catalog.tests,
                          patient_stories=patient_stories)
 
 @app.route('/patient/profile', methods=['GET', 'POST'])
 @login_required
 @patient_required
 def patient_profile():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient = current_user.patient
     form = PatientProfileForm(obj=patient)
     
     if form.validate_on_submit():
-        patient.full_name = form.full_name.data
-        patient.phone = form.phone.data
-        patient.date_of_birth = form.date_of_birth.data
-        patient.gender = form.gender.data
-        patient.address = form.address.data
-        patient.blood_group = form.blood_group.data
-        current_user.email = form.email.data
-        db.session.commit()
+        def save_profile():
+            patient.full_name = form.full_name.data
+            patient.phone = form.phone.data
+            patient.date_of_birth = form.date_of_birth.data
+            patient.gender = form.gender.data
+            patient.address = form.address.data
+            patient.blood_group = form.blood_group.data
+            current_user.email = form.email.data
+            db.session.commit()
+        
+        write_transaction(save_profile)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('patient_profile'))
     
@@ -506,36 +763,35 @@ def patient_profile():
 @app.route('/patient/doctors')
 @login_required
 @patient_required
+@read_only
 def patient_doctors():
     search = request.args.get('search', '')
     department_id = request.args.get('department', '')
     
-    query = Doctor.query.join(Department)
+    query = Doctor.query.join(Department).options(contains_eager(Doctor.department))
     
-    if search:
-        query = query.filter(
-            (Doctor.full_name.ilike(f'%{search}%')) |
-            (Department.name.ilike(f'%{search}%'))
-        )
+    ranking = None
+    if search and fts_enabled() and len(search.strip()) >= 3:
+        ranking = ranked_ids('doctors_fts', search, limit=200)
+        query = query.filter(Doctor.id.in_(ranking))
+    elif search:
+        query = filter_doctors(query, search, joined_department=True)
     
     if department_id:
         query = query.filter(Doctor.department_id == int(department_id))
     
     doctors = query.all()
-    departments = Department.query.all()
+    if ranking:
+        position = {doctor_id: i for i, doctor_id in enumerate(ranking)}
+        doctors.sort(key=lambda d: position[d.id])
+    departments = department_summaries()
     
     today = date.today()
     next_week = today + timedelta(days=7)
     
-    doctor_availability = {}
-    for doctor in doctors:
-        availabilities = DoctorAvailability.query.filter(
-            DoctorAvailability.doctor_id == doctor.id,
-            DoctorAvailability.date >= today,
-            DoctorAvailability.date <= next_week,
-            DoctorAvailability.is_available == True
-        ).all()
-        doctor_availability[doctor.id] = availabilities
+    doctor_availability = availability_by_doctor(
+        [doctor.id for doctor in doctors], today, next_week, available_only=True
+    )
     
     return render_template('patient/doctors.html',
                          doctors=doctors,
@@ -547,84 +803,119 @@ def patient_doctors():
 @login_required
 @patient_required
 def patient_book_appointment(doctor_id):
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient = current_user.patient
     doctor = Doctor.query.get_or_404(doctor_id)
     form = AppointmentForm()
     form.doctor_id.choices = [(doctor.id, doctor.full_name)]
     form.doctor_id.data = doctor.id
     
     if form.validate_on_submit():
-        existing_appointment = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            appointment_date=form.appointment_date.data,
-            appointment_time=form.appointment_time.data,
-            status='Booked'
-        ).first()
-        
-        if existing_appointment:
-            flash('This time slot is already booked. Please choose a different time.', 'danger')
-            return render_template('patient/book_appointment.html', form=form, doctor=doctor)
-        
-        appointment = Appointment(
-            patient_id=patient.id,
-            doctor_id=doctor_id,
-            appointment_date=form.appointment_date.data,
-            appointment_time=form.appointment_time.data,
-            reason=form.reason.data,
-            status='Booked'
-        )
-        db.session.add(appointment)
-        db.session.commit()
-        flash('Appointment booked successfully!', 'success')
-        return redirect(url_for('patient_appointments'))
+        try:
+            write_transaction(lambda: book_slot(patient.id, doctor_id, form.appointment_date.data,
+                                                form.appointment_time.data, form.reason.data))
+        except SlotUnavailable as e:
+            flash(str(e), 'danger')
+        else:
+            flash('Appointment booked successfully!', 'success')
+            return redirect(url_for('patient_appointments'))
     
     today = date.today()
     next_week = today + timedelta(days=7)
-    availabilities = DoctorAvailability.query.filter(
-        DoctorAvailability.doctor_id == doctor_id,
-        DoctorAvailability.date >= today,
-        DoctorAvailability.date <= next_week
-    ).all()
+    availabilities = availability_by_doctor([doctor_id], today, next_week)[doctor_id]
+    free_slots = free_slots_for_doctor(doctor_id, today, next_week)
+    
+    return render_template('patient/book_appointment.html', form=form, doctor=doctor,
+                           availabilities=availabilities, free_slots=free_slots)
+
+@app.route('/departments/<int:department_id>/earliest-slots')
+@login_required
+@read_only
+def department_earliest_slots(department_id):
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else today
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else start + timedelta(days=7)
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify(error='start/end must be YYYY-MM-DD and limit an integer'), 400
+    start = max(start, today)
+    end = min(end, start + timedelta(days=31))
+    limit = max(1, min(limit, 50))
     
-    return render_template('patient/book_appointment.html', form=form, doctor=doctor, availabilities=availabilities)
+    doctors = {d.id: d for d in doctors_in_department(department_id)}
+    slots = earliest_free_slots(department_id, start, end, limit)
+    return jsonify(department_id=department_id, start=start.isoformat(), end=end.isoformat(), slots=[{
+        'doctor_id': slot.doctor_id,
+        'doctor_name': doctors[slot.doctor_id].full_name if slot.doctor_id in doctors else None,
+        'date': slot.date.isoformat(),
+        'time': slot.start_time.strftime('%H:%M'),
+        'book_url': url_for('patient_book_appointment', doctor_id=slot.doctor_id),
+    } for slot in slots])
+
+def typeahead_limit():
+    # None means the default; anything that is not an integer is a 400.
+    value = request.args.get('limit')
+    return int(value) if value else None
+
+@app.route('/typeahead/doctors')
+@login_required
+@read_only
+def typeahead_doctors():
+    try:
+        limit = typeahead_limit()
+    except ValueError:
+        return jsonify(error='limit must be an integer'), 400
+    return jsonify(results=suggest_doctors(request.args.get('q', ''), limit))
+
+@app.route('/typeahead/patients')
+@login_required
+@read_only
+def typeahead_patients():
+    # A JSON endpoint: answer 403 rather than admin_required's redirect.
+    if current_user.role != 'admin':
+        return jsonify(error='Admin privileges required'), 403
+    try:
+        limit = typeahead_limit()
+    except ValueError:
+        return jsonify(error='limit must be an integer'), 400
+    return jsonify(results=suggest_patients(request.args.get('q', ''), limit))
 
 @app.route('/patient/appointments')
 @login_required
 @patient_required
+@read_only
 def patient_appointments():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    appointments = Appointment.query.filter_by(patient_id=patient.id).order_by(
-        Appointment.appointment_date.desc(), Appointment.appointment_time.desc()
-    ).all()
-    return render_template('patient/appointments.html', appointments=appointments)
+    patient = current_user.patient
+    return conditional_page(appointment_version(patient_id=patient.id), lambda: render_template(
+        'patient/appointments.html', appointments=patient_appointments_query(patient.id).all()))
 
 @app.route('/patient/appointment/<int:appointment_id>/cancel', methods=['POST'])
 @login_required
 @patient_required
 def patient_cancel_appointment(appointment_id):
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient = current_user.patient
     appointment = Appointment.query.get_or_404(appointment_id)
     
     if appointment.patient_id != patient.id:
         flash('Access denied.', 'danger')
         return redirect(url_for('patient_appointments'))
     
-    appointment.status = 'Cancelled'
-    db.session.commit()
+    def cancel():
+        appointment.status = 'Cancelled'
+        db.session.commit()
+    
+    write_transaction(cancel)
     flash('Appointment cancelled successfully!', 'success')
     return redirect(url_for('patient_appointments'))
 
 @app.route('/patient/history')
 @login_required
 @patient_required
+@read_only
 def patient_history():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    completed_appointments = Appointment.query.filter_by(
-        patient_id=patient.id,
-        status='Completed'
-    ).order_by(Appointment.appointment_date.desc()).all()
-    
-    return render_template('patient/history.html', appointments=completed_appointments)
+    patient = current_user.patient
+    return conditional_page(appointment_version(patient_id=patient.id), lambda: render_template(
+        'patient/history.html', appointments=patient_history_query(patient.id).all()))
 
 @app.template_filter('format_date')
 def format_date(value):
@@ -642,51 +933,80 @@ def format_time(value):
 @login_required
 @patient_required
 def add_lab_test():
-    test_name = request.form.get('test_name')
-    price = request.form.get('price')
-    
-    if not test_name or not price:
-        flash('Invalid test details.', 'danger')
+    patient = current_user.patient
+    try:
+        test_ids = request.form.getlist('test_id', type=int)
+        package_ids = request.form.getlist('package_id', type=int)
+        added = write_transaction(lambda: add_to_cart(patient.id, test_ids, package_ids))
+    except UnknownCatalogItem as e:
+        flash(str(e), 'danger')
         return redirect(url_for('patient_dashboard'))
     
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    
-    booking = LabBooking(
-        patient_id=patient.id,
-        test_name=test_name,
-        price=float(price)
-    )
-    
-    db.session.add(booking)
-    db.session.commit()
-    
-    flash(f'{test_name} added to your cart!', 'success')
+    if added:
+        flash(f"{', '.join(item.name for item in added)} added to your cart!", 'success')
+    else:
+        flash('Already in your cart.', 'info')
     return redirect(url_for('patient_dashboard'))
 
+@app.route('/patient/cart/items', methods=['POST'])
+@login_required
+@patient_required
+def patient_cart_add():
+    data = request.get_json(silent=True) or {}
+    try:
+        test_ids = [int(i) for i in data.get('tests', [])]
+        package_ids = [int(i) for i in data.get('packages', [])]
+    except (TypeError, ValueError):
+        return jsonify(error='tests and packages must be lists of ids'), 400
+    try:
+        patient_id = current_user.patient.id
+        added = write_transaction(lambda: add_to_cart(patient_id, test_ids, package_ids))
+    except UnknownCatalogItem as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(added=[{'name': item.name, 'price': item.price} for item in added]), 201
+
 @app.route('/patient/cart')
 @login_required
 @patient_required
+@read_only
 def patient_cart():
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
-    bookings = LabBooking.query.filter_by(patient_id=patient.id).order_by(LabBooking.booking_date.desc()).all()
-    total_amount = sum(booking.price for booking in bookings)
+    patient = current_user.patient
+    bookings = open_cart_query(patient.id).all()
+    summary = cart_summary(patient.id)
     
-    return render_template('patient/cart.html', bookings=bookings, total_amount=total_amount)
+    return render_template('patient/cart.html', bookings=bookings, total_amount=summary.total, summary=summary)
+
+@app.route('/patient/cart/checkout', methods=['POST'])
+@login_required
+@patient_required
+def patient_cart_checkout():
+    patient_id = current_user.patient.id
+    paid = write_transaction(lambda: checkout_cart(patient_id))
+    if paid:
+        flash(f'Payment received for {paid} lab test(s).', 'success')
+    else:
+        flash('Your cart is empty.', 'info')
+    return redirect(url_for('patient_cart'))
 
 @app.route('/patient/remove-lab-test/<int:booking_id>', methods=['POST'])
 @login_required
 @patient_required
 def remove_lab_test(booking_id):
     booking = LabBooking.query.get_or_404(booking_id)
-    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    patient = current_user.patient
     
     if booking.patient_id != patient.id:
         flash('Access denied.', 'danger')
         return redirect(url_for('patient_cart'))
+    if booking.status != OPEN_STATUS:
+        flash('Paid tests cannot be removed.', 'danger')
+        return redirect(url_for('patient_cart'))
     
-    db.session.delete(booking)
-    db.session.commit()
+    def remove_booking():
+        db.session.delete(booking)
+        db.session.commit()
     
+    write_transaction(remove_booking)
     flash('Item removed from cart.', 'success')
     return redirect(url_for('patient_cart'))
 
@@ -700,5 +1020,6 @@ if __name__ == '__main__':
             admin.set_password('admin123')
             db.session.add(admin)
             db.session.commit()
+        ensure_catalog()
     
     app.run(host='0.0.0.0', port=5000, debug=True)
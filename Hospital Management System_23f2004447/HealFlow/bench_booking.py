@@ -0,0 +1,140 @@
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time as clock
+from datetime import date, time, timedelta, datetime
+from slots import SLOT_MINUTES
+
+SLOTS_PER_DAY = 40
+
+def slot_times(count):
+    # (day, time) pairs on the booking grid, SLOTS_PER_DAY from midnight on
+    # each day starting tomorrow.
+    first = date.today() + timedelta(days=1)
+    return [(first + timedelta(days=i // SLOTS_PER_DAY),
+             (datetime.min + timedelta(minutes=SLOT_MINUTES * (i % SLOTS_PER_DAY))).time()) for i in range(count)]
+
+def setup(slots, processes):
+    from app import app
+    from models import db, User, Department, Doctor, Patient, DoctorAvailability
+    with app.app_context():
+        db.create_all()
+        dept = Department(name='Cardiology')
+        db.session.add(dept)
+        db.session.flush()
+        user = User(username='bench.doctor', email='bench.doctor@healflow.com', role='doctor', password_hash='-')
+        db.session.add(user)
+        db.session.flush()
+        doctor = Doctor(user_id=user.id, full_name='Dr. Bench', department_id=dept.id)
+        db.session.add(doctor)
+        patient_ids = []
+        for i in range(processes):
+            user = User(username=f'bench.patient{i}', email=f'bench{i}@healflow.com', role='patient', password_hash='-')
+            db.session.add(user)
+            db.session.flush()
+            patient = Patient(user_id=user.id, full_name=f'Bench Patient {i}')
+            db.session.add(patient)
+            db.session.flush()
+            patient_ids.append(patient.id)
+        for day in sorted({day for day, _ in slot_times(slots)}):
+            db.session.add(DoctorAvailability(doctor_id=doctor.id, date=day, start_time=time(0, 0),
+                                              end_time=time(SLOTS_PER_DAY * SLOT_MINUTES // 60)))
+        db.session.commit()
+        return doctor.id, patient_ids
+
+def worker(args):
+    patient_id, doctor_id, slots, seed = args
+    from sqlalchemy.exc import OperationalError
+    from app import app
+    from booking import book_slot, SlotUnavailable
+    from database import write_transaction
+    from models import db
+    tuned = app.config['SQLITE_TUNING']
+    times = slot_times(slots)
+    random.Random(seed).shuffle(times)
+    booked = conflicts = retries = 0
+    started = clock.time()
+    with app.app_context():
+        for day, at in times:
+            while True:
+                try:
+                    if tuned:
+                        write_transaction(lambda: book_slot(patient_id, doctor_id, day, at))
+                    else:
+                        book_slot(patient_id, doctor_id, day, at)
+                    booked += 1
+                except SlotUnavailable:
+                    conflicts += 1
+                except OperationalError:
+                    db.session.rollback()
+                    retries += 1
+                    continue
+                break
+    return booked, conflicts, retries, started, clock.time()
+
+def run(args, tuned):
+    # SQLITE_TUNING is read when app.py is imported, and every pool worker is
+    # a fresh spawned interpreter, so the environment decides the mode.
+    os.environ['SQLITE_TUNING'] = '1' if tuned else '0'
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'bench_booking.db')
+        os.environ['DATABASE_URL'] = f'sqlite:///{path}?timeout=30'
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        doctor_id, patient_ids = pool.apply(setup, (args.slots, args.processes))
+    jobs = [(pid, doctor_id, args.slots, i) for i, pid in enumerate(patient_ids)]
+
+    with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+        results = pool.map(worker, jobs)
+    # Measured inside the workers so interpreter start-up and imports in the
+    # spawned processes are not counted.
+    elapsed = max(r[4] for r in results) - min(r[3] for r in results)
+
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        stored, doubles = pool.apply(count_booked, (doctor_id,))
+
+    booked = sum(r[0] for r in results)
+    attempts = sum(r[0] + r[1] for r in results)
+    print(f"[{'tuned: WAL + writer path' if tuned else 'baseline'}] processes={args.processes} "
+          f"slots={args.slots} elapsed={elapsed:.2f}s")
+    print(f"  bookings={booked} ({booked / elapsed:.1f}/s)  attempts={attempts} ({attempts / elapsed:.1f}/s)  "
+          f"lock retries={sum(r[2] for r in results)}")
+    print(f"  stored booked rows={stored}  double-booked slots={doubles}")
+    if doubles or booked != args.slots or stored != args.slots:
+        raise SystemExit('FAILED: slot accounting does not match')
+    return attempts / elapsed
+
+def count_booked(doctor_id):
+    from sqlalchemy import func
+    from app import app
+    from models import db, Appointment
+    with app.app_context():
+        doubles = db.session.query(Appointment.appointment_date, Appointment.appointment_time).filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.status == 'Booked'
+        ).group_by(Appointment.appointment_date, Appointment.appointment_time).having(func.count(Appointment.id) > 1).count()
+        stored = Appointment.query.filter_by(doctor_id=doctor_id, status='Booked').count()
+    return stored, doubles
+
+def main():
+    parser = argparse.ArgumentParser(description='Hammer book_slot from several processes at once.')
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--slots', type=int, default=240)
+    parser.add_argument('--database-url', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--mode', choices=['baseline', 'tuned', 'compare'], default='compare',
+                        help='baseline: default journal, no writer path; tuned: WAL pragmas + write_transaction')
+    args = parser.parse_args()
+
+    rates = {}
+    for mode in (['baseline', 'tuned'] if args.mode == 'compare' else [args.mode]):
+        rates[mode] = run(args, mode == 'tuned')
+    if len(rates) == 2:
+        print(f"tuned/baseline attempt throughput: {rates['tuned'] / rates['baseline']:.2f}x")
+    print('OK: every slot booked exactly once')
+
+if __name__ == '__main__':
+    main()
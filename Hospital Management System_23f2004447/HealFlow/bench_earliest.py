@@ -0,0 +1,93 @@
+import argparse
+import heapq
+import os
+import statistics
+import tempfile
+import time as clock
+from datetime import date, time, timedelta, datetime
+from itertools import islice
+
+def populate(doctors, days, slots_per_day):
+    from sqlalchemy import insert
+    from app import app
+    from models import db, User, Department, Doctor, FreeSlot
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Department), [{'id': 1, 'name': 'Cardiology'}])
+        db.session.execute(insert(User), [
+            {'id': i, 'username': f'dr{i}', 'email': f'dr{i}@healflow.com', 'role': 'doctor', 'password_hash': '-'}
+            for i in range(1, doctors + 1)
+        ])
+        db.session.execute(insert(Doctor), [
+            {'id': i, 'user_id': i, 'full_name': f'Dr. Bench {i}', 'department_id': 1}
+            for i in range(1, doctors + 1)
+        ])
+        start = datetime.combine(date.today(), time(9, 0))
+        times = [(start + timedelta(minutes=30 * k)).time() for k in range(slots_per_day)]
+        for offset in range(1, days + 1):
+            day = date.today() + timedelta(days=offset)
+            # Each doctor starts at a different slot so the earliest ones are spread out.
+            db.session.execute(insert(FreeSlot), [
+                {'doctor_id': d, 'department_id': 1, 'date': day, 'start_time': t}
+                for d in range(1, doctors + 1) for t in times[d % slots_per_day:]
+            ])
+        db.session.commit()
+        return FreeSlot.query.count()
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = clock.perf_counter()
+        result = fn()
+        samples.append((clock.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+def main():
+    parser = argparse.ArgumentParser(description='Earliest free slots across one department.')
+    parser.add_argument('--doctors', type=int, default=3000)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--slots-per-day', type=int, default=16)
+    parser.add_argument('--limit', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_earliest.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    total = populate(args.doctors, args.days, args.slots_per_day)
+
+    from app import app
+    from models import db, FreeSlot
+    from slots import earliest_free_slots
+    start, end = date.today(), date.today() + timedelta(days=args.days)
+    key = lambda s: (s.date, s.start_time)
+
+    def index_merge():
+        return [key(s) for s in earliest_free_slots(1, start, end, args.limit)]
+
+    def per_doctor_heap_merge():
+        doctor_ids = [row[0] for row in db.session.query(FreeSlot.doctor_id).filter_by(department_id=1).distinct()]
+        streams = [
+            (key(s) for s in FreeSlot.query.filter(
+                FreeSlot.doctor_id == d, FreeSlot.date >= start, FreeSlot.date <= end
+            ).order_by(FreeSlot.date, FreeSlot.start_time).limit(args.limit))
+            for d in doctor_ids
+        ]
+        return list(islice(heapq.merge(*streams), args.limit))
+
+    def materialize_all():
+        rows = FreeSlot.query.filter(FreeSlot.department_id == 1, FreeSlot.date >= start, FreeSlot.date <= end).all()
+        return sorted(key(s) for s in rows)[:args.limit]
+
+    with app.app_context():
+        print(f"doctors={args.doctors} free slots={total} limit={args.limit}")
+        expected = None
+        for name, fn in [('index merge (earliest_free_slots)', index_merge),
+                         ('per-doctor heap merge', per_doctor_heap_merge),
+                         ('materialize + sort', materialize_all)]:
+            ms, result = timed(fn, args.runs)
+            db.session.expunge_all()
+            expected = expected or result
+            print(f"{name:36s} {ms:10.2f} ms  {'ok' if result == expected else 'MISMATCH'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time as clock
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        started = clock.perf_counter()
+        result = fn()
+        samples.append((clock.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare trigram FTS5 patient search with the ilike scan.')
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--terms', nargs='+', default=['Sharma', 'aditya v', '98765', 'syn.user4242', 'Kapor'])
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from seed_data import seed_synthetic
+    seed_synthetic(doctors=10, patients=args.patients, appointments=0)
+
+    from app import app
+    from models import db, Patient, User
+    from search import filter_patients, ranked_ids
+
+    def ilike(term):
+        return lambda: Patient.query.join(User, Patient.user_id == User.id).filter(
+            (Patient.full_name.ilike(f'%{term}%')) |
+            (Patient.phone.ilike(f'%{term}%')) |
+            (User.email.ilike(f'%{term}%'))
+        ).order_by(Patient.id).limit(26).all()
+
+    def fts(term):
+        return lambda: filter_patients(Patient.query, term).order_by(Patient.id).limit(26).all()
+
+    def ranked(term):
+        return lambda: ranked_ids('patients_fts', term, limit=10)
+
+    with app.app_context():
+        print(f"patients={args.patients:,}  (first page of 26, median of {args.runs} runs)")
+        print(f"{'term':16s} {'ilike ms':>10s} {'fts ms':>10s} {'ranked ms':>10s}  same rows")
+        for term in args.terms:
+            ilike_ms, expected = timed(ilike(term), args.runs)
+            fts_ms, found = timed(fts(term), args.runs)
+            ranked_ms, _ = timed(ranked(term), args.runs)
+            same = [p.id for p in expected] == [p.id for p in found]
+            print(f"{term:16s} {ilike_ms:10.2f} {fts_ms:10.2f} {ranked_ms:10.2f}  {'yes' if same else 'no'}")
+            db.session.expunge_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import db, Appointment, DoctorAvailability
+from slots import SLOT_MINUTES, expand_window, free_times
+
+SLOT_INDEX = 'uq_appointments_booked_slot'
+IN_THE_PAST = 'Appointments must be booked for a future date and time.'
+OUTSIDE_AVAILABILITY = 'The doctor is not available at that time. Please choose a time within their availability.'
+NOT_A_SLOT = f'Please choose one of the {SLOT_MINUTES}-minute slot start times listed for this doctor.'
+ALREADY_BOOKED = 'This time slot is already booked. Please choose a different time.'
+
+class SlotUnavailable(Exception):
+    pass
+
+def windows_statement(doctor_id, day):
+    return select(DoctorAvailability.start_time, DoctorAvailability.end_time).where(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date == day,
+        DoctorAvailability.is_available == True
+    )
+
+def booked_times_statement(doctor_id, day):
+    return select(Appointment.appointment_time).where(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date == day,
+        Appointment.status == 'Booked'
+    )
+
+def slot_error(day, at, windows, booked, now=None):
+    # Bookings start on the SLOT_MINUTES grid of an availability window, the
+    # same slots the free-slot index offers, so two bookings for one slot
+    # always share a start time and collide on SLOT_INDEX. A start that
+    # overlaps an existing booking (e.g. one imported off the grid) is taken.
+    if datetime.combine(day, at) <= (now or datetime.now()):
+        return IN_THE_PAST
+    if not any(start <= at < end for start, end in windows):
+        return OUTSIDE_AVAILABILITY
+    if not any(at in expand_window(day, start, end) for start, end in windows):
+        return NOT_A_SLOT
+    if at not in free_times(day, windows, booked):
+        return ALREADY_BOOKED
+    return None
+
+def check_slot(doctor_id, day, at, now=None):
+    windows = db.session.execute(windows_statement(doctor_id, day)).all()
+    booked = db.session.execute(booked_times_statement(doctor_id, day)).scalars().all()
+    error = slot_error(day, at, windows, booked, now)
+    if error:
+        raise SlotUnavailable(error)
+
+def is_slot_conflict(error):
+    # SQLite names the columns of the violated index, PostgreSQL its name.
+    message = str(getattr(error, 'orig', error))
+    return SLOT_INDEX in message or \
+        'appointments.doctor_id, appointments.appointment_date, appointments.appointment_time' in message
+
+def book_slot(patient_id, doctor_id, day, at, reason=None):
+    # The claim is the INSERT itself: uq_appointments_booked_slot allows one
+    # 'Booked' row per (doctor, date, time), so of two concurrent requests for
+    # the same slot, across any number of workers, exactly one commits.
+    check_slot(doctor_id, day, at)
+
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        appointment_date=day,
+        appointment_time=at,
+        reason=reason,
+        status='Booked'
+    )
+    db.session.add(appointment)
+    try:
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if not is_slot_conflict(e):
+            raise
+        raise SlotUnavailable(ALREADY_BOOKED)
+    return appointment
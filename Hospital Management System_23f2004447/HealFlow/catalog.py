@@ -0,0 +1,137 @@
+from collections import namedtuple, defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import db, LabTest, HealthPackage, LabBooking
+from directory import TTLCache
+
+LabTestSummary = namedtuple('LabTestSummary', 'id name description price')
+PackageSummary = namedtuple('PackageSummary', 'id name features icon price')
+Catalog = namedtuple('Catalog', 'tests packages tests_by_id packages_by_id')
+CartSummary = namedtuple('CartSummary', 'count total by_status')
+RevenueRow = namedtuple('RevenueRow', 'day test_name count total')
+RevenueReport = namedtuple('RevenueReport', 'rows by_test by_day count total')
+
+OPEN_STATUS = 'Confirmed'
+PAID_STATUS = 'Paid'
+
+DEFAULT_LAB_TESTS = [
+    {'name': 'CBC (Complete Blood Count)', 'price': 300},
+    {'name': 'Thyroid Profile', 'price': 500},
+    {'name': 'Vitamin D Test', 'price': 1000},
+    {'name': 'Liver Function Test', 'price': 400},
+]
+
+DEFAULT_HEALTH_PACKAGES = [
+    {'name': 'Full Body Checkup', 'price': 2999, 'features': 'Blood Test, X-Ray, ECG, Consultation', 'icon': 'bi-person-check'},
+    {'name': 'Heart Health', 'price': 4999, 'features': 'Lipid Profile, ECG, Echo, Cardiologist Consult', 'icon': 'bi-heart-pulse'},
+    {'name': 'Diabetes Care', 'price': 1999, 'features': 'HbA1c, Sugar Fasting, Diet Plan, Diabetologist Consult', 'icon': 'bi-droplet'},
+]
+
+MAX_CART_ITEMS = 20
+
+catalog_cache = TTLCache(maxsize=1)
+
+class UnknownCatalogItem(Exception):
+    pass
+
+def _split_features(features):
+    return tuple(part.strip() for part in (features or '').split(',') if part.strip())
+
+def _load_catalog():
+    tests = tuple(LabTestSummary(*row) for row in db.session.query(
+        LabTest.id, LabTest.name, LabTest.description, LabTest.price
+    ).filter(LabTest.active.is_(True)).order_by(LabTest.id))
+    packages = tuple(PackageSummary(row.id, row.name, _split_features(row.features), row.icon, row.price)
+                     for row in db.session.query(
+        HealthPackage.id, HealthPackage.name, HealthPackage.features, HealthPackage.icon, HealthPackage.price
+    ).filter(HealthPackage.active.is_(True)).order_by(HealthPackage.id))
+    return Catalog(tests, packages, {t.id: t for t in tests}, {p.id: p for p in packages})
+
+def lab_catalog():
+    return catalog_cache.get_or_load('catalog', _load_catalog)
+
+def invalidate_catalog():
+    catalog_cache.clear()
+
+def ensure_catalog():
+    # Seed the default catalog into an empty database; existing rows are
+    # left alone so admin price changes survive a re-run.
+    added = 0
+    if not db.session.query(LabTest.id).first():
+        db.session.add_all(LabTest(**row) for row in DEFAULT_LAB_TESTS)
+        added += len(DEFAULT_LAB_TESTS)
+    if not db.session.query(HealthPackage.id).first():
+        db.session.add_all(HealthPackage(**row) for row in DEFAULT_HEALTH_PACKAGES)
+        added += len(DEFAULT_HEALTH_PACKAGES)
+    if added:
+        db.session.commit()
+        invalidate_catalog()
+    return added
+
+def resolve_items(test_ids=(), package_ids=()):
+    # Prices always come from the catalog; the client only sends ids.
+    catalog = lab_catalog()
+    items = []
+    for ids, by_id in ((test_ids, catalog.tests_by_id), (package_ids, catalog.packages_by_id)):
+        for item_id in dict.fromkeys(ids):
+            item = by_id.get(item_id)
+            if item is None:
+                raise UnknownCatalogItem('Selected test is no longer available.')
+            items.append(item)
+    return items
+
+def add_to_cart(patient_id, test_ids=(), package_ids=()):
+    items = resolve_items(test_ids, package_ids)
+    if not items:
+        raise UnknownCatalogItem('Select at least one test.')
+    if len(items) > MAX_CART_ITEMS:
+        raise UnknownCatalogItem(f'At most {MAX_CART_ITEMS} tests can be added at once.')
+    in_cart = {name for name, in db.session.query(LabBooking.test_name).filter(
+        LabBooking.patient_id == patient_id,
+        LabBooking.status == OPEN_STATUS,
+        LabBooking.test_name.in_([item.name for item in items])
+    )}
+    added = [item for item in items if item.name not in in_cart]
+    db.session.add_all(LabBooking(patient_id=patient_id, test_name=item.name, price=item.price) for item in added)
+    db.session.commit()
+    return added
+
+def open_cart_query(patient_id):
+    return LabBooking.query.filter_by(patient_id=patient_id, status=OPEN_STATUS).order_by(LabBooking.booking_date.desc())
+
+def cart_summary(patient_id):
+    rows = db.session.query(
+        LabBooking.status, func.count(LabBooking.id), func.coalesce(func.sum(LabBooking.price), 0)
+    ).filter(LabBooking.patient_id == patient_id).group_by(LabBooking.status)
+    by_status = {status: (count, total) for status, count, total in rows}
+    count, total = by_status.get(OPEN_STATUS, (0, 0))
+    return CartSummary(count, total, by_status)
+
+def checkout_cart(patient_id):
+    paid = LabBooking.query.filter_by(patient_id=patient_id, status=OPEN_STATUS).update(
+        {LabBooking.status: PAID_STATUS, LabBooking.paid_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    return paid
+
+def lab_revenue_report(start, end):
+    # One GROUP BY (day, test) over paid bookings; the per-test and per-day
+    # totals are rolled up from those few aggregate rows, not from bookings.
+    day = func.date(LabBooking.paid_at)
+    rows = [RevenueRow(*row) for row in db.session.query(
+        day, LabBooking.test_name, func.count(LabBooking.id), func.sum(LabBooking.price)
+    ).filter(
+        LabBooking.status == PAID_STATUS,
+        LabBooking.paid_at >= datetime.combine(start, datetime.min.time()),
+        LabBooking.paid_at < datetime.combine(end + timedelta(days=1), datetime.min.time())
+    ).group_by(day, LabBooking.test_name).order_by(day, LabBooking.test_name)]
+    by_test, by_day = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+    for row in rows:
+        for bucket in (by_test[row.test_name], by_day[row.day]):
+            bucket[0] += row.count
+            bucket[1] += row.total
+    return RevenueReport(rows, sorted(by_test.items(), key=lambda item: -item[1][1]), sorted(by_day.items()),
+                         sum(row.count for row in rows), sum(row.total for row in rows))
+
+def init_catalog(app):
+    catalog_cache.ttl = app.config.get('CATALOG_CACHE_TTL', catalog_cache.ttl)
@@ -0,0 +1,55 @@
+import hashlib
+import os
+from datetime import timezone
+from flask import request, session, make_response, current_app
+from flask_login import current_user
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+from models import db, Appointment, StatCounter
+from stats import NAMES_VERSION
+
+def appointment_version(doctor_id=None, patient_id=None):
+    # One aggregate over the doctor's or patient's rows (both lead an index).
+    # The count and max id catch inserts and deletes, updated_at catches
+    # status changes and completed treatments, and the names version catches
+    # renamed doctors, departments and patients. Edits made with raw SQL
+    # bypass the session events and do not move the names version.
+    names = db.select(StatCounter.value).where(StatCounter.name == NAMES_VERSION).scalar_subquery()
+    query = db.session.query(func.count(Appointment.id), func.max(Appointment.id), names,
+                             func.max(Appointment.updated_at))
+    if doctor_id is not None:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    if patient_id is not None:
+        query = query.filter(Appointment.patient_id == patient_id)
+    return query.one()
+
+def _etag(version):
+    # The user is part of the tag because the page chrome (nav, name) is
+    # theirs, and the release so a deploy with new templates misses.
+    key = f'{current_app.config["ETAG_RELEASE"]}:{request.endpoint}:{current_user.id}:{version}'
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+def conditional_page(version, render):
+    # Pending flash messages are rendered into the page, so a 304 would
+    # swallow them; those requests always get a full response. Only the
+    # ETag can answer 304: a deletion or a rename leaves max(updated_at),
+    # and so Last-Modified, where it was.
+    etag = _etag(version)
+    last_modified = version[-1].replace(tzinfo=timezone.utc) if version[-1] else None
+    if '_flashes' in session or is_resource_modified(request.environ, etag=etag):
+        response = make_response(render())
+    else:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _templates_mtime(app):
+    folder = os.path.join(app.root_path, app.template_folder)
+    return max((os.path.getmtime(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names),
+               default=0)
+
+def init_conditional(app):
+    app.config.setdefault('ETAG_RELEASE', os.environ.get('RELEASE') or int(_templates_mtime(app)))
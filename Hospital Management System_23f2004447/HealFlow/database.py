@@ -0,0 +1,171 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import weakref
+import time as clock
+from flask import has_request_context
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from models import db
+
+DEFAULT_DATABASE_URL = 'sqlite:///hospital.db'
+
+SQLITE_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -64 * 1024),
+    ('busy_timeout', 5000),
+)
+WRITE_ATTEMPTS = 6
+WRITE_BACKOFF = 0.02
+
+_write_lock = threading.Lock()
+_statement_hooks = []
+_async_write_locks = weakref.WeakKeyDictionary()
+
+def database_url(environ=os.environ):
+    url = environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    # Heroku-style URLs use the scheme SQLAlchemy 1.4+ no longer accepts.
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def async_database_url(url):
+    # Same database, asyncio driver: aiosqlite for SQLite, asyncpg for PostgreSQL.
+    scheme, rest = url.split('://', 1)
+    driver = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}.get(scheme.split('+')[0])
+    if driver is None:
+        raise ValueError(f'No async driver configured for {scheme}')
+    return f'{driver}://{rest}'
+
+def engine_options(url, environ=os.environ):
+    if url.startswith('sqlite'):
+        return {}
+    # Each gunicorn worker gets its own pool, so workers * (pool_size +
+    # max_overflow) has to stay under the server's max_connections.
+    return {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', '1') != '0',
+    }
+
+def sync_sequences():
+    # Bulk loaders insert explicit ids; on PostgreSQL the serial sequences
+    # have to be moved past them or the next ORM insert collides.
+    if db.engine.dialect.name != 'postgresql':
+        return
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if 'id' in table.c and table.c.id.primary_key and table.c.id.autoincrement is not False:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table.name}), 0) + 1, false)"
+                ))
+
+def init_sqlite_tuning(app):
+    # WAL lets readers run alongside the single writer, and busy_timeout makes
+    # a second writer wait for the lock instead of failing straight away.
+    if not app.config.get('SQLITE_TUNING') or not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+
+    @event.listens_for(Engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            apply_sqlite_pragmas(dbapi_connection)
+
+def on_statement(hook):
+    # hook(conn, statement, parameters, executemany, seconds) runs after every
+    # statement a request sends through the app's engines. The query budget,
+    # metrics and slow query log share this one timer instead of each putting
+    # listeners on every Engine in the process.
+    _statement_hooks.append(hook)
+    return hook
+
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info['statement_started'] = clock.perf_counter()
+
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('statement_started', None)
+    if started is None or not has_request_context():
+        return
+    seconds = clock.perf_counter() - started
+    for hook in _statement_hooks:
+        hook(conn, statement, parameters, executemany, seconds)
+
+def init_cursor_hooks(app):
+    # Call again whenever Flask-SQLAlchemy builds new engines (primary and
+    # replica binds alike).
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'before_cursor_execute', _start_statement):
+                event.listen(engine, 'before_cursor_execute', _start_statement)
+                event.listen(engine, 'after_cursor_execute', _finish_statement)
+
+def apply_sqlite_pragmas(dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS:
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+def _is_locked(error):
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database is busy' in message
+
+def write_transaction(work, attempts=WRITE_ATTEMPTS):
+    # The writer path for SQLite: one writer per process at a time, the write
+    # lock taken up front with BEGIN IMMEDIATE (so a deferred transaction
+    # never fails to upgrade half way), and jittered exponential backoff when
+    # another process still holds it after busy_timeout. `work` must add its
+    # rows and commit; it is re-run from scratch after a rollback. If it
+    # returns without committing (nothing to write), the transaction is
+    # rolled back so the write lock is not held until request teardown.
+    try:
+        if db.session.get_bind().dialect.name != 'sqlite':
+            return work()
+        for attempt in range(attempts):
+            try:
+                with _write_lock:
+                    raw = db.session.connection().connection.dbapi_connection
+                    if not raw.in_transaction:
+                        raw.execute('BEGIN IMMEDIATE')
+                    return work()
+            except OperationalError as e:
+                db.session.rollback()
+                if not _is_locked(e) or attempt == attempts - 1:
+                    raise
+                clock.sleep(WRITE_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+    finally:
+        if db.session().in_transaction():
+            db.session.rollback()
+
+async def async_write_transaction(session, work, attempts=WRITE_ATTEMPTS):
+    # write_transaction for an AsyncSession (the JSON API): one writer per
+    # event loop, BEGIN IMMEDIATE on the aiosqlite connection, the same
+    # backoff and the same rollback when `work` does not commit.
+    # `work(session)` is a coroutine that adds its rows and commits.
+    try:
+        if session.bind.dialect.name != 'sqlite':
+            return await work(session)
+        for attempt in range(attempts):
+            try:
+                lock = _async_write_locks.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+                async with lock:
+                    connection = await session.connection()
+                    raw = (await connection.get_raw_connection()).driver_connection
+                    if not raw.in_transaction:
+                        await raw.execute('BEGIN IMMEDIATE')
+                    return await work(session)
+            except OperationalError as e:
+                await session.rollback()
+                if not _is_locked(e) or attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(WRITE_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+    finally:
+        if session.in_transaction():
+            await session.rollback()
@@ -0,0 +1,94 @@
+import threading
+import time as clock
+from collections import OrderedDict, namedtuple
+from sqlalchemy import func
+from models import db, Department, Doctor
+
+DepartmentSummary = namedtuple('DepartmentSummary', 'id name description created_at doctor_count')
+DoctorSummary = namedtuple('DoctorSummary', 'id full_name department_id department_name phone '
+                                            'qualification experience_years consultation_fee')
+
+class TTLCache:
+    # Entries expire after `ttl` seconds; past `maxsize` the least recently
+    # used entry is evicted. The cache is per process, so other gunicorn
+    # workers see an invalidation only once their own copy expires.
+    def __init__(self, maxsize=128, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        now = clock.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = loader()
+        with self._lock:
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+directory_cache = TTLCache()
+
+def _load_departments():
+    rows = db.session.query(
+        Department.id, Department.name, Department.description, Department.created_at,
+        func.count(Doctor.id)
+    ).outerjoin(Doctor).group_by(Department.id).order_by(Department.id).all()
+    return tuple(DepartmentSummary(*row) for row in rows)
+
+def _load_doctors(department_id=None):
+    query = db.session.query(
+        Doctor.id, Doctor.full_name, Doctor.department_id, Department.name, Doctor.phone,
+        Doctor.qualification, Doctor.experience_years, Doctor.consultation_fee
+    ).join(Department)
+    if department_id is not None:
+        query = query.filter(Doctor.department_id == department_id)
+    return tuple(DoctorSummary(*row) for row in query.order_by(Doctor.id))
+
+def department_summaries():
+    return directory_cache.get_or_load('departments', _load_departments)
+
+def department_choices():
+    return [(d.id, d.name) for d in department_summaries()]
+
+def doctor_summaries():
+    return directory_cache.get_or_load('doctors', _load_doctors)
+
+def doctors_in_department(department_id):
+    return directory_cache.get_or_load(('doctors', department_id), lambda: _load_doctors(department_id))
+
+def invalidate_directory():
+    directory_cache.clear()
+
+def init_directory(app):
+    directory_cache.ttl = app.config.get('DIRECTORY_CACHE_TTL', directory_cache.ttl)
+    directory_cache.maxsize = app.config.get('DIRECTORY_CACHE_SIZE', directory_cache.maxsize)
@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from datetime import date, time, datetime
+from sqlalchemy import select
+from models import db, Appointment, Patient, Doctor, Department, Treatment
+
+EXPORT_BATCH_SIZE = 2000
+# Spreadsheets run a cell that starts with one of these as a formula.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+COLUMNS = [
+    ('appointment_id', Appointment.id),
+    ('appointment_date', Appointment.appointment_date),
+    ('appointment_time', Appointment.appointment_time),
+    ('status', Appointment.status),
+    ('reason', Appointment.reason),
+    ('patient_id', Patient.id),
+    ('patient_name', Patient.full_name),
+    ('doctor_id', Doctor.id),
+    ('doctor_name', Doctor.full_name),
+    ('department', Department.name),
+    ('consultation_fee', Doctor.consultation_fee),
+    ('diagnosis', Treatment.diagnosis),
+    ('prescription', Treatment.prescription),
+    ('treatment_notes', Treatment.notes),
+    ('created_at', Appointment.created_at),
+]
+
+def export_statement(start=None, end=None):
+    stmt = select(*[column for _, column in COLUMNS]) \
+        .join(Patient, Appointment.patient_id == Patient.id) \
+        .join(Doctor, Appointment.doctor_id == Doctor.id) \
+        .join(Department, Doctor.department_id == Department.id) \
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.id)
+    if start:
+        stmt = stmt.where(Appointment.appointment_date >= start)
+    if end:
+        stmt = stmt.where(Appointment.appointment_date <= end)
+    return stmt.order_by(Appointment.id)
+
+def iter_export_rows(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    # yield_per turns on stream_results (a server-side cursor where the
+    # driver has one) and fetches in batches, so memory is one batch deep.
+    result = db.session.execute(export_statement(start, end).execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+def _plain(value):
+    if isinstance(value, (date, time, datetime)):
+        return value.isoformat()
+    return value
+
+def _csv_cell(value):
+    value = _plain(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def generate_csv(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in COLUMNS])
+    yield buffer.getvalue()
+    for partition in iter_export_rows(start, end, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_cell(v) for v in row] for row in partition)
+        yield buffer.getvalue()
+
+def generate_jsonl(start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    names = [name for name, _ in COLUMNS]
+    for partition in iter_export_rows(start, end, batch_size):
+        yield ''.join(json.dumps(dict(zip(names, map(_plain, row)))) + '\n' for row in partition)
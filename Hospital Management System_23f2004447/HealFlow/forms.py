@@ -1,7 +1,15 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SelectField, TextAreaField, DateField, TimeField, IntegerField, FloatField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, ValidationError
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import (StringField, PasswordField, SelectField, TextAreaField, DateField, TimeField, IntegerField, FloatField,
+                     BooleanField)
+from wtforms.validators import DataRequired, InputRequired, Email, EqualTo, Length, Optional, NumberRange, ValidationError
 from datetime import date
+import math
+
+def finite(form, field):
+    # float() accepts "nan" and "inf", and NumberRange lets nan through.
+    if field.data is not None and not math.isfinite(field.data):
+        raise ValidationError('Must be a number.')
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=3, max=80)])
@@ -36,8 +44,8 @@ class DoctorForm(FlaskForm):
     department_id = SelectField('Department/Specialization', coerce=int, validators=[DataRequired()])
     phone = StringField('Phone Number', validators=[DataRequired(), Length(max=20)])
     qualification = StringField('Qualification', validators=[DataRequired(), Length(max=200)])
-    experience_years = IntegerField('Years of Experience', validators=[DataRequired()])
-    consultation_fee = FloatField('Consultation Fee', validators=[DataRequired()])
+    experience_years = IntegerField('Years of Experience', validators=[InputRequired(), NumberRange(min=0)])
+    consultation_fee = FloatField('Consultation Fee', validators=[InputRequired(), finite, NumberRange(min=0)])
 
 class DepartmentForm(FlaskForm):
     name = StringField('Department Name', validators=[DataRequired(), Length(max=100)])
@@ -58,3 +66,22 @@ class DoctorAvailabilityForm(FlaskForm):
     date = DateField('Date', validators=[DataRequired()])
     start_time = TimeField('Start Time', validators=[DataRequired()])
     end_time = TimeField('End Time', validators=[DataRequired()])
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Import', choices=[('patients', 'Patients'), ('doctors', 'Doctors'), ('appointments', 'Appointments')], validators=[DataRequired()])
+    file = FileField('CSV or JSONL File', validators=[FileRequired(), FileAllowed(['csv', 'jsonl', 'ndjson'], 'CSV or JSONL files only.')])
+
+class LabTestForm(FlaskForm):
+    name = StringField('Test Name', validators=[DataRequired(), Length(max=100)])
+    description = TextAreaField('Description', validators=[Optional()])
+    price = FloatField('Price', validators=[InputRequired(), finite, NumberRange(min=0)])
+
+class HealthPackageForm(FlaskForm):
+    name = StringField('Package Name', validators=[DataRequired(), Length(max=100)])
+    features = StringField('Included Tests (comma separated)', validators=[Optional()])
+    icon = StringField('Bootstrap Icon', validators=[Optional(), Length(max=50)])
+    price = FloatField('Price', validators=[InputRequired(), finite, NumberRange(min=0)])
+
+class LabItemForm(FlaskForm):
+    price = FloatField('Price', validators=[InputRequired(), finite, NumberRange(min=0)])
+    active = BooleanField('Active')
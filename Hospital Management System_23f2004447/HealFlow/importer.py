@@ -0,0 +1,347 @@
+import argparse
+import csv
+import io
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import generate_password_hash
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Doctor, Patient, Appointment, DoctorAvailability, ImportJob
+from forms import PatientRegistrationForm, DoctorForm, AppointmentForm
+from directory import department_summaries, doctor_summaries, invalidate_directory
+from database import write_transaction
+from booking import slot_error
+from exporter import FORMULA_PREFIXES
+
+KINDS = ('doctors', 'patients', 'appointments')
+DEFAULT_PASSWORDS = {'doctors': 'doctor123', 'patients': 'patient123'}
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+class ImportReport:
+    # Keeps totals and only the first MAX_REPORTED_ERRORS errors, so memory
+    # stays flat however many rows fail; `on_error` can stream all of them.
+    def __init__(self, on_error=None):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.on_error = on_error
+
+    def add_error(self, line, messages):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, messages))
+        if self.on_error:
+            self.on_error(line, messages)
+
+def detect_format(filename):
+    return 'jsonl' if os.path.splitext(filename or '')[1].lower() in ('.jsonl', '.ndjson') else 'csv'
+
+def _csv_value(value):
+    # Undo the quote the exporter puts in front of formula-like cells.
+    value = value or ''
+    if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+        value = value[1:]
+    return value.strip()
+
+def iter_records(stream, fmt):
+    # Yields (line, record, error) one row at a time.
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, {k.strip(): _csv_value(v) for k, v in record.items() if k}, None
+        return
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, None, f'invalid JSON: {e}'
+            continue
+        if not isinstance(record, dict):
+            yield line, None, 'expected a JSON object'
+            continue
+        yield line, {k: '' if v is None else str(v).strip() for k, v in record.items()}, None
+
+def _chunks(records, size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _form_errors(form):
+    return [f'{name}: {message}' for name, messages in form.errors.items() for message in messages]
+
+class _Importer:
+    def __init__(self, kind):
+        self.kind = kind
+        self._hashes = {}
+        self.departments = {d.name.lower(): d.id for d in department_summaries()}
+        self.department_choices = [(d.id, d.name) for d in department_summaries()]
+        self.doctor_choices = [(d.id, d.full_name) for d in doctor_summaries()]
+
+    def password_hash(self, password):
+        # The shared default password is hashed once per import; explicit
+        # passwords are hashed per row as the register form would.
+        if password != DEFAULT_PASSWORDS.get(self.kind):
+            return generate_password_hash(password)
+        if password not in self._hashes:
+            self._hashes[password] = generate_password_hash(password)
+        return self._hashes[password]
+
+    def validate(self, record):
+        data = dict(record)
+        if self.kind == 'patients':
+            data.setdefault('password', DEFAULT_PASSWORDS['patients'])
+            data.setdefault('confirm_password', data['password'])
+            form = PatientRegistrationForm(formdata=MultiDict(data), meta={'csrf': False})
+        elif self.kind == 'doctors':
+            if not data.get('department_id') and data.get('department'):
+                data['department_id'] = str(self.departments.get(data['department'].lower(), ''))
+            form = DoctorForm(formdata=MultiDict(data), meta={'csrf': False})
+            form.department_id.choices = self.department_choices
+        else:
+            form = AppointmentForm(formdata=MultiDict(data), meta={'csrf': False})
+            form.doctor_id.choices = self.doctor_choices
+        if not form.validate():
+            return None, _form_errors(form)
+        if self.kind == 'appointments' and not (data.get('patient_id') or data.get('patient_username')):
+            return None, ['patient_id or patient_username: This field is required.']
+        if self.kind == 'appointments' and (data.get('status') or 'Booked') not in ('Booked', 'Completed', 'Cancelled'):
+            return None, ['status: must be Booked, Completed or Cancelled']
+        return (form, data), []
+
+    def build_chunk(self, rows):
+        # rows: [(line, (form, data))]. Checks that need the database are
+        # done once per chunk with IN queries, then ORM objects are built.
+        built, errors = [], []
+        if self.kind in ('doctors', 'patients'):
+            usernames = {f.username.data for _, (f, _) in rows}
+            emails = {f.email.data for _, (f, _) in rows}
+            taken = set()
+            for username, email in db.session.query(User.username, User.email).filter(
+                User.username.in_(usernames) | User.email.in_(emails)
+            ):
+                taken.update((username, email))
+            for line, (form, data) in rows:
+                if form.username.data in taken or form.email.data in taken:
+                    errors.append((line, ['Username or email already exists.']))
+                    continue
+                taken.update((form.username.data, form.email.data))
+                built.append((line, self._profile(form)))
+            return built, errors
+
+        usernames = {d['patient_username'] for _, (_, d) in rows if d.get('patient_username')}
+        ids = {int(d['patient_id']) for _, (_, d) in rows if d.get('patient_id', '').isdigit()}
+        by_username = dict(db.session.query(User.username, Patient.id).join(Patient).filter(User.username.in_(usernames)))
+        known_ids = {pid for (pid,) in db.session.query(Patient.id).filter(Patient.id.in_(ids))}
+        # New 'Booked' rows follow the same rules as booking.book_slot: a
+        # future slot start inside an availability window, not already taken.
+        doctor_ids = {f.doctor_id.data for _, (f, _) in rows}
+        days = {f.appointment_date.data for _, (f, _) in rows}
+        windows, booked = defaultdict(list), defaultdict(list)
+        for doctor_id, day, start, end in db.session.query(
+            DoctorAvailability.doctor_id, DoctorAvailability.date, DoctorAvailability.start_time, DoctorAvailability.end_time
+        ).filter(
+            DoctorAvailability.doctor_id.in_(doctor_ids),
+            DoctorAvailability.date.in_(days),
+            DoctorAvailability.is_available == True
+        ):
+            windows[(doctor_id, day)].append((start, end))
+        for doctor_id, day, at in db.session.query(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time).filter(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.appointment_date.in_(days),
+            Appointment.status == 'Booked'
+        ):
+            booked[(doctor_id, day)].append(at)
+        for line, (form, data) in rows:
+            if data.get('patient_username'):
+                patient_id = by_username.get(data['patient_username'])
+            else:
+                patient_id = int(data['patient_id']) if data['patient_id'].isdigit() else None
+                patient_id = patient_id if patient_id in known_ids else None
+            if patient_id is None:
+                errors.append((line, ['patient: no such patient']))
+                continue
+            status = data.get('status') or 'Booked'
+            key = (form.doctor_id.data, form.appointment_date.data)
+            if status == 'Booked':
+                error = slot_error(form.appointment_date.data, form.appointment_time.data, windows[key], booked[key])
+                if error:
+                    errors.append((line, [error]))
+                    continue
+                booked[key].append(form.appointment_time.data)
+            built.append((line, Appointment(
+                patient_id=patient_id,
+                doctor_id=form.doctor_id.data,
+                appointment_date=form.appointment_date.data,
+                appointment_time=form.appointment_time.data,
+                reason=form.reason.data,
+                status=status
+            )))
+        return built, errors
+
+    def _profile(self, form):
+        role = 'doctor' if self.kind == 'doctors' else 'patient'
+        user = User(username=form.username.data, email=form.email.data, role=role,
+                    password_hash=self.password_hash(form.password.data or DEFAULT_PASSWORDS[self.kind]))
+        if self.kind == 'doctors':
+            return Doctor(
+                user=user,
+                full_name=form.full_name.data,
+                department_id=form.department_id.data,
+                phone=form.phone.data,
+                qualification=form.qualification.data,
+                experience_years=form.experience_years.data,
+                consultation_fee=form.consultation_fee.data
+            )
+        return Patient(
+            user=user,
+            full_name=form.full_name.data,
+            phone=form.phone.data,
+            date_of_birth=form.date_of_birth.data,
+            gender=form.gender.data,
+            address=form.address.data,
+            blood_group=form.blood_group.data
+        )
+
+def _add_and_commit(objects):
+    db.session.add_all(objects)
+    db.session.commit()
+
+def _commit(built, report):
+    try:
+        write_transaction(lambda: _add_and_commit([obj for _, obj in built]))
+        report.imported += len(built)
+    except IntegrityError:
+        # Lost a race with another writer: retry row by row to find the culprit.
+        db.session.rollback()
+        for line, obj in built:
+            try:
+                write_transaction(lambda: _add_and_commit([obj]))
+                report.imported += 1
+            except IntegrityError:
+                db.session.rollback()
+                report.add_error(line, ['conflicts with an existing record'])
+
+def import_stream(kind, stream, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE, report=None, progress=None):
+    # `progress(report)` runs after every chunk.
+    if kind not in KINDS:
+        raise ValueError(f'kind must be one of {", ".join(KINDS)}')
+    report = report or ImportReport()
+    importer = _Importer(kind)
+    for chunk in _chunks(iter_records(stream, fmt), chunk_size):
+        valid = []
+        for line, record, error in chunk:
+            if error:
+                report.add_error(line, [error])
+                continue
+            validated, errors = importer.validate(record)
+            if errors:
+                report.add_error(line, errors)
+            else:
+                valid.append((line, validated))
+        built, errors = importer.build_chunk(valid) if valid else ([], [])
+        for line, messages in errors:
+            report.add_error(line, messages)
+        if built:
+            _commit(built, report)
+        if progress:
+            progress(report)
+    if kind == 'doctors' and report.imported:
+        invalidate_directory()
+    return report
+
+def open_text(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+def import_dir(app):
+    return app.config.get('IMPORT_DIR') or os.path.join(app.instance_path, 'imports')
+
+def save_upload(upload, directory):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, uuid.uuid4().hex + os.path.splitext(upload.filename or '')[1].lower())
+    upload.save(path)
+    return path
+
+def queue_import(kind, filename, path):
+    job = ImportJob(kind=kind, filename=filename, path=path, status='Queued')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def _update_job(job_id, **values):
+    def work():
+        ImportJob.query.filter_by(id=job_id).update(values)
+        db.session.commit()
+    write_transaction(work)
+
+def run_import(job_id):
+    # Imports a queued upload and records progress (share of the file read)
+    # on the job row after every chunk. The upload is removed before the job
+    # is marked finished, so a finished job never leaves a file behind.
+    job = db.session.get(ImportJob, job_id)
+    kind, path, fmt = job.kind, job.path, detect_format(job.filename)
+    _update_job(job_id, status='Running')
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as binary:
+            report = import_stream(kind, open_text(binary), fmt, progress=lambda report: _update_job(
+                job_id, progress=min(99, binary.tell() * 100 // size), imported=report.imported, failed=report.failed))
+    except Exception as e:
+        db.session.rollback()
+        os.remove(path)
+        _update_job(job_id, status='Failed', message=str(e), finished_at=datetime.utcnow())
+        raise
+    os.remove(path)
+    _update_job(job_id, status='Done', progress=100, imported=report.imported, failed=report.failed,
+                errors=json.dumps(report.errors), finished_at=datetime.utcnow())
+    return report
+
+def start_import(app, job_id):
+    def work():
+        with app.app_context():
+            try:
+                run_import(job_id)
+            except Exception:
+                app.logger.exception('Import job %s failed', job_id)
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=work, daemon=True, name=f'import-{job_id}')
+    thread.start()
+    return thread
+
+def job_errors(job):
+    return json.loads(job.errors) if job.errors else []
+
+if __name__ == '__main__':
+    from app import app
+    parser = argparse.ArgumentParser(description='Import doctors, patients or appointments from CSV/JSONL.')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=('csv', 'jsonl'))
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--errors', help='write every rejected row to this file')
+    args = parser.parse_args()
+
+    error_file = open(args.errors, 'w', newline='') if args.errors else None
+    error_writer = csv.writer(error_file) if error_file else None
+    report = ImportReport(on_error=(lambda line, messages: error_writer.writerow([line, '; '.join(messages)]))
+                          if error_writer else None)
+    with app.app_context(), open(args.path, 'rb') as binary:
+        import_stream(args.kind, open_text(binary), args.format or detect_format(args.path), args.chunk_size, report)
+    if error_file:
+        error_file.close()
+    print(f"✓ {report.imported:,} {args.kind} imported, {report.failed:,} rows rejected")
+    for line, messages in report.errors[:10]:
+        print(f"  line {line}: {'; '.join(messages)}")
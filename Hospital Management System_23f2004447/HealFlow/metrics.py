@@ -0,0 +1,116 @@
+import bisect
+import threading
+import time as clock
+from collections import defaultdict
+from flask import g, request
+from database import on_statement
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    # Plain dicts behind one lock; recording a request is a few dict updates.
+    # Numbers are per process, so with several gunicorn workers each scrape
+    # sees the worker that answered it.
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._requests = defaultdict(int)
+        self._db_queries = defaultdict(int)
+        self._db_seconds = defaultdict(float)
+
+    def record(self, endpoint, method, status, seconds, db_queries, db_seconds):
+        with self._lock:
+            histogram = self._histograms.get((endpoint, method))
+            if histogram is None:
+                histogram = self._histograms[(endpoint, method)] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            self._requests[(endpoint, method, status)] += 1
+            self._db_queries[endpoint] += db_queries
+            self._db_seconds[endpoint] += db_seconds
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+            self._db_queries.clear()
+            self._db_seconds.clear()
+
+    def render(self):
+        with self._lock:
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+            requests = dict(self._requests)
+            db_queries = dict(self._db_queries)
+            db_seconds = dict(self._db_seconds)
+        lines = [
+            '# HELP healflow_request_duration_seconds Request latency by endpoint.',
+            '# TYPE healflow_request_duration_seconds histogram',
+        ]
+        for (endpoint, method), (counts, total) in sorted(histograms.items()):
+            labels = f'endpoint="{endpoint}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'healflow_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'healflow_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'healflow_request_duration_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'healflow_request_duration_seconds_count{{{labels}}} {cumulative}')
+        lines += [
+            '# HELP healflow_requests_total Requests by endpoint and status code.',
+            '# TYPE healflow_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'healflow_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+        lines += [
+            '# HELP healflow_db_queries_total SQL statements issued by endpoint.',
+            '# TYPE healflow_db_queries_total counter',
+        ]
+        for endpoint, count in sorted(db_queries.items()):
+            lines.append(f'healflow_db_queries_total{{endpoint="{endpoint}"}} {count}')
+        lines += [
+            '# HELP healflow_db_seconds_total Time spent in SQL statements by endpoint.',
+            '# TYPE healflow_db_seconds_total counter',
+        ]
+        for endpoint, seconds in sorted(db_seconds.items()):
+            lines.append(f'healflow_db_seconds_total{{endpoint="{endpoint}"}} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+def init_metrics(app):
+    @on_statement
+    def finish_statement(conn, statement, parameters, executemany, seconds):
+        if 'metrics_started' in g:
+            g.metrics_db_queries += 1
+            g.metrics_db_seconds += seconds
+
+    @app.before_request
+    def start_request():
+        g.metrics_started = clock.perf_counter()
+        g.metrics_db_queries = 0
+        g.metrics_db_seconds = 0.0
+
+    @app.after_request
+    def finish_request(response):
+        if 'metrics_started' not in g:
+            return response
+        seconds = clock.perf_counter() - g.pop('metrics_started')
+        metrics.record(_endpoint(), request.method, response.status_code, seconds,
+                       g.metrics_db_queries, g.metrics_db_seconds)
+        if app.config.get('SERVER_TIMING', True):
+            response.headers.add('Server-Timing', f'db;dur={g.metrics_db_seconds * 1000:.1f};'
+                                                  f'desc="{g.metrics_db_queries} queries"')
+            response.headers.add('Server-Timing', f'app;dur={seconds * 1000:.1f}')
+        return response
+
+    @app.teardown_request
+    def finish_failed_request(exc):
+        # after_request is skipped when the view raised; count it as a 500.
+        if exc is not None and 'metrics_started' in g:
+            metrics.record(_endpoint(), request.method, 500, clock.perf_counter() - g.pop('metrics_started'),
+                           g.metrics_db_queries, g.metrics_db_seconds)
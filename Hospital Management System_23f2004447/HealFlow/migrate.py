@@ -0,0 +1,155 @@
+import sys
+from datetime import date, timedelta
+from sqlalchemy import and_, func, inspect, text
+from app import app
+from models import db, Doctor, Patient, Appointment, DoctorAvailability
+from stats import reconcile_counters
+from catalog import ensure_catalog, open_cart_query
+from slots import rebuild_slot_index
+from search import rebuild_search_index, fts_enabled
+from booking import SLOT_INDEX
+from queries import (doctor_upcoming_query, doctor_appointments_query, patient_upcoming_query, patient_history_query,
+                     assigned_patients_query, doctors_available_query)
+
+class DuplicateBookings(Exception):
+    def __init__(self, slots):
+        super().__init__(f'{len(slots)} slots are booked more than once; '
+                         f'{SLOT_INDEX} cannot be created until only one booking per slot remains')
+        self.slots = slots
+
+def duplicate_bookings():
+    # Slots that hold several 'Booked' appointments, from before SLOT_INDEX
+    # enforced one. Maps (doctor_id, date, time) to appointment ids, oldest first.
+    slot = (Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time)
+    clashes = db.session.query(*slot).filter(Appointment.status == 'Booked').group_by(*slot).having(
+        func.count(Appointment.id) > 1
+    ).subquery()
+    rows = db.session.query(*slot, Appointment.id).join(clashes, and_(
+        Appointment.doctor_id == clashes.c.doctor_id,
+        Appointment.appointment_date == clashes.c.appointment_date,
+        Appointment.appointment_time == clashes.c.appointment_time
+    )).filter(Appointment.status == 'Booked').order_by(*slot, Appointment.id).all()
+    slots = {}
+    for doctor_id, day, at, appointment_id in rows:
+        slots.setdefault((doctor_id, day, at), []).append(appointment_id)
+    return slots
+
+def cancel_duplicate_bookings(slots):
+    # Keeps the oldest booking in each slot. Goes through the ORM so the
+    # dashboard counters and free slot index follow.
+    extra = [appointment_id for ids in slots.values() for appointment_id in ids[1:]]
+    for appointment in Appointment.query.filter(Appointment.id.in_(extra)):
+        appointment.status = 'Cancelled'
+    db.session.commit()
+    return extra
+
+def ensure_indexes(cancel_duplicates=False):
+    # create_all() skips tables that already exist, so indexes added to
+    # models.py after a hospital.db was created have to be added here.
+    inspector = inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {ix['name'] for ix in inspector.get_indexes(table.name)}
+        missing += [index for index in table.indexes if index.name not in existing]
+    # Checked before anything is created, so a refusal leaves no half-migrated schema.
+    if any(index.name == SLOT_INDEX for index in missing):
+        slots = duplicate_bookings()
+        if slots and not cancel_duplicates:
+            raise DuplicateBookings(slots)
+        cancel_duplicate_bookings(slots)
+    for index in missing:
+        index.create(db.engine)
+    return [index.name for index in missing]
+
+def ensure_columns():
+    # Same story for nullable columns added to an existing table.
+    inspector = inspect(db.engine)
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                with db.engine.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f'{table.name}.{column.name}')
+    return added
+
+def dashboard_queries():
+    today = date.today()
+    next_week = today + timedelta(days=7)
+    return {
+        'doctor profile': Doctor.query.filter_by(user_id=1),
+        'patient profile': Patient.query.filter_by(user_id=1),
+        'doctor upcoming': doctor_upcoming_query(1, today),
+        'doctor appointments': doctor_appointments_query(1),
+        'patient upcoming': patient_upcoming_query(1, today),
+        'patient history': patient_history_query(1),
+        'assigned patients': assigned_patients_query(1),
+        'doctors available': doctors_available_query(today, next_week),
+        'upcoming count': Appointment.query.filter(
+            Appointment.appointment_date >= today,
+            Appointment.status == 'Booked'
+        ),
+        'recent appointments': Appointment.query.order_by(Appointment.created_at.desc()).limit(5),
+        'doctor availability': DoctorAvailability.query.filter(
+            DoctorAvailability.doctor_id == 1,
+            DoctorAvailability.date >= today,
+            DoctorAvailability.date <= next_week
+        ),
+        'patient cart': open_cart_query(1),
+    }
+
+def explain(query):
+    sql = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.execute(text('EXPLAIN QUERY PLAN ' + sql))]
+
+# Plans that may walk a whole index: an ORDER BY ... LIMIT the index serves.
+ALLOWED_SCANS = {
+    'recent appointments': {'SCAN appointments USING INDEX ix_appointments_created_at'},
+}
+
+def check_query_plans(queries=None):
+    # Any SCAN, with or without an index, reads the table end to end unless
+    # it is listed in ALLOWED_SCANS for that query.
+    failures = {}
+    for name, query in (queries or dashboard_queries()).items():
+        plan = explain(query)
+        scans = [line for line in plan if line.startswith('SCAN') and line not in ALLOWED_SCANS.get(name, ())]
+        if scans:
+            failures[name] = scans
+        print(f"{'FAIL' if scans else 'ok  '} {name}: {'; '.join(plan)}")
+    return failures
+
+if __name__ == '__main__':
+    with app.app_context():
+        db.create_all()
+        added = ensure_columns()
+        print(f"✓ {len(added)} columns added" + (f": {', '.join(added)}" if added else ''))
+        try:
+            created = ensure_indexes(cancel_duplicates='--cancel-duplicates' in sys.argv)
+        except DuplicateBookings as e:
+            print(f'✗ {e}:')
+            for (doctor_id, day, at), ids in list(e.slots.items())[:20]:
+                print(f'  doctor {doctor_id} {day} {at.strftime("%H:%M")}: appointments {", ".join(map(str, ids))}')
+            print('Cancel the extra bookings, or re-run with --cancel-duplicates to keep the oldest in each slot.')
+            sys.exit(1)
+        print(f"✓ {len(created)} indexes created" + (f": {', '.join(created)}" if created else ''))
+        reconcile_counters()
+        print("✓ Dashboard counters reconciled")
+        rebuild_slot_index()
+        print("✓ Free slot index rebuilt")
+        print(f"✓ {ensure_catalog()} lab catalog entries seeded")
+        if fts_enabled():
+            rebuild_search_index()
+            print("✓ Search index rebuilt")
+        if '--check' in sys.argv:
+            if db.engine.dialect.name != 'sqlite':
+                print('Query plan check only supports SQLite.')
+            elif check_query_plans():
+                sys.exit(1)
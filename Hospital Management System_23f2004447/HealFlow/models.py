@@ -2,8 +2,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -45,7 +46,7 @@ class Doctor(db.Model):
     __tablename__ = 'doctors'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     full_name = db.Column(db.String(120), nullable=False)
     department_id = db.Column(db.Integer, db.ForeignKey('departments.id'), nullable=False)
     phone = db.Column(db.String(20))
@@ -65,7 +66,7 @@ class Patient(db.Model):
     __tablename__ = 'patients'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     full_name = db.Column(db.String(120), nullable=False)
     phone = db.Column(db.String(20))
     date_of_birth = db.Column(db.Date)
@@ -82,6 +83,10 @@ class Patient(db.Model):
 
 class DoctorAvailability(db.Model):
     __tablename__ = 'doctor_availability'
+    __table_args__ = (
+        db.Index('ix_doctor_availability_doctor_date', 'doctor_id', 'date'),
+        db.Index('ix_doctor_availability_date_doctor', 'date', 'doctor_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
@@ -95,13 +100,24 @@ class DoctorAvailability(db.Model):
 
 class Appointment(db.Model):
     __tablename__ = 'appointments'
+    __table_args__ = (
+        db.Index('ix_appointments_doctor_date_status', 'doctor_id', 'appointment_date', 'status'),
+        db.Index('ix_appointments_patient_status_date', 'patient_id', 'status', 'appointment_date'),
+        db.Index('ix_appointments_status_date', 'status', 'appointment_date'),
+        db.Index('ix_appointments_created_at', 'created_at'),
+        db.Index('ix_appointments_date_time', 'appointment_date', 'appointment_time', 'id'),
+        db.Index('uq_appointments_booked_slot', 'doctor_id', 'appointment_date', 'appointment_time', unique=True,
+                 sqlite_where=db.text("status = 'Booked'"), postgresql_where=db.text("status = 'Booked'")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
-    appointment_date = db.Column(db.Date, nullable=False)
+    # active_history keeps the old date/status on reassignment so the
+    # dashboard counters in stats.py can move a booking between days.
+    appointment_date = db.column_property(db.Column(db.Date, nullable=False), active_history=True)
     appointment_time = db.Column(db.Time, nullable=False)
-    status = db.Column(db.String(20), default='Booked')
+    status = db.column_property(db.Column(db.String(20), default='Booked'), active_history=True)
     reason = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -115,7 +131,7 @@ class Treatment(db.Model):
     __tablename__ = 'treatments'
     
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False, index=True)
     diagnosis = db.Column(db.Text, nullable=False)
     prescription = db.Column(db.Text)
     notes = db.Column(db.Text)
@@ -124,8 +140,40 @@ class Treatment(db.Model):
     def __repr__(self):
         return f'<Treatment for Appointment {self.appointment_id}>'
 
+class LabTest(db.Model):
+    __tablename__ = 'lab_tests'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    description = db.Column(db.Text)
+    price = db.Column(db.Float, nullable=False)
+    active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<LabTest {self.name}>'
+
+class HealthPackage(db.Model):
+    __tablename__ = 'health_packages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    features = db.Column(db.Text)
+    icon = db.Column(db.String(50), default='bi-clipboard2-pulse')
+    price = db.Column(db.Float, nullable=False)
+    active = db.Column(db.Boolean, default=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<HealthPackage {self.name}>'
+
 class LabBooking(db.Model):
     __tablename__ = 'lab_bookings'
+    __table_args__ = (
+        db.Index('ix_lab_bookings_patient_date', 'patient_id', 'booking_date'),
+        db.Index('ix_lab_bookings_patient_status_date', 'patient_id', 'status', 'booking_date'),
+        db.Index('ix_lab_bookings_status_paid', 'status', 'paid_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
@@ -133,6 +181,55 @@ class LabBooking(db.Model):
     price = db.Column(db.Float, nullable=False)
     booking_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='Confirmed')
+    paid_at = db.Column(db.DateTime)
     
     def __repr__(self):
         return f'<LabBooking {self.test_name}>'
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+class FreeSlot(db.Model):
+    # Derived from DoctorAvailability minus booked Appointments and kept in
+    # sync by slots.py; no foreign keys so a doctor delete never blocks on it.
+    __tablename__ = 'free_slots'
+    __table_args__ = (
+        db.Index('ix_free_slots_doctor_time', 'doctor_id', 'date', 'start_time', unique=True),
+        db.Index('ix_free_slots_department_time', 'department_id', 'date', 'start_time'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, nullable=False)
+    department_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    
+    def __repr__(self):
+        return f'<FreeSlot Doctor {self.doctor_id} {self.date} {self.start_time}>'
+
+class ImportJob(db.Model):
+    # An admin upload imported in the background by importer.py; the row is
+    # the progress report, so any worker can show it.
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default='Queued')
+    progress = db.Column(db.Integer, default=0)
+    imported = db.Column(db.Integer, default=0)
+    failed = db.Column(db.Integer, default=0)
+    errors = db.Column(db.Text)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ImportJob {self.kind} {self.status}>'
@@ -0,0 +1,93 @@
+import base64
+import json
+from datetime import date, time
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+class InvalidCursor(ValueError):
+    pass
+
+class KeysetPage:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def page_size(args):
+    try:
+        per_page = int(args.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        per_page = DEFAULT_PAGE_SIZE
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+def _encode_value(value):
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+def _decode_value(column, value):
+    python_type = column.type.python_type
+    if python_type in (date, time):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+def encode_cursor(values):
+    raw = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(columns, cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise InvalidCursor(cursor)
+        return [_decode_value(c, v) for c, v in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+def keyset_paginate(query, columns, args, descending=False):
+    # `columns` is the full sort key and must end in a unique column (the
+    # primary key) so that every row has exactly one position. A cursor that
+    # does not decode raises InvalidCursor rather than silently restarting.
+    per_page = page_size(args)
+    after = decode_cursor(columns, args['after']) if args.get('after') else None
+    before = decode_cursor(columns, args['before']) if args.get('before') and after is None else None
+
+    key = tuple_(*columns)
+    backwards = before is not None
+    if backwards:
+        query = query.filter(key > tuple_(*before) if descending else key < tuple_(*before))
+    elif after is not None:
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+
+    reverse = descending != backwards
+    query = query.order_by(*[c.desc() if reverse else c.asc() for c in columns])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+
+    def cursor_for(item):
+        return encode_cursor([getattr(item, c.key) for c in columns])
+
+    if not items:
+        return KeysetPage(items, per_page)
+    if backwards:
+        next_cursor = cursor_for(items[-1])
+        prev_cursor = cursor_for(items[0]) if has_more else None
+    else:
+        next_cursor = cursor_for(items[-1]) if has_more else None
+        prev_cursor = cursor_for(items[0]) if after is not None else None
+    return KeysetPage(items, per_page, next_cursor, prev_cursor)
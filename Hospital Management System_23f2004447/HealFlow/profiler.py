@@ -0,0 +1,127 @@
+import hmac
+import os
+import re
+import sys
+import threading
+import time as clock
+from collections import Counter
+from datetime import datetime
+from flask import g, request, current_app
+from flask_login import current_user
+
+class Sampler(threading.Thread):
+    # Snapshots another thread's Python stack every `interval` seconds via
+    # sys._current_frames(); nothing is traced, so the view runs at full speed.
+    def __init__(self, thread_id, interval=0.005, max_seconds=30):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        deadline = clock.monotonic() + self.max_seconds
+        while not self._done.wait(self.interval) and clock.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[collapse(frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return self.stacks
+
+def collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def write_collapsed(stacks, path):
+    # One "frame;frame;frame count" line per stack, the format flamegraph.pl
+    # and speedscope read directly.
+    with open(path, 'w', encoding='utf-8') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+class RateLimiter:
+    # One profile at a time per process, and at most one per `interval`.
+    def __init__(self, interval=10):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = False
+        self._last = None
+
+    def acquire(self):
+        with self._lock:
+            now = clock.monotonic()
+            if self._running or (self._last is not None and now - self._last < self.interval):
+                return False
+            self._running, self._last = True, now
+            return True
+
+    def release(self):
+        with self._lock:
+            self._running = False
+
+limiter = RateLimiter()
+
+def profile_dir(app):
+    return app.config.get('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+def _requested():
+    return request.args.get('_profile') or request.headers.get('X-Profile')
+
+def _allowed():
+    # An admin session, or an X-Profile header carrying PROFILE_TOKEN so that
+    # patient/doctor pages and login can be profiled too.
+    token = current_app.config.get('PROFILE_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('X-Profile', ''), token):
+        return True
+    return current_user.is_authenticated and current_user.role == 'admin'
+
+def _finish(response=None):
+    sampler = g.pop('profile_sampler', None)
+    if sampler is None:
+        return
+    try:
+        stacks = sampler.stop()
+        name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{re.sub(r'[^A-Za-z0-9_.]', '_', request.endpoint or 'unmatched')}.folded"
+        path = os.path.join(profile_dir(current_app), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_collapsed(stacks, path)
+        if response is not None:
+            response.headers['X-Profile'] = f'{name}; samples={sampler.samples}'
+    finally:
+        limiter.release()
+
+def init_profiler(app):
+    limiter.interval = app.config.get('PROFILE_MIN_INTERVAL', limiter.interval)
+
+    @app.before_request
+    def start_profile():
+        if not _requested() or not _allowed():
+            return
+        if not limiter.acquire():
+            g.profile_skipped = True
+            return
+        g.profile_sampler = Sampler(threading.get_ident(), app.config.get('PROFILE_SAMPLE_MS', 5) / 1000,
+                                    app.config.get('PROFILE_MAX_SECONDS', 30))
+        g.profile_sampler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        if g.pop('profile_skipped', False):
+            response.headers['X-Profile'] = 'skipped; rate limited'
+        _finish(response)
+        return response
+
+    @app.teardown_request
+    def abandon_profile(exc):
+        _finish()
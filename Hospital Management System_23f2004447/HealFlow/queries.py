@@ -0,0 +1,98 @@
+from flask import g, request
+from sqlalchemy.orm import joinedload, selectinload
+from database import on_statement
+from models import db, Appointment, Doctor, Patient, DoctorAvailability
+
+APPOINTMENT_SORT_KEY = (Appointment.appointment_date, Appointment.appointment_time, Appointment.id)
+
+def appointment_listing():
+    return Appointment.query.options(
+        joinedload(Appointment.patient),
+        joinedload(Appointment.doctor).joinedload(Doctor.department),
+        selectinload(Appointment.treatment)
+    )
+
+def doctor_listing():
+    return Doctor.query.options(joinedload(Doctor.department), joinedload(Doctor.user))
+
+def patient_listing():
+    return Patient.query.options(joinedload(Patient.user))
+
+def recent_appointments_query(limit=5):
+    return appointment_listing().order_by(Appointment.created_at.desc()).limit(limit)
+
+def doctor_appointments_query(doctor_id):
+    return appointment_listing().filter(Appointment.doctor_id == doctor_id).order_by(
+        Appointment.appointment_date.desc(), Appointment.appointment_time.desc()
+    )
+
+def doctor_upcoming_query(doctor_id, today):
+    return appointment_listing().filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date >= today,
+        Appointment.status == 'Booked'
+    ).order_by(Appointment.appointment_date, Appointment.appointment_time)
+
+def patient_appointments_query(patient_id):
+    return appointment_listing().filter(Appointment.patient_id == patient_id).order_by(
+        Appointment.appointment_date.desc(), Appointment.appointment_time.desc()
+    )
+
+def patient_upcoming_query(patient_id, today):
+    return appointment_listing().filter(
+        Appointment.patient_id == patient_id,
+        Appointment.appointment_date >= today,
+        Appointment.status == 'Booked'
+    ).order_by(Appointment.appointment_date, Appointment.appointment_time)
+
+def patient_history_query(patient_id, doctor_id=None):
+    query = appointment_listing().filter(
+        Appointment.patient_id == patient_id,
+        Appointment.status == 'Completed'
+    )
+    if doctor_id is not None:
+        query = query.filter(Appointment.doctor_id == doctor_id)
+    return query.order_by(Appointment.appointment_date.desc())
+
+def assigned_patients_query(doctor_id):
+    return Patient.query.join(Appointment).filter(Appointment.doctor_id == doctor_id).distinct()
+
+def doctors_available_query(start, end):
+    # Driven from the date range, so the doctors table is only probed by id.
+    return Doctor.query.filter(Doctor.id.in_(db.select(DoctorAvailability.doctor_id).where(
+        DoctorAvailability.date >= start,
+        DoctorAvailability.date <= end
+    )))
+
+def availability_by_doctor(doctor_ids, start, end, available_only=False):
+    # One IN (...) query for the whole result set, grouped per doctor in
+    # memory; doctors with no windows map to an empty list.
+    doctor_ids = list(doctor_ids)
+    availability = {doctor_id: [] for doctor_id in doctor_ids}
+    if not doctor_ids:
+        return availability
+    query = DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id.in_(doctor_ids),
+        DoctorAvailability.date >= start,
+        DoctorAvailability.date <= end
+    )
+    if available_only:
+        query = query.filter(DoctorAvailability.is_available == True)
+    for window in query.order_by(DoctorAvailability.date, DoctorAvailability.start_time):
+        availability[window.doctor_id].append(window)
+    return availability
+
+def init_query_budget(app):
+    # Enforced only when app.testing is set: a page that goes over
+    # SQL_QUERY_BUDGET statements has regressed into lazy loading somewhere.
+    @on_statement
+    def count_statement(conn, statement, parameters, executemany, seconds):
+        g.sql_query_count = g.get('sql_query_count', 0) + 1
+
+    @app.after_request
+    def check_query_budget(response):
+        budget = app.config.get('SQL_QUERY_BUDGET')
+        count = g.get('sql_query_count', 0)
+        if app.testing and budget and count > budget:
+            raise AssertionError(f'{request.endpoint} issued {count} SQL statements (budget {budget})')
+        return response
@@ -0,0 +1,78 @@
+import os
+import random
+import time as clock
+from flask import g, request, session as cookie_session, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql import Select, CompoundSelect
+from sqlalchemy.sql.elements import TextClause
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = 'replica_'
+READ_YOUR_WRITES_SECONDS = 10
+
+def replica_binds(environ=os.environ):
+    urls = [url.strip() for url in environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    return {f'{REPLICA_BIND_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+def read_only(f):
+    # Marks a view whose reads may be served by a replica; functools.wraps in
+    # the other decorators copies the flag onto the registered view.
+    f.read_only = True
+    return f
+
+READ = 'read'
+PRIMARY = 'primary'
+WRITE = 'write'
+
+def _route(clause):
+    # Only plain ORM/Core SELECTs may go to a replica. A text() read such as
+    # the FTS search runs on the primary but is not a write. Any other
+    # text(), INSERT/UPDATE/DELETE and SELECT ... FOR UPDATE pin the rest of
+    # the request to the primary.
+    if clause is None or isinstance(clause, CompoundSelect):
+        return READ
+    if isinstance(clause, Select):
+        return WRITE if clause._for_update_arg is not None else READ
+    if isinstance(clause, UpdateBase):
+        return WRITE
+    if isinstance(clause, TextClause):
+        sql = clause.text.lstrip().lower()
+        if sql.startswith('select') and ' for update' not in sql and ' for share' not in sql:
+            return PRIMARY
+        return WRITE
+    return PRIMARY
+
+class RoutingSession(Session):
+    # Reads in a @read_only request go to the replica picked for it. The
+    # first flush or write statement pins the rest of the request to the
+    # primary, so a view always reads back what it just wrote.
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            route = WRITE if self._flushing else _route(clause)
+            if route == WRITE:
+                g.db_wrote = True
+            elif route == READ and g.get('replica') and not g.get('db_wrote'):
+                return self._db.engines[g.replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def replica_keys(app):
+    return [key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith(REPLICA_BIND_PREFIX)]
+
+def init_replicas(app):
+    # The binds are read per request, so replicas configured after start-up
+    # (or none at all) need no re-registration.
+    @app.before_request
+    def choose_replica():
+        # A user who wrote recently keeps reading from the primary for a few
+        # seconds so a redirect after a POST never shows replica lag.
+        keys = replica_keys(app)
+        view = app.view_functions.get(request.endpoint)
+        if keys and getattr(view, 'read_only', False) and cookie_session.get('primary_until', 0) < clock.time():
+            g.replica = random.choice(keys)
+
+    @app.after_request
+    def remember_write(response):
+        if g.get('db_wrote') and replica_keys(app):
+            cookie_session['primary_until'] = clock.time() + app.config.get('READ_YOUR_WRITES_SECONDS',
+                                                                            READ_YOUR_WRITES_SECONDS)
+        return response
@@ -0,0 +1,151 @@
+import difflib
+import functools
+import sqlite3
+from sqlalchemy import event, text
+from models import db, Patient, Doctor, Department, User
+
+# Trigram FTS5 tables indexing the same columns the ilike searches look at.
+# Trigrams match any substring of 3+ characters, case-insensitively, so a
+# hit here is exactly what ilike('%term%') would have found, via an index.
+SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(full_name, phone, email, tokenize='trigram')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS doctors_fts USING fts5(full_name, department, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_insert AFTER INSERT ON patients BEGIN
+        INSERT INTO patients_fts(rowid, full_name, phone, email) VALUES (
+            new.id, new.full_name, coalesce(new.phone, ''),
+            coalesce((SELECT email FROM users WHERE id = new.user_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_update AFTER UPDATE OF full_name, phone, user_id ON patients BEGIN
+        DELETE FROM patients_fts WHERE rowid = old.id;
+        INSERT INTO patients_fts(rowid, full_name, phone, email) VALUES (
+            new.id, new.full_name, coalesce(new.phone, ''),
+            coalesce((SELECT email FROM users WHERE id = new.user_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patients_fts_delete AFTER DELETE ON patients BEGIN
+        DELETE FROM patients_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_email AFTER UPDATE OF email ON users BEGIN
+        UPDATE patients_fts SET email = new.email WHERE rowid IN (SELECT id FROM patients WHERE user_id = new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS doctors_fts_insert AFTER INSERT ON doctors BEGIN
+        INSERT INTO doctors_fts(rowid, full_name, department) VALUES (
+            new.id, new.full_name, coalesce((SELECT name FROM departments WHERE id = new.department_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS doctors_fts_update AFTER UPDATE OF full_name, department_id ON doctors BEGIN
+        DELETE FROM doctors_fts WHERE rowid = old.id;
+        INSERT INTO doctors_fts(rowid, full_name, department) VALUES (
+            new.id, new.full_name, coalesce((SELECT name FROM departments WHERE id = new.department_id), ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS doctors_fts_delete AFTER DELETE ON doctors BEGIN
+        DELETE FROM doctors_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS departments_fts_name AFTER UPDATE OF name ON departments BEGIN
+        UPDATE doctors_fts SET department = new.name WHERE rowid IN (SELECT id FROM doctors WHERE department_id = new.id);
+    END""",
+]
+
+REBUILD_SQL = [
+    "DELETE FROM patients_fts",
+    """INSERT INTO patients_fts(rowid, full_name, phone, email)
+       SELECT p.id, p.full_name, coalesce(p.phone, ''), coalesce(u.email, '')
+       FROM patients p LEFT JOIN users u ON u.id = p.user_id""",
+    "DELETE FROM doctors_fts",
+    """INSERT INTO doctors_fts(rowid, full_name, department)
+       SELECT d.id, d.full_name, coalesce(dep.name, '')
+       FROM doctors d LEFT JOIN departments dep ON dep.id = d.department_id""",
+]
+
+MIN_TERM_LENGTH = 3
+FUZZY_CANDIDATES = 200
+FUZZY_CUTOFF = 0.7
+
+@functools.cache
+def trigram_supported():
+    # FTS5 is a compile-time option and the trigram tokenizer needs SQLite
+    # 3.34+, so probe the library Python is linked against once. Without it
+    # searches keep using the ilike path.
+    connection = sqlite3.connect(':memory:')
+    try:
+        connection.execute("CREATE VIRTUAL TABLE probe USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+
+def fts_enabled():
+    return db.engine.dialect.name == 'sqlite' and trigram_supported()
+
+def install_search_index(connection):
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+
+def rebuild_search_index():
+    connection = db.session.connection()
+    install_search_index(connection)
+    for statement in REBUILD_SQL:
+        connection.exec_driver_sql(statement)
+    db.session.commit()
+
+def _phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def _usable(term):
+    return fts_enabled() and len(term.strip()) >= MIN_TERM_LENGTH
+
+def match_ids(table, term):
+    # Subquery of matching rowids, for IN filters that keep the caller's
+    # own ordering (e.g. keyset pagination on id).
+    return text(f'SELECT rowid FROM {table} WHERE {table} MATCH :q').bindparams(q=_phrase(term.strip()))
+
+def ranked_ids(table, term, limit=50, fuzzy=True):
+    # Exact substring hits ranked by bm25; when there are none, fall back to
+    # ORing the term's trigrams and keeping candidates that are close enough.
+    term = term.strip()
+    rows = db.session.execute(
+        text(f'SELECT rowid FROM {table} WHERE {table} MATCH :q ORDER BY rank LIMIT :limit'),
+        {'q': _phrase(term), 'limit': limit}
+    ).scalars().all()
+    if rows or not fuzzy:
+        return rows
+    grams = {term.lower()[i:i + 3] for i in range(len(term) - 2)}
+    query = ' OR '.join(_phrase(g) for g in sorted(grams))
+    candidates = db.session.execute(
+        text(f'SELECT rowid, * FROM {table} WHERE {table} MATCH :q ORDER BY rank LIMIT :limit'),
+        {'q': query, 'limit': FUZZY_CANDIDATES}
+    ).all()
+    scored = []
+    needle = term.lower()
+    for row in candidates:
+        words = [str(value).lower() for value in row[1:] if value]
+        words += [word for value in words for word in value.split()]
+        best = max((difflib.SequenceMatcher(None, needle, word).ratio() for word in words), default=0)
+        if best >= FUZZY_CUTOFF:
+            scored.append((best, row[0]))
+    scored.sort(key=lambda pair: -pair[0])
+    return [rowid for _, rowid in scored[:limit]]
+
+def filter_patients(query, term):
+    if _usable(term):
+        return query.filter(Patient.id.in_(match_ids('patients_fts', term)))
+    return query.join(User, Patient.user_id == User.id).filter(
+        (Patient.full_name.ilike(f'%{term}%')) |
+        (Patient.phone.ilike(f'%{term}%')) |
+        (User.email.ilike(f'%{term}%'))
+    )
+
+def filter_doctors(query, term, joined_department=False):
+    if _usable(term):
+        return query.filter(Doctor.id.in_(match_ids('doctors_fts', term)))
+    if not joined_department:
+        query = query.join(Department)
+    return query.filter(
+        (Doctor.full_name.ilike(f'%{term}%')) |
+        (Department.name.ilike(f'%{term}%'))
+    )
+
+def init_search(app):
+    @event.listens_for(db.metadata, 'after_create')
+    def create_search_index(target, connection, **kw):
+        if connection.dialect.name == 'sqlite' and trigram_supported():
+            install_search_index(connection)
@@ -1,7 +1,20 @@
 from app import app
+from catalog import ensure_catalog
+from database import sync_sequences
 from models import db, User, Department, Doctor, Patient, DoctorAvailability, Appointment, Treatment
 from datetime import date, time, timedelta, datetime
 
+DEPARTMENTS_DATA = [
+    {'name': 'Cardiology', 'description': 'Heart and cardiovascular system specialists'},
+    {'name': 'Orthopedics', 'description': 'Bone, joint, and muscle specialists'},
+    {'name': 'Pediatrics', 'description': 'Children healthcare specialists'},
+    {'name': 'Neurology', 'description': 'Brain and nervous system specialists'},
+    {'name': 'Dermatology', 'description': 'Skin, hair, and nail specialists'},
+    {'name': 'Oncology', 'description': 'Cancer treatment and care specialists'},
+    {'name': 'Gynecology', 'description': 'Women\'s health specialists'},
+    {'name': 'Ophthalmology', 'description': 'Eye care specialists'}
+]
+
 def seed_database():
     with app.app_context():
         print("Starting database seeding...")
@@ -9,20 +22,9 @@ def seed_database():
         db.create_all()
         print("✓ Database tables created")
         
-        departments_data = [
-            {'name': 'Cardiology', 'description': 'Heart and cardiovascular system specialists'},
-            {'name': 'Orthopedics', 'description': 'Bone, joint, and muscle specialists'},
-            {'name': 'Pediatrics', 'description': 'Children healthcare specialists'},
-            {'name': 'Neurology', 'description': 'Brain and nervous system specialists'},
-            {'name': 'Dermatology', 'description': 'Skin, hair, and nail specialists'},
-            {'name': 'Oncology', 'description': 'Cancer treatment and care specialists'},
-            {'name': 'Gynecology', 'description': 'Women\'s health specialists'},
-            {'name': 'Ophthalmology', 'description': 'Eye care specialists'}
-        ]
-        
         dept_creation_date = datetime(2010, 11, 10)  
         departments = []
-        for dept_data in departments_data:
+        for dept_data in DEPARTMENTS_DATA:
             dept = Department(**dept_data)
             dept.created_at = dept_creation_date
             departments.append(dept)
@@ -164,6 +166,9 @@ def seed_database():
         db.session.commit()
         print(f"✓ {len(appointments_data)} Sample appointments created")
         
+        ensure_catalog()
+        print("✓ Lab test catalog created")
+        
         print("\n" + "="*60)
         print("DATABASE SEEDING COMPLETED SUCCESSFULLY!")
         print("="*60)
@@ -181,5 +186,186 @@ def seed_database():
         print(f"  ... and {len(patients_data) - 5} more patients")
         print("="*60)
 
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rohan',
+               'Saanvi', 'Aanya', 'Aadhya', 'Diya', 'Pari', 'Ananya', 'Myra', 'Sara', 'Kiara', 'Meera']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Singh', 'Reddy', 'Patel', 'Nair', 'Kumar', 'Iyer', 'Mehta',
+              'Joshi', 'Desai', 'Kapoor', 'Agarwal', 'Shah', 'Rao', 'Bose', 'Jain', 'Menon', 'Chopra']
+CITIES = ['Mumbai', 'Delhi', 'Bangalore', 'Chennai', 'Kolkata', 'Hyderabad', 'Pune', 'Ahmedabad', 'Jaipur', 'Kochi']
+REASONS = ['Routine checkup', 'Follow-up consultation', 'Persistent headache', 'Joint pain', 'Skin rash',
+           'Chest discomfort', 'Fever and cough', 'Vision problems', 'Child vaccination', 'Back pain']
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+SLOTS_PER_DAY = 16
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _next_id(model):
+    return (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+
+def _bulk_insert(model, rows, batch_size, label, total):
+    # Core executemany per batch, one transaction per batch: no ORM unit of
+    # work, so the session events in stats.py/slots.py do not run here.
+    table = model.__table__
+    started = datetime.now()
+    inserted = 0
+    for batch in _batched(rows, batch_size):
+        with db.engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+        inserted += len(batch)
+        if inserted % (batch_size * 20) == 0 or inserted == total:
+            elapsed = (datetime.now() - started).total_seconds() or 1e-9
+            print(f"  {label}: {inserted:,}/{total:,} ({inserted / elapsed:,.0f} rows/s)")
+    return inserted
+
+def seed_synthetic(doctors=2000, patients=1000000, appointments=20000000, batch_size=10000, seed=42):
+    from werkzeug.security import generate_password_hash
+    from stats import reconcile_counters
+    from slots import rebuild_slot_index
+    import random
+
+    with app.app_context():
+        db.create_all()
+        rng = random.Random(seed)
+        now = datetime.utcnow()
+        today = date.today()
+        # One hash per role instead of one per row; every synthetic doctor
+        # logs in with doctor123 and every patient with patient123.
+        doctor_hash = generate_password_hash('doctor123')
+        patient_hash = generate_password_hash('patient123')
+
+        if not Department.query.first():
+            for dept_data in DEPARTMENTS_DATA:
+                db.session.add(Department(**dept_data))
+            db.session.commit()
+        department_ids = [d.id for d in Department.query.order_by(Department.id)]
+
+        user_start = _next_id(User)
+        doctor_start = _next_id(Doctor)
+        patient_start = _next_id(Patient)
+        appointment_start = _next_id(Appointment)
+        print(f"Generating {doctors:,} doctors, {patients:,} patients, {appointments:,} appointments (seed={seed})")
+
+        def name():
+            return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+        _bulk_insert(User, ({
+            'id': user_start + i,
+            'username': f'syn.user{user_start + i}',
+            'email': f'syn.user{user_start + i}@healflow.test',
+            'password_hash': doctor_hash if i < doctors else patient_hash,
+            'role': 'doctor' if i < doctors else 'patient',
+            'created_at': now,
+            'active': True,
+        } for i in range(doctors + patients)), batch_size, 'users', doctors + patients)
+
+        _bulk_insert(Doctor, ({
+            'id': doctor_start + i,
+            'user_id': user_start + i,
+            'full_name': f'Dr. {name()}',
+            'department_id': department_ids[i % len(department_ids)],
+            'phone': f'555-{rng.randrange(10000):04d}',
+            'qualification': 'MD',
+            'experience_years': rng.randint(1, 35),
+            'consultation_fee': float(rng.randrange(500, 2500, 50)),
+            'created_at': now,
+        } for i in range(doctors)), batch_size, 'doctors', doctors)
+
+        _bulk_insert(Patient, ({
+            'id': patient_start + i,
+            'user_id': user_start + doctors + i,
+            'full_name': name(),
+            'phone': f'9{rng.randrange(10 ** 9):09d}',
+            'date_of_birth': date(1940, 1, 1) + timedelta(days=rng.randrange(365 * 80)),
+            'gender': rng.choice(['Male', 'Female']),
+            'address': f'{rng.randint(1, 999)} Main Road, {rng.choice(CITIES)}',
+            'blood_group': rng.choice(BLOOD_GROUPS),
+            'created_at': now,
+        } for i in range(patients)), batch_size, 'patients', patients)
+
+        _bulk_insert(DoctorAvailability, ({
+            'doctor_id': doctor_start + d,
+            'date': today + timedelta(days=offset),
+            'start_time': time(9, 0),
+            'end_time': time(17, 0),
+            'is_available': True,
+        } for d in range(doctors) for offset in range(7)), batch_size, 'availability', doctors * 7)
+
+        # Appointment i goes to doctor i % doctors in that doctor's (i // doctors)-th
+        # 30-minute slot, so no two rows share a (doctor, date, time). About 80% of
+        # the history lies in the past.
+        per_doctor = -(-appointments // doctors) if doctors else 0
+        span_days = -(-per_doctor // SLOTS_PER_DAY)
+        first_day = today - timedelta(days=int(span_days * 0.8))
+
+        def appointment_rows():
+            for i in range(appointments):
+                slot = i // doctors
+                day = first_day + timedelta(days=slot // SLOTS_PER_DAY)
+                minutes = 9 * 60 + 30 * (slot % SLOTS_PER_DAY)
+                roll = rng.random()
+                if day < today:
+                    status = 'Completed' if roll < 0.85 else 'Cancelled'
+                else:
+                    status = 'Booked' if roll < 0.9 else 'Cancelled'
+                yield {
+                    'id': appointment_start + i,
+                    'patient_id': patient_start + rng.randrange(patients),
+                    'doctor_id': doctor_start + i % doctors,
+                    'appointment_date': day,
+                    'appointment_time': time(minutes // 60, minutes % 60),
+                    'status': status,
+                    'reason': rng.choice(REASONS),
+                    'created_at': now,
+                    'updated_at': now,
+                }
+
+        if doctors and patients:
+            # Treatments for the completed rows of each batch go in with it,
+            # so nothing beyond one batch is ever held in memory.
+            started = datetime.now()
+            inserted = 0
+            for batch in _batched(appointment_rows(), batch_size):
+                treatments = [{
+                    'appointment_id': row['id'],
+                    'diagnosis': 'Patient examined and diagnosed',
+                    'prescription': 'Prescribed medication as needed',
+                    'notes': None,
+                    'created_at': now,
+                } for row in batch if row['status'] == 'Completed']
+                with db.engine.begin() as conn:
+                    conn.execute(Appointment.__table__.insert(), batch)
+                    if treatments:
+                        conn.execute(Treatment.__table__.insert(), treatments)
+                inserted += len(batch)
+                if inserted % (batch_size * 20) == 0 or inserted == appointments:
+                    elapsed = (datetime.now() - started).total_seconds() or 1e-9
+                    print(f"  appointments: {inserted:,}/{appointments:,} ({inserted / elapsed:,.0f} rows/s)")
+
+        sync_sequences()
+        reconcile_counters()
+        rebuild_slot_index()
+        ensure_catalog()
+        print("✓ Dashboard counters, free slot index and lab catalog rebuilt")
+
 if __name__ == '__main__':
-    seed_database()
+    import argparse
+    parser = argparse.ArgumentParser(description='Seed the HealFlow database.')
+    parser.add_argument('--synthetic', action='store_true',
+                        help='generate a large deterministic dataset instead of the demo data')
+    parser.add_argument('--doctors', type=int, default=2000)
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--appointments', type=int, default=20000000)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if args.synthetic:
+        seed_synthetic(args.doctors, args.patients, args.appointments, args.batch_size, args.seed)
+    else:
+        seed_database()
@@ -0,0 +1,151 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, inspect, select, tuple_
+from models import db, Doctor, Appointment, DoctorAvailability, FreeSlot
+
+# Changing the slot length needs `python migrate.py` to rebuild free_slots.
+SLOT_MINUTES = 30
+
+def expand_window(day, start_time, end_time, minutes=SLOT_MINUTES):
+    step = timedelta(minutes=minutes)
+    cursor = datetime.combine(day, start_time)
+    end = datetime.combine(day, end_time)
+    while cursor + step <= end:
+        yield cursor.time()
+        cursor += step
+
+def free_times(day, windows, booked, minutes=SLOT_MINUTES):
+    # A booking at an off-grid time still blocks every slot it overlaps.
+    step = timedelta(minutes=minutes)
+    taken = [datetime.combine(day, t) for t in booked]
+    free = set()
+    for start_time, end_time in windows:
+        for slot in expand_window(day, start_time, end_time, minutes):
+            begin = datetime.combine(day, slot)
+            if not any(b < begin + step and begin < b + step for b in taken):
+                free.add(slot)
+    return sorted(free)
+
+def _slot_rows(connection, keys):
+    # keys: set of (doctor_id, day). Returns rows for free_slots covering them.
+    if not keys:
+        return []
+    doctor_ids = {doctor_id for doctor_id, _ in keys}
+    days = {day for _, day in keys}
+    departments = dict(connection.execute(
+        select(Doctor.id, Doctor.department_id).where(Doctor.id.in_(doctor_ids))
+    ).all())
+    windows = defaultdict(list)
+    for doctor_id, day, start_time, end_time in connection.execute(
+        select(DoctorAvailability.doctor_id, DoctorAvailability.date,
+               DoctorAvailability.start_time, DoctorAvailability.end_time).where(
+            DoctorAvailability.doctor_id.in_(doctor_ids),
+            DoctorAvailability.date.in_(days),
+            DoctorAvailability.is_available == True
+        )
+    ):
+        windows[(doctor_id, day)].append((start_time, end_time))
+    booked = defaultdict(list)
+    for doctor_id, day, at in connection.execute(
+        select(Appointment.doctor_id, Appointment.appointment_date, Appointment.appointment_time).where(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.appointment_date.in_(days),
+            Appointment.status == 'Booked'
+        )
+    ):
+        booked[(doctor_id, day)].append(at)
+
+    rows = []
+    for doctor_id, day in keys:
+        if doctor_id not in departments:
+            continue
+        for slot in free_times(day, windows[(doctor_id, day)], booked[(doctor_id, day)]):
+            rows.append({'doctor_id': doctor_id, 'department_id': departments[doctor_id],
+                         'date': day, 'start_time': slot})
+    return rows
+
+def refresh_slots(connection, keys):
+    table = FreeSlot.__table__
+    for doctor_id, day in keys:
+        connection.execute(table.delete().where(table.c.doctor_id == doctor_id, table.c.date == day))
+    rows = _slot_rows(connection, keys)
+    if rows:
+        connection.execute(table.insert(), rows)
+
+def rebuild_slot_index(since=None):
+    since = since or date.today()
+    connection = db.session.connection()
+    connection.execute(FreeSlot.__table__.delete())
+    keys = set(connection.execute(
+        select(DoctorAvailability.doctor_id, DoctorAvailability.date).where(DoctorAvailability.date >= since)
+    ).all())
+    refresh_slots(connection, keys)
+    db.session.commit()
+
+def _touched_days(obj, doctor_key, date_key, keys):
+    state = inspect(obj)
+    doctors = {getattr(obj, doctor_key)} | set(state.attrs[doctor_key].history.deleted)
+    days = {getattr(obj, date_key)} | set(state.attrs[date_key].history.deleted)
+    for doctor_id in doctors:
+        for day in days:
+            if doctor_id is not None and day is not None:
+                keys.add((doctor_id, day))
+
+def _sync_slot_index(session, flush_context):
+    keys = set()
+    moved_doctors = []
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Appointment):
+            _touched_days(obj, 'doctor_id', 'appointment_date', keys)
+        elif isinstance(obj, DoctorAvailability):
+            _touched_days(obj, 'doctor_id', 'date', keys)
+        elif isinstance(obj, Doctor) and obj not in session.new and obj not in session.deleted:
+            if inspect(obj).attrs.department_id.history.has_changes():
+                moved_doctors.append(obj)
+    if not keys and not moved_doctors:
+        return
+    connection = session.connection()
+    table = FreeSlot.__table__
+    for doctor in moved_doctors:
+        connection.execute(table.update().where(table.c.doctor_id == doctor.id)
+                           .values(department_id=doctor.department_id))
+    refresh_slots(connection, keys)
+
+def _upcoming(query, after):
+    after = after or datetime.now()
+    return query.filter(
+        tuple_(FreeSlot.date, FreeSlot.start_time) > tuple_(after.date(), after.time())
+    ).order_by(FreeSlot.date, FreeSlot.start_time)
+
+def next_free_slot(doctor_id, after=None):
+    return _upcoming(FreeSlot.query.filter(FreeSlot.doctor_id == doctor_id), after).first()
+
+def free_slots_for_doctor(doctor_id, start, end, after=None):
+    return _upcoming(FreeSlot.query.filter(
+        FreeSlot.doctor_id == doctor_id,
+        FreeSlot.date >= start,
+        FreeSlot.date <= end
+    ), after).all()
+
+def free_slots_in_department(department_id, start, end, after=None):
+    return _upcoming(FreeSlot.query.filter(
+        FreeSlot.department_id == department_id,
+        FreeSlot.date >= start,
+        FreeSlot.date <= end
+    ), after).all()
+
+def earliest_free_slots(department_id, start, end, limit=10, after=None):
+    # ix_free_slots_department_time already holds every doctor's slots in a
+    # single (date, start_time) order, so the merge across doctors happens in
+    # the index and the scan stops after `limit` rows.
+    return _upcoming(FreeSlot.query.filter(
+        FreeSlot.department_id == department_id,
+        FreeSlot.date >= start,
+        FreeSlot.date <= end
+    ), after).limit(limit).all()
+
+def track_slot_index(target):
+    event.listen(target, 'after_flush', _sync_slot_index)
+
+def init_slots(app):
+    track_slot_index(db.session)
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, date
+from logging.handlers import RotatingFileHandler
+from flask import request
+from database import on_statement
+
+PHI_COLUMNS = {'full_name', 'email', 'phone', 'address', 'date_of_birth', 'gender', 'blood_group', 'username',
+               'password_hash', 'reason', 'diagnosis', 'prescription', 'notes', 'test_name'}
+REDACTED = '<redacted>'
+
+logger = logging.getLogger('healflow.slow_queries')
+logger.propagate = False
+
+_settings = {'threshold': None, 'path': None}
+_binds_phi = re.compile(
+    r'\b(' + '|'.join(sorted(PHI_COLUMNS)) + r')\b\)?\s*(=|!=|<>|LIKE|ILIKE|GLOB|IN)[^,]{0,12}?(\?|%\(|:\w)'
+    r'|\b(patients_fts|doctors_fts)\b', re.IGNORECASE)
+_insert_columns = re.compile(r'^\s*INSERT\s+INTO\s+\S+\s*\(([^)]*)\)', re.IGNORECASE)
+
+def _statement_binds_phi(statement):
+    insert = _insert_columns.match(statement)
+    if insert and PHI_COLUMNS & {column.strip().strip('"') for column in insert.group(1).split(',')}:
+        return True
+    return bool(_binds_phi.search(statement))
+
+def _scrub(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return REDACTED
+
+def redact(statement, parameters):
+    # Positional parameters can't be tied to a column reliably, so when a
+    # statement binds any PHI column every non-numeric value is dropped.
+    binds_phi = _statement_binds_phi(statement)
+    if isinstance(parameters, dict):
+        return {key: REDACTED if re.sub(r'_\d+$', '', key) in PHI_COLUMNS else _scrub(value) if binds_phi else value
+                for key, value in parameters.items()}
+    return [_scrub(value) if binds_phi else value for value in parameters or ()]
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+def explain(conn, statement, parameters):
+    # Runs on the raw DBAPI cursor so the EXPLAIN itself is not timed or logged.
+    # A failed statement aborts the whole transaction on PostgreSQL, so there
+    # the EXPLAIN runs inside a savepoint that is rolled back on error.
+    sqlite = conn.dialect.name == 'sqlite'
+    prefix = 'EXPLAIN QUERY PLAN ' if sqlite else 'EXPLAIN '
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    try:
+        if not sqlite:
+            cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [str(row[-1]) for row in cursor.fetchall()]
+        except Exception as e:
+            if not sqlite:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            plan = [f'EXPLAIN failed: {e}']
+        if not sqlite:
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        return plan
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+def _record(conn, statement, parameters, executemany, seconds):
+    entry = {
+        'at': datetime.utcnow().isoformat(timespec='seconds'),
+        'endpoint': request.endpoint or request.path,
+        'duration_ms': round(seconds * 1000, 2),
+        'statement': statement,
+        'parameters': None if executemany else redact(statement, parameters),
+        'plan': [] if executemany else explain(conn, statement, parameters),
+    }
+    logger.warning(json.dumps(entry, default=_json_default))
+
+def read_entries(path=None):
+    path = path or _settings['path']
+    if not path or not os.path.exists(path):
+        return []
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+def top_offenders(limit=20, path=None):
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set()})
+    for entry in read_entries(path):
+        group = groups[entry['statement']]
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        if entry['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = entry['duration_ms']
+            group['slowest'] = entry
+        group['endpoints'].add(entry['endpoint'])
+    offenders = [dict(group, statement=statement, endpoints=sorted(group['endpoints']))
+                 for statement, group in groups.items()]
+    offenders.sort(key=lambda group: -group['total_ms'])
+    return offenders[:limit]
+
+def open_log(path, max_bytes=5 * 1024 * 1024, backups=5):
+    # A bare filename lives in the working directory; dirname() is then ''.
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.handlers = [handler]
+    logger.setLevel(logging.WARNING)
+    _settings['path'] = path
+
+def init_slow_query_log(app):
+    threshold = app.config.get('SLOW_QUERY_MS')
+    if not threshold:
+        return
+    open_log(app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.log'),
+             app.config.get('SLOW_QUERY_LOG_BYTES', 5 * 1024 * 1024), app.config.get('SLOW_QUERY_LOG_BACKUPS', 5))
+    _settings['threshold'] = threshold / 1000
+
+    @on_statement
+    def check_statement(conn, statement, parameters, executemany, seconds):
+        if seconds >= _settings['threshold']:
+            _record(conn, statement, parameters, executemany, seconds)
@@ -23,6 +23,7 @@ if [ ! -f "instance/hospital.db" ]; then
     python seed_data.py
 else
     echo "✅ Database already exists"
+    python migrate.py
 fi
 
 echo ""
@@ -0,0 +1,49 @@
+document.querySelectorAll('input[data-typeahead]').forEach(function (input) {
+    var list = document.createElement('div');
+    list.className = 'list-group position-absolute shadow-sm';
+    list.style.zIndex = 1000;
+    input.parentNode.style.position = 'relative';
+    input.parentNode.appendChild(list);
+    input.setAttribute('autocomplete', 'off');
+
+    var timer = null;
+    var latest = 0;
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            var term = input.value.trim();
+            var request = ++latest;
+            if (!term) {
+                list.innerHTML = '';
+                return;
+            }
+            fetch(input.dataset.typeahead + '?q=' + encodeURIComponent(term))
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    if (request !== latest) {
+                        return;
+                    }
+                    list.innerHTML = '';
+                    (data.results || []).forEach(function (item) {
+                        var option = document.createElement('button');
+                        option.type = 'button';
+                        option.className = 'list-group-item list-group-item-action';
+                        option.textContent = item.name;
+                        var detail = document.createElement('small');
+                        detail.className = 'text-muted ms-2';
+                        detail.textContent = item.department || item.phone || '';
+                        option.appendChild(detail);
+                        option.addEventListener('click', function () {
+                            input.value = item.name;
+                            list.innerHTML = '';
+                            input.form.submit();
+                        });
+                        list.appendChild(option);
+                    });
+                });
+        }, 150);
+    });
+    input.addEventListener('blur', function () {
+        setTimeout(function () { list.innerHTML = ''; }, 200);
+    });
+});
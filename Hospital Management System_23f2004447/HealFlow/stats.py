@@ -0,0 +1,182 @@
+import argparse
+import threading
+import time as clock
+from datetime import date
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from database import write_transaction
+from models import db, Department, Doctor, Patient, Appointment, StatCounter
+
+TOTAL_COUNTERS = {Doctor: 'doctors', Patient: 'patients', Appointment: 'appointments'}
+RECONCILED_AT = 'reconciled_at'
+RECONCILE_INTERVAL = 15 * 60
+
+# Booked appointments are counted per day under "booked:YYYY-MM-DD". ISO
+# dates sort as strings, so "upcoming" is a primary-key range from today's
+# key up to "booked;" (';' is the character after ':').
+BOOKED_PREFIX = 'booked:'
+BOOKED_END = 'booked;'
+# Bumped whenever a department, doctor or patient row changes, so cached
+# pages that show their names (see conditional.py) can tell.
+NAMES_VERSION = 'names_version'
+NAMED_MODELS = (Department, Doctor, Patient)
+
+def booked_key(day):
+    return f'{BOOKED_PREFIX}{day.isoformat()}'
+
+def _previous_value(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), key)
+
+def _add(deltas, name, amount):
+    deltas[name] = deltas.get(name, 0) + amount
+
+def _track_counters(session, flush_context, instances):
+    # A status of None on a new row means the column default, 'Booked'.
+    deltas = {}
+    for obj in session.new:
+        name = TOTAL_COUNTERS.get(type(obj))
+        if name:
+            _add(deltas, name, 1)
+        if isinstance(obj, Appointment) and obj.status in ('Booked', None):
+            _add(deltas, booked_key(obj.appointment_date), 1)
+    for obj in session.deleted:
+        name = TOTAL_COUNTERS.get(type(obj))
+        if name:
+            _add(deltas, name, -1)
+        if isinstance(obj, Appointment):
+            state = inspect(obj)
+            if _previous_value(state, 'status') == 'Booked':
+                _add(deltas, booked_key(_previous_value(state, 'appointment_date')), -1)
+    if any(isinstance(obj, NAMED_MODELS) for obj in session.deleted) or any(
+            isinstance(obj, NAMED_MODELS) and session.is_modified(obj, include_collections=False)
+            for obj in session.dirty):
+        _add(deltas, NAMES_VERSION, 1)
+    for obj in session.dirty:
+        if not isinstance(obj, Appointment) or obj in session.deleted:
+            continue
+        state = inspect(obj)
+        if not (state.attrs.status.history.has_changes() or
+                state.attrs.appointment_date.history.has_changes()):
+            continue
+        if _previous_value(state, 'status') == 'Booked':
+            _add(deltas, booked_key(_previous_value(state, 'appointment_date')), -1)
+        if obj.status == 'Booked':
+            _add(deltas, booked_key(obj.appointment_date), 1)
+
+    rows = [{'name': name, 'value': delta} for name, delta in deltas.items() if delta]
+    if rows:
+        _upsert(session.connection(), rows, add=True)
+
+def _upsert(connection, rows, add=False):
+    # One statement per row, so two sessions creating the same key cannot
+    # both miss an UPDATE and then collide on the INSERT. `add` increments
+    # an existing value instead of replacing it.
+    table = StatCounter.__table__
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    statement = dialect.insert(table)
+    value = table.c.value + statement.excluded.value if add else statement.excluded.value
+    connection.execute(statement.on_conflict_do_update(index_elements=[table.c.name], set_={'value': value}), rows)
+
+def reconcile_counters():
+    # Recount from the source tables. Corrects drift from bulk SQL, manual
+    # edits or anything else that bypassed the session events.
+    today = date.today()
+    counts = {name: model.query.count() for model, name in TOTAL_COUNTERS.items()}
+    booked = db.session.query(Appointment.appointment_date, func.count(Appointment.id)).filter(
+        Appointment.appointment_date >= today,
+        Appointment.status == 'Booked'
+    ).group_by(Appointment.appointment_date).all()
+    for day, count in booked:
+        counts[booked_key(day)] = count
+    counts[RECONCILED_AT] = int(clock.time())
+
+    # Overwrite in place rather than DELETE + INSERT: a concurrent reconcile
+    # or booking then sees either the old or the new row, never a gap.
+    StatCounter.query.filter(
+        StatCounter.name.startswith(BOOKED_PREFIX, autoescape=True),
+        StatCounter.name.notin_(list(counts))
+    ).delete(synchronize_session=False)
+    _upsert(db.session.connection(), [{'name': name, 'value': value} for name, value in counts.items()])
+    db.session.commit()
+
+def reconcile_if_due(interval=RECONCILE_INTERVAL):
+    # Every worker runs this on a timer. The reconciled_at stamp is read
+    # inside the write transaction (under the write lock on SQLite), so only
+    # the first worker past the interval recounts.
+    def reconcile():
+        last = db.session.query(StatCounter.value).filter(StatCounter.name == RECONCILED_AT).scalar()
+        if last is not None and clock.time() - last < interval:
+            return False
+        reconcile_counters()
+        return True
+
+    return write_transaction(reconcile)
+
+def _reconcile_forever(app, interval):
+    while True:
+        with app.app_context():
+            try:
+                reconcile_if_due(interval)
+            except Exception:
+                app.logger.exception('dashboard counter reconcile failed')
+            finally:
+                db.session.remove()
+        clock.sleep(interval)
+
+def dashboard_counts():
+    # Read-only: runs on the replica for @read_only views. Drift is corrected
+    # by the reconcile thread (or seed/migrate), not here.
+    names = list(TOTAL_COUNTERS.values())
+    values = dict(db.session.query(StatCounter.name, StatCounter.value).filter(StatCounter.name.in_(names)).all())
+
+    upcoming = db.session.query(func.coalesce(func.sum(StatCounter.value), 0)).filter(
+        StatCounter.name >= booked_key(date.today()),
+        StatCounter.name < BOOKED_END
+    ).scalar()
+    counts = {name: values.get(name, 0) for name in TOTAL_COUNTERS.values()}
+    counts['upcoming'] = upcoming
+    return counts
+
+def track_counters(target):
+    event.listen(target, 'before_flush', _track_counters)
+
+_reconciler = []
+_starting = threading.Lock()
+
+def start_reconciler(app):
+    # Started by the worker's first request, like the typeahead refresher.
+    # RECONCILE_INTERVAL=0 turns it off.
+    interval = app.config.get('RECONCILE_INTERVAL', RECONCILE_INTERVAL)
+    if not _reconciler and interval:
+        with _starting:
+            if not _reconciler:
+                thread = threading.Thread(target=_reconcile_forever, daemon=True, name='stats-reconcile',
+                                          args=(app, interval))
+                thread.start()
+                _reconciler.append(thread)
+
+def init_stats(app):
+    track_counters(db.session)
+    app.before_request(lambda: start_reconciler(app))
+
+if __name__ == '__main__':
+    from app import app
+    parser = argparse.ArgumentParser(description='Recount the admin dashboard counters from the source tables.')
+    parser.add_argument('--every', type=int, metavar='SECONDS',
+                        help='keep running and reconcile whenever the last run is this old '
+                             f'(the web workers use RECONCILE_INTERVAL, {RECONCILE_INTERVAL})')
+    args = parser.parse_args()
+    while True:
+        with app.app_context():
+            if not args.every:
+                reconcile_counters()
+                print(f"✓ Dashboard counters reconciled at {clock.strftime('%H:%M:%S')}")
+                break
+            if reconcile_if_due(args.every):
+                print(f"✓ Dashboard counters reconciled at {clock.strftime('%H:%M:%S')}")
+        clock.sleep(args.every)
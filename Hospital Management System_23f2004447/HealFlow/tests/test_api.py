@@ -0,0 +1,121 @@
+import sqlite3
+import threading
+import time as clock
+from datetime import date, timedelta
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from starlette.testclient import TestClient
+import api
+from app import app
+from models import Appointment
+
+@pytest.fixture
+def api_client(database, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', database)
+    engine = api.create_engine()
+    monkeypatch.setattr(api, 'engine', engine)
+    monkeypatch.setattr(api, 'sessions', async_sessionmaker(engine, sync_session_class=api.ApiSession,
+                                                            expire_on_commit=False))
+    with TestClient(api.app) as client:
+        yield client
+
+def token(client, username, password):
+    response = client.post('/api/v1/auth/token', json={'username': username, 'password': password})
+    assert response.status_code == 200, response.text
+    return {'Authorization': f"Bearer {response.json()['token']}"}
+
+@pytest.fixture
+def patient(api_client):
+    return token(api_client, 'parth.joshi', 'patient123')
+
+def test_token_auth(api_client, monkeypatch):
+    assert api_client.post('/api/v1/auth/token', json={'username': 'parth.joshi', 'password': 'nope'}).status_code == 401
+    assert api_client.post('/api/v1/auth/token', json={'username': 'parth.joshi'}).status_code == 400
+    assert api_client.get('/api/v1/doctors').json() == {'error': 'Missing bearer token'}
+    assert api_client.get('/api/v1/doctors', headers={'Authorization': 'Bearer junk'}).status_code == 401
+    headers = token(api_client, 'parth.joshi', 'patient123')
+    assert api_client.get('/api/v1/doctors', headers=headers).status_code == 200
+    monkeypatch.setattr(api, 'TOKEN_MAX_AGE', -1)
+    assert api_client.get('/api/v1/doctors', headers=headers).json() == {'error': 'Token expired'}
+
+def test_doctors_keyset_pages(api_client, patient):
+    first = api_client.get('/api/v1/doctors?limit=3', headers=patient).json()
+    second = api_client.get(f"/api/v1/doctors?limit=3&after={first['next_after']}", headers=patient).json()
+    ids = [d['id'] for d in first['items'] + second['items']]
+    assert ids == sorted(ids) and len(set(ids)) == 6
+    cardiology = api_client.get('/api/v1/doctors?search=cardio', headers=patient).json()['items']
+    assert cardiology and all(d['department'] == 'Cardiology' for d in cardiology)
+    assert api_client.get('/api/v1/doctors/999999', headers=patient).status_code == 404
+
+def test_availability_filters(api_client, patient, open_day):
+    doctor_id, day = open_day
+    body = api_client.get(f'/api/v1/doctors/{doctor_id}/availability?start={day}&end={day}', headers=patient).json()
+    assert body['windows'] == [{'date': day.isoformat(), 'start_time': '09:00', 'end_time': '12:00'}]
+    assert [s['time'] for s in body['free_slots']] == ['09:00', '09:30', '10:00', '10:30', '11:00', '11:30']
+
+    today = date.today()
+    body = api_client.get(f'/api/v1/doctors/{doctor_id}/availability?start=2000-01-01&end=2999-01-01',
+                          headers=patient).json()
+    assert body['start'] == today.isoformat()
+    assert body['end'] == (today + timedelta(days=api.MAX_RANGE_DAYS)).isoformat()
+    assert api_client.get(f'/api/v1/doctors/{doctor_id}/availability?start=soon', headers=patient).status_code == 400
+
+def test_booking_and_conflict(api_client, patient, open_day):
+    doctor_id, day = open_day
+    slot = {'doctor_id': doctor_id, 'date': day.isoformat(), 'time': '10:00'}
+    created = api_client.post('/api/v1/appointments', headers=patient, json=slot)
+    assert created.status_code == 201 and created.json()['status'] == 'Booked'
+    conflict = api_client.post('/api/v1/appointments', headers=patient, json=slot)
+    assert conflict.status_code == 409
+    overlapping = api_client.post('/api/v1/appointments', headers=patient, json=dict(slot, time='10:15'))
+    assert overlapping.status_code == 422
+    past = api_client.post('/api/v1/appointments', headers=patient, json=dict(slot, date='2000-01-01'))
+    assert past.status_code == 422
+    doctor = token(api_client, 'dr.sharma', 'doctor123')
+    assert api_client.post('/api/v1/appointments', headers=doctor, json=dict(slot, time='10:30')).status_code == 403
+    free = api_client.get(f'/api/v1/doctors/{doctor_id}/availability?start={day}&end={day}', headers=patient).json()
+    assert '10:00' not in [s['time'] for s in free['free_slots']]
+
+def test_booking_waits_out_a_locked_database(api_client, patient, open_day, database):
+    # Another process holding the SQLite write lock must not turn into a 500.
+    if not database.startswith('sqlite'):
+        pytest.skip('SQLite write lock')
+    doctor_id, day = open_day
+    holder = sqlite3.connect(database[len('sqlite:///'):], check_same_thread=False)
+    holder.execute('BEGIN IMMEDIATE')
+    release = threading.Timer(0.5, holder.commit)
+    release.start()
+    started = clock.monotonic()
+    response = api_client.post('/api/v1/appointments', headers=patient,
+                               json={'doctor_id': doctor_id, 'date': day.isoformat(), 'time': '11:00'})
+    release.join()
+    holder.close()
+    assert response.status_code == 201
+    assert clock.monotonic() - started >= 0.4
+
+def test_cancel(api_client, patient, open_day):
+    doctor_id, day = open_day
+    appointment = api_client.post('/api/v1/appointments', headers=patient, json={
+        'doctor_id': doctor_id, 'date': day.isoformat(), 'time': '09:30'}).json()
+    other = token(api_client, 'sneha.desai', 'patient123')
+    assert api_client.post(f"/api/v1/appointments/{appointment['id']}/cancel", headers=other).status_code == 404
+    admin = token(api_client, 'admin', 'admin123')
+    assert api_client.post(f"/api/v1/appointments/{appointment['id']}/cancel", headers=admin).status_code == 403
+
+    doctor = token(api_client, 'dr.sharma', 'doctor123')
+    cancelled = api_client.post(f"/api/v1/appointments/{appointment['id']}/cancel", headers=doctor)
+    assert cancelled.status_code == 200 and cancelled.json()['status'] == 'Cancelled'
+    assert api_client.post(f"/api/v1/appointments/{appointment['id']}/cancel", headers=patient).status_code == 409
+    with app.app_context():
+        assert Appointment.query.get(appointment['id']).status == 'Cancelled'
+    rebooked = api_client.post('/api/v1/appointments', headers=patient, json={
+        'doctor_id': doctor_id, 'date': day.isoformat(), 'time': '09:30'})
+    assert rebooked.status_code == 201
+
+def test_appointments_are_scoped(api_client, patient):
+    mine = api_client.get('/api/v1/appointments?limit=100', headers=patient).json()['items']
+    admin = token(api_client, 'admin', 'admin123')
+    everyone = api_client.get('/api/v1/appointments?limit=100', headers=admin).json()['items']
+    assert mine and len({a['patient_id'] for a in mine}) == 1
+    assert len(everyone) > len(mine)
+    assert api_client.get(f"/api/v1/appointments/{everyone[-1]['id']}", headers=admin).status_code == 200
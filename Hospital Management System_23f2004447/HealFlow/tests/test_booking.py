@@ -0,0 +1,99 @@
+import threading
+from datetime import date, time, timedelta
+import pytest
+from app import app
+from booking import book_slot, SlotUnavailable, IN_THE_PAST, NOT_A_SLOT, OUTSIDE_AVAILABILITY, ALREADY_BOOKED
+from database import write_transaction
+from models import db, Appointment, FreeSlot
+from conftest import patient_id
+
+def book(client, doctor_id, day, at):
+    return client.post(f'/patient/book-appointment/{doctor_id}', data={
+        'doctor_id': doctor_id, 'appointment_date': day.isoformat(), 'appointment_time': at, 'reason': 'test'
+    }, follow_redirects=True)
+
+def booked_count(doctor_id, day):
+    with app.app_context():
+        return Appointment.query.filter_by(doctor_id=doctor_id, appointment_date=day, status='Booked').count()
+
+def test_book_through_form(patient_client, open_day):
+    doctor_id, day = open_day
+    response = book(patient_client, doctor_id, day, '09:30')
+    assert b'Appointment booked successfully!' in response.data
+    assert booked_count(doctor_id, day) == 1
+    with app.app_context():
+        free = {slot.start_time for slot in FreeSlot.query.filter_by(doctor_id=doctor_id, date=day)}
+    assert time(9, 30) not in free and time(10) in free
+
+def test_same_slot_twice(patient_client, open_day):
+    doctor_id, day = open_day
+    book(patient_client, doctor_id, day, '10:00')
+    response = book(patient_client, doctor_id, day, '10:00')
+    assert ALREADY_BOOKED.encode() in response.data
+    assert booked_count(doctor_id, day) == 1
+
+@pytest.mark.parametrize('at, error', [
+    ('10:15', NOT_A_SLOT),
+    ('10:29', NOT_A_SLOT),
+    ('12:00', OUTSIDE_AVAILABILITY),
+    ('08:30', OUTSIDE_AVAILABILITY),
+])
+def test_off_grid_and_outside_window(ctx, open_day, at, error):
+    doctor_id, day = open_day
+    with pytest.raises(SlotUnavailable, match=error):
+        book_slot(patient_id(), doctor_id, day, time.fromisoformat(at))
+
+def test_overlapping_times_cannot_double_book(ctx, open_day):
+    doctor_id, day = open_day
+    book_slot(patient_id(), doctor_id, day, time(10))
+    for at in (time(10, 15), time(10, 29)):
+        with pytest.raises(SlotUnavailable):
+            book_slot(patient_id(), doctor_id, day, at)
+    assert booked_count(doctor_id, day) == 1
+
+def test_off_grid_legacy_booking_blocks_overlaps(ctx, open_day):
+    doctor_id, day = open_day
+    db.session.add(Appointment(patient_id=patient_id(), doctor_id=doctor_id, appointment_date=day,
+                               appointment_time=time(9, 10), status='Booked'))
+    db.session.commit()
+    for at in (time(9), time(9, 30)):
+        with pytest.raises(SlotUnavailable, match=ALREADY_BOOKED):
+            book_slot(patient_id(), doctor_id, day, at)
+
+def test_past_rejected(ctx, open_day):
+    doctor_id, _ = open_day
+    with pytest.raises(SlotUnavailable, match=IN_THE_PAST):
+        book_slot(patient_id(), doctor_id, date.today() - timedelta(days=1), time(10))
+
+def test_concurrent_bookings_one_winner(database, open_day):
+    doctor_id, day = open_day
+    with app.app_context():
+        pid = patient_id()
+    results = []
+
+    def attempt():
+        with app.app_context():
+            try:
+                write_transaction(lambda: book_slot(pid, doctor_id, day, time(11)))
+                results.append('booked')
+            except SlotUnavailable:
+                results.append('taken')
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=attempt) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == ['booked'] + ['taken'] * 5
+    assert booked_count(doctor_id, day) == 1
+
+def test_cancel_frees_the_slot(patient_client, open_day):
+    doctor_id, day = open_day
+    book(patient_client, doctor_id, day, '11:30')
+    with app.app_context():
+        appointment = Appointment.query.filter_by(doctor_id=doctor_id, appointment_date=day).one()
+    response = patient_client.post(f'/patient/appointment/{appointment.id}/cancel', follow_redirects=True)
+    assert b'Appointment cancelled successfully!' in response.data
+    assert b'Appointment booked successfully!' in book(patient_client, doctor_id, day, '11:30').data
@@ -0,0 +1,70 @@
+from datetime import time
+from app import app
+from booking import book_slot
+from models import db, Doctor, Department, Patient, StatCounter
+from stats import NAMES_VERSION
+from conftest import patient_id
+
+def fetch(client, url='/patient/appointments', **headers):
+    return client.get(url, headers=headers)
+
+def test_etag_round_trip(patient_client):
+    first = fetch(patient_client)
+    assert first.status_code == 200
+    assert first.headers['ETag'].startswith('W/') and first.headers['Last-Modified']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    again = fetch(patient_client, **{'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['ETag'] == first.headers['ETag']
+    assert fetch(patient_client, **{'If-None-Match': 'W/"stale"'}).status_code == 200
+
+def test_if_modified_since_alone_is_not_enough(patient_client):
+    first = fetch(patient_client)
+    assert fetch(patient_client, **{'If-Modified-Since': first.headers['Last-Modified']}).status_code == 200
+
+def test_booking_and_cancelling_change_the_etag(patient_client, open_day):
+    doctor_id, day = open_day
+    before = fetch(patient_client).headers['ETag']
+    with app.app_context():
+        appointment_id = book_slot(patient_id(), doctor_id, day, time(9)).id
+    booked = fetch(patient_client, **{'If-None-Match': before})
+    assert booked.status_code == 200 and booked.headers['ETag'] != before
+
+    # Following the redirect shows (and clears) the flash message.
+    patient_client.post(f'/patient/appointment/{appointment_id}/cancel', follow_redirects=True)
+    cancelled = fetch(patient_client, **{'If-None-Match': booked.headers['ETag']})
+    assert cancelled.status_code == 200 and cancelled.headers['ETag'] != booked.headers['ETag']
+    assert fetch(patient_client, **{'If-None-Match': cancelled.headers['ETag']}).status_code == 304
+
+def set_name(model, column, old, new):
+    with app.app_context():
+        setattr(model.query.filter(getattr(model, column) == old).one(), column, new)
+        db.session.commit()
+
+def assert_rename_refreshes(pages, model, column, old, new):
+    tags = [fetch(client, url).headers['ETag'] for client, url in pages]
+    set_name(model, column, old, new)
+    try:
+        for (client, url), tag in zip(pages, tags):
+            response = fetch(client, url, **{'If-None-Match': tag})
+            assert response.status_code == 200 and new.encode() in response.data
+    finally:
+        set_name(model, column, new, old)
+
+def test_renames_change_the_etag(patient_client, doctor_client):
+    patient_pages = [(patient_client, '/patient/appointments'), (patient_client, '/patient/history')]
+    assert_rename_refreshes(patient_pages, Doctor, 'full_name', 'Dr. Raghav Sharma', 'Dr. Raghav Sharma-Rao')
+    with app.app_context():
+        department = Doctor.query.filter_by(full_name='Dr. Raghav Sharma').one().department.name
+    assert_rename_refreshes(patient_pages, Department, 'name', department, f'{department} Unit')
+    assert_rename_refreshes([(doctor_client, '/doctor/appointments')], Patient, 'full_name', 'Parth Joshi',
+                            'Parth R. Joshi')
+
+def test_unrelated_writes_keep_the_names_version(ctx, open_day):
+    doctor_id, day = open_day
+    version = db.session.get(StatCounter, NAMES_VERSION)
+    before = version.value if version else None
+    book_slot(patient_id(), doctor_id, day, time(10))
+    db.session.expire_all()
+    version = db.session.get(StatCounter, NAMES_VERSION)
+    assert (version.value if version else None) == before
@@ -0,0 +1,114 @@
+import threading
+import time as clock
+from datetime import date, time
+import stats
+from app import app
+from booking import book_slot
+from models import db, Appointment, Doctor, Patient, StatCounter
+from stats import dashboard_counts, reconcile_counters, reconcile_if_due, booked_key, RECONCILED_AT
+from conftest import patient_id
+
+def test_counts_match_tables(ctx):
+    counts = dashboard_counts()
+    assert counts['doctors'] == Doctor.query.count()
+    assert counts['patients'] == Patient.query.count()
+    assert counts['appointments'] == Appointment.query.count()
+
+def test_counts_follow_bookings(ctx, open_day):
+    doctor_id, day = open_day
+    before = dashboard_counts()
+    appointment = book_slot(patient_id(), doctor_id, day, time(9))
+    after = dashboard_counts()
+    assert after['appointments'] == before['appointments'] + 1
+    assert after['upcoming'] == before['upcoming'] + 1
+
+    appointment.status = 'Cancelled'
+    db.session.commit()
+    assert dashboard_counts()['upcoming'] == before['upcoming']
+
+def test_dashboards_render_counts(admin_client, doctor_client, patient_client):
+    with app.app_context():
+        counts = dashboard_counts()
+    page = admin_client.get('/admin/dashboard').data.decode()
+    assert str(counts['doctors']) in page and str(counts['patients']) in page
+    assert b'Dr. Raghav Sharma' in doctor_client.get('/doctor/dashboard').data
+    assert doctor_client.get('/doctor/dashboard').status_code == 200
+    assert patient_client.get('/patient/dashboard').status_code == 200
+
+def test_reconcile_repairs_drift(ctx):
+    db.session.query(StatCounter).filter_by(name='doctors').update({'value': -5})
+    db.session.add(StatCounter(name=booked_key(date(2000, 1, 1)), value=3))
+    db.session.commit()
+    reconcile_counters()
+    assert dashboard_counts()['doctors'] == Doctor.query.count()
+    assert db.session.get(StatCounter, booked_key(date(2000, 1, 1))) is None
+
+def test_concurrent_reconciles_and_bookings(database, open_day):
+    # Each thread recounts or books while the others do; none may hit the
+    # counters' primary key.
+    doctor_id, day = open_day
+    errors = []
+
+    def work(index):
+        try:
+            with app.app_context():
+                if index % 2:
+                    reconcile_counters()
+                else:
+                    book_slot(patient_id(), doctor_id, day, time(9 + index // 2))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            with app.app_context():
+                db.session.remove()
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with app.app_context():
+        reconcile_counters()
+        assert dashboard_counts()['appointments'] == Appointment.query.count()
+
+def test_dashboard_counts_do_not_write(ctx):
+    db.session.query(StatCounter).filter_by(name=RECONCILED_AT).delete()
+    db.session.commit()
+    dashboard_counts()
+    assert db.session.get(StatCounter, RECONCILED_AT) is None
+
+def drift():
+    db.session.query(StatCounter).filter_by(name='doctors').update({'value': -5})
+    db.session.commit()
+
+def stamp(seconds_ago):
+    db.session.query(StatCounter).filter_by(name=RECONCILED_AT).update({'value': int(clock.time()) - seconds_ago})
+    db.session.commit()
+
+def test_reconcile_waits_until_due(ctx):
+    reconcile_counters()
+    drift()
+    assert reconcile_if_due(900) is False
+    assert not db.session().in_transaction()
+    assert dashboard_counts()['doctors'] == -5
+
+    stamp(901)
+    assert reconcile_if_due(900) is True
+    assert dashboard_counts()['doctors'] == Doctor.query.count()
+    assert clock.time() - db.session.get(StatCounter, RECONCILED_AT).value < 5
+
+def test_reconcile_without_a_stamp_is_due(ctx):
+    db.session.query(StatCounter).filter_by(name=RECONCILED_AT).delete()
+    db.session.commit()
+    drift()
+    assert reconcile_if_due(900) is True
+    assert dashboard_counts()['doctors'] == Doctor.query.count()
+
+def test_first_request_starts_the_reconciler(client, monkeypatch):
+    started = threading.Event()
+    monkeypatch.setattr(stats, '_reconciler', [])
+    monkeypatch.setattr(stats, '_reconcile_forever', lambda app, interval: started.set())
+    monkeypatch.setitem(app.config, 'RECONCILE_INTERVAL', 60)
+    client.get('/login')
+    assert started.wait(5)
@@ -0,0 +1,71 @@
+import sqlite3
+import pytest
+from sqlalchemy import text
+from database import database_url, engine_options, async_database_url, write_transaction
+from models import db, Department
+
+def test_database_url_normalises_heroku_scheme():
+    assert database_url({'DATABASE_URL': 'postgres://u:p@h/db'}) == 'postgresql://u:p@h/db'
+    assert database_url({}) == 'sqlite:///hospital.db'
+
+def test_engine_options():
+    assert engine_options('sqlite:///x.db') == {}
+    options = engine_options('postgresql://h/db', {'DB_POOL_SIZE': '3', 'DB_POOL_PRE_PING': '0'})
+    assert options['pool_size'] == 3 and options['max_overflow'] == 10 and options['pool_pre_ping'] is False
+
+def test_async_database_url():
+    assert async_database_url('sqlite:///x.db') == 'sqlite+aiosqlite:///x.db'
+    assert async_database_url('postgresql+psycopg2://h/db') == 'postgresql+asyncpg://h/db'
+
+def test_engine_uses_configured_pool(ctx, database):
+    if database.startswith('sqlite'):
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+    else:
+        assert db.engine.pool.size() == engine_options(database)['pool_size']
+        assert db.engine.pool._recycle == engine_options(database)['pool_recycle']
+
+def other_writer_can_write(database):
+    # A second connection that gives up at once if the write lock is held.
+    conn = sqlite3.connect(database[len('sqlite:///'):], timeout=0)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.rollback()
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize('work', [
+    lambda: Department.query.filter_by(name='Cardiology').first() and None,
+    lambda: db.session.add(Department(name='Never Committed')),
+], ids=['read-only', 'uncommitted'])
+def test_work_that_does_not_commit_is_rolled_back(ctx, database, work):
+    assert write_transaction(work) is None
+    assert not db.session().in_transaction()
+    assert Department.query.filter_by(name='Never Committed').first() is None
+    if database.startswith('sqlite'):
+        assert other_writer_can_write(database)
+
+def test_committed_work_keeps_its_result(ctx):
+    def create():
+        department = Department(name='Write Transaction Result', description='x')
+        db.session.add(department)
+        db.session.commit()
+        return department
+
+    department = write_transaction(create)
+    assert department.id and db.session.get(Department, department.id).name == 'Write Transaction Result'
+
+def test_failed_work_is_rolled_back(ctx, database):
+    def fail():
+        db.session.add(Department(name='Half Written'))
+        db.session.flush()
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        write_transaction(fail)
+    assert not db.session().in_transaction()
+    assert Department.query.filter_by(name='Half Written').first() is None
+    if database.startswith('sqlite'):
+        assert other_writer_can_write(database)
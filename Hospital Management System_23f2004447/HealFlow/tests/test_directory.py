@@ -0,0 +1,81 @@
+import re
+from types import SimpleNamespace
+import pytest
+import directory
+from app import app
+from directory import TTLCache
+from models import Doctor
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(directory, 'clock', SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+def test_hits_and_misses(clock):
+    cache, loads = TTLCache(maxsize=4, ttl=60), []
+    load = lambda: loads.append(1) or len(loads)
+    assert cache.get_or_load('a', load) == 1
+    assert cache.get_or_load('a', load) == 1
+    assert cache.get_or_load('b', load) == 2
+    assert cache.stats() == {'size': 2, 'maxsize': 4, 'ttl': 60, 'hits': 1, 'misses': 2, 'evictions': 0,
+                             'hit_rate': 0.3333}
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = TTLCache(ttl=60)
+    cache.get_or_load('a', lambda: 'old')
+    clock.value += 59
+    assert cache.get_or_load('a', lambda: 'new') == 'old'
+    clock.value += 1
+    assert cache.get_or_load('a', lambda: 'new') == 'new'
+    assert cache.stats()['misses'] == 2
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.get_or_load('a', lambda: 'a')
+    cache.get_or_load('b', lambda: 'b')
+    cache.get_or_load('a', lambda: 'reloaded')  # 'a' is now the most recent
+    cache.get_or_load('c', lambda: 'c')
+    assert cache.get_or_load('a', lambda: 'reloaded') == 'a'
+    assert cache.get_or_load('b', lambda: 'reloaded') == 'reloaded'
+    assert cache.stats()['evictions'] == 2
+
+def test_clear(clock):
+    cache = TTLCache()
+    cache.get_or_load('a', lambda: 'old')
+    cache.clear()
+    assert cache.get_or_load('a', lambda: 'new') == 'new' and cache.stats()['size'] == 1
+
+def doctor_count(page, department):
+    # Columns: id, name, description, doctor count, created.
+    row = re.search(r'<strong>' + re.escape(department) + r'</strong></td>\s*<td>.*?</td>\s*<td>(\d+)</td>', page, re.S)
+    return int(row.group(1))
+
+def test_admin_edits_show_up_at_once(admin_client):
+    with app.app_context():
+        sharma = Doctor.query.filter_by(full_name='Dr. Raghav Sharma').one()
+        form = {'username': sharma.user.username, 'email': sharma.user.email, 'full_name': 'Dr. Raghav Sharma',
+                'department_id': sharma.department_id, 'phone': sharma.phone, 'qualification': sharma.qualification,
+                'experience_years': sharma.experience_years, 'consultation_fee': sharma.consultation_fee}
+        department = sharma.department.name
+    # Warm the cache first, so a stale entry would be served below.
+    assert b'Dr. Raghav Sharma' in admin_client.get('/admin/dashboard').data
+    before = doctor_count(admin_client.get('/admin/departments').data.decode(), department)
+
+    admin_client.post(f'/admin/doctor/edit/{sharma.id}', data=dict(form, full_name='Dr. Raghav Sharma-Rao'))
+    try:
+        assert b'Dr. Raghav Sharma-Rao' in admin_client.get('/admin/dashboard').data
+    finally:
+        admin_client.post(f'/admin/doctor/edit/{sharma.id}', data=form)
+    assert b'Sharma-Rao' not in admin_client.get('/admin/dashboard').data
+
+    admin_client.post('/admin/doctor/add', data=dict(form, username='dr.cached', email='dr.cached@example.com',
+                                                     full_name='Dr. Cache Check'))
+    assert doctor_count(admin_client.get('/admin/departments').data.decode(), department) == before + 1
+    with app.app_context():
+        new_id = Doctor.query.filter_by(full_name='Dr. Cache Check').one().id
+    admin_client.post(f'/admin/doctor/delete/{new_id}')
+    assert doctor_count(admin_client.get('/admin/departments').data.decode(), department) == before
+
+    admin_client.post('/admin/department/add', data={'name': 'Cache Check Clinic', 'description': 'x'})
+    assert b'Cache Check Clinic' in admin_client.get('/admin/departments').data
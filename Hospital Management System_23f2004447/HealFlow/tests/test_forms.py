@@ -0,0 +1,60 @@
+import pytest
+from werkzeug.datastructures import MultiDict
+from app import app
+from catalog import invalidate_catalog
+from forms import LabTestForm, HealthPackageForm, DoctorForm
+from models import db, LabTest, HealthPackage
+
+def validate(form_class, choices=None, **data):
+    with app.test_request_context():
+        form = form_class(formdata=MultiDict(data), meta={'csrf': False})
+        for name, values in (choices or {}).items():
+            form[name].choices = values
+        return form.validate(), form.errors
+
+@pytest.mark.parametrize('form_class', [LabTestForm, HealthPackageForm])
+@pytest.mark.parametrize('price,valid', [('0', True), ('0.0', True), ('250', True), ('-1', False), ('', False),
+                                         ('nan', False), ('inf', False)])
+def test_catalog_price(form_class, price, valid):
+    ok, errors = validate(form_class, name='Free Screening', price=price)
+    assert ok == valid, errors
+
+@pytest.mark.parametrize('experience,fee,invalid', [
+    ('0', '0', set()),
+    ('-1', '500', {'experience_years'}),
+    ('5', '-500', {'consultation_fee'}),
+    ('5', 'nan', {'consultation_fee'}),
+])
+def test_doctor_form_experience_and_fee(experience, fee, invalid):
+    ok, errors = validate(DoctorForm, choices={'department_id': [(1, 'Cardiology')]}, username='dr.new',
+                          email='dr.new@example.com', full_name='Dr. New', department_id='1', phone='9800000002',
+                          qualification='MBBS', experience_years=experience, consultation_fee=fee)
+    assert set(errors) == invalid
+
+def test_admin_adds_free_catalog_items(admin_client):
+    admin_client.post('/admin/lab-catalog/test/add', data={'test-name': 'Free BP Check', 'test-price': '0'})
+    admin_client.post('/admin/lab-catalog/package/add', data={'package-name': 'Free Camp', 'package-price': '0'})
+    with app.app_context():
+        assert LabTest.query.filter_by(name='Free BP Check').one().price == 0
+        assert HealthPackage.query.filter_by(name='Free Camp').one().price == 0
+
+@pytest.mark.parametrize('price', ['nan', 'inf', '-5', ''])
+def test_catalog_update_rejects_bad_prices(admin_client, price):
+    with app.app_context():
+        test = LabTest.query.order_by(LabTest.id).first()
+    response = admin_client.post(f'/admin/lab-catalog/test/{test.id}', data={'price': price, 'active': 'on'},
+                                 follow_redirects=True)
+    assert b'Invalid price.' in response.data
+    with app.app_context():
+        assert LabTest.query.get(test.id).price == test.price
+
+def test_catalog_update_saves_price_and_active(admin_client):
+    with app.app_context():
+        test = LabTest.query.order_by(LabTest.id).first()
+    admin_client.post(f'/admin/lab-catalog/test/{test.id}', data={'price': '0'})
+    with app.app_context():
+        updated = LabTest.query.get(test.id)
+        assert updated.price == 0 and not updated.active
+        updated.price, updated.active = test.price, test.active
+        db.session.commit()
+    invalidate_catalog()
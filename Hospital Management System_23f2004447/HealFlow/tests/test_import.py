@@ -0,0 +1,62 @@
+import io
+import os
+import time as clock
+from datetime import date, timedelta
+from app import app
+from booking import IN_THE_PAST, OUTSIDE_AVAILABILITY, NOT_A_SLOT, ALREADY_BOOKED
+from importer import import_stream
+from models import db, Appointment, ImportJob
+
+def appointments_csv(doctor_id, rows):
+    lines = ['patient_username,doctor_id,appointment_date,appointment_time,status']
+    lines += [f'parth.joshi,{doctor_id},{day},{at},{status}' for day, at, status in rows]
+    return '\n'.join(lines) + '\n'
+
+def test_booked_rows_follow_booking_rules(ctx, open_day):
+    doctor_id, day = open_day
+    past = date.today() - timedelta(days=3)
+    report = import_stream('appointments', io.StringIO(appointments_csv(doctor_id, [
+        (day, '09:00', 'Booked'),
+        (day, '09:00', 'Booked'),
+        (day, '09:10', 'Booked'),
+        (day, '13:00', 'Booked'),
+        (past, '09:00', 'Booked'),
+        (past, '09:10', 'Completed'),
+    ])))
+    assert report.imported == 2
+    assert [messages for _, messages in report.errors] == [
+        [ALREADY_BOOKED], [NOT_A_SLOT], [OUTSIDE_AVAILABILITY], [IN_THE_PAST]]
+    assert Appointment.query.filter_by(doctor_id=doctor_id, appointment_date=day, status='Booked').count() == 1
+
+def wait_for(job_id, timeout=30):
+    deadline = clock.monotonic() + timeout
+    while clock.monotonic() < deadline:
+        with app.app_context():
+            job = db.session.get(ImportJob, job_id)
+            if job.status in ('Done', 'Failed'):
+                return job
+        clock.sleep(0.05)
+    raise AssertionError(f'import job {job_id} did not finish')
+
+def test_upload_runs_as_a_background_job(admin_client, open_day, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORT_DIR', str(tmp_path))
+    doctor_id, day = open_day
+    body = appointments_csv(doctor_id, [(day, '10:00', 'Booked'), (day, '10:05', 'Booked')])
+    response = admin_client.post('/admin/import', data={
+        'kind': 'appointments', 'file': (io.BytesIO(body.encode()), 'appointments.csv')})
+    assert response.status_code == 302 and '/admin/import/' in response.location
+
+    job = wait_for(int(response.location.rsplit('/', 1)[1]))
+    assert (job.status, job.progress, job.imported, job.failed) == ('Done', 100, 1, 1)
+    assert os.listdir(tmp_path) == []
+    page = admin_client.get(response.location).data.decode()
+    assert NOT_A_SLOT in page and 'appointments.csv' in page
+    assert 'appointments.csv' in admin_client.get('/admin/import').data.decode()
+
+def test_failed_job_is_reported(admin_client, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'IMPORT_DIR', str(tmp_path))
+    response = admin_client.post('/admin/import', data={
+        'kind': 'patients', 'file': (io.BytesIO(b'\xff\xfe not utf-8'), 'patients.csv')})
+    job = wait_for(int(response.location.rsplit('/', 1)[1]))
+    assert job.status == 'Failed' and job.message
+    assert os.listdir(tmp_path) == []
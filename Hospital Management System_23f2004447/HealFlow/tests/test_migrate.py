@@ -0,0 +1,52 @@
+from datetime import time
+import pytest
+from sqlalchemy import inspect, text
+from booking import SLOT_INDEX
+from models import db, Appointment, Doctor
+from migrate import ensure_indexes, DuplicateBookings, check_query_plans
+from conftest import patient_id
+
+@pytest.fixture
+def without_slot_index(ctx):
+    db.session.execute(text(f'DROP INDEX {SLOT_INDEX}'))
+    db.session.commit()
+    yield
+    db.session.rollback()
+    if SLOT_INDEX not in {ix['name'] for ix in inspect(db.engine).get_indexes('appointments')}:
+        for appointment in Appointment.query.filter_by(status='Booked', reason='duplicate'):
+            appointment.status = 'Cancelled'
+        db.session.commit()
+        ensure_indexes()
+
+def book_twice(doctor_id, day):
+    rows = [Appointment(patient_id=patient_id(), doctor_id=doctor_id, appointment_date=day, appointment_time=time(9),
+                        reason='duplicate', status='Booked') for _ in range(2)]
+    db.session.add_all(rows)
+    db.session.commit()
+    return [row.id for row in rows]
+
+def test_duplicate_bookings_block_the_slot_index(without_slot_index, open_day):
+    doctor_id, day = open_day
+    ids = book_twice(doctor_id, day)
+    with pytest.raises(DuplicateBookings) as error:
+        ensure_indexes()
+    assert error.value.slots == {(doctor_id, day, time(9)): ids}
+    assert SLOT_INDEX not in {ix['name'] for ix in inspect(db.engine).get_indexes('appointments')}
+
+def test_cancel_duplicates_keeps_the_oldest(without_slot_index, open_day):
+    doctor_id, day = open_day
+    first, second = book_twice(doctor_id, day)
+    assert ensure_indexes(cancel_duplicates=True) == [SLOT_INDEX]
+    assert db.session.get(Appointment, first).status == 'Booked'
+    assert db.session.get(Appointment, second).status == 'Cancelled'
+
+def test_dashboard_queries_use_indexes(ctx, database):
+    if not database.startswith('sqlite'):
+        pytest.skip('EXPLAIN QUERY PLAN is SQLite only')
+    assert check_query_plans() == {}
+
+def test_index_walks_fail_the_plan_check(ctx, database):
+    if not database.startswith('sqlite'):
+        pytest.skip('EXPLAIN QUERY PLAN is SQLite only')
+    failures = check_query_plans({'doctors by user': Doctor.query.order_by(Doctor.user_id)})
+    assert failures == {'doctors by user': ['SCAN doctors USING INDEX ix_doctors_user_id']}
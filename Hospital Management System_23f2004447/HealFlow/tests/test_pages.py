@@ -0,0 +1,30 @@
+import pytest
+
+ADMIN_PAGES = ['/admin/dashboard', '/admin/departments', '/admin/doctors', '/admin/doctors?search=sharma',
+               '/admin/patients', '/admin/patients?search=parth', '/admin/appointments', '/admin/lab-catalog',
+               '/admin/lab-revenue']
+DOCTOR_PAGES = ['/doctor/dashboard', '/doctor/appointments']
+PATIENT_PAGES = ['/patient/dashboard', '/patient/doctors', '/patient/doctors?search=sharma&department=1',
+                 '/patient/appointments', '/patient/history', '/patient/cart']
+
+@pytest.mark.parametrize('url', ADMIN_PAGES)
+def test_admin_pages(admin_client, url):
+    assert admin_client.get(url).status_code == 200
+
+@pytest.mark.parametrize('url', DOCTOR_PAGES)
+def test_doctor_pages(doctor_client, url):
+    assert doctor_client.get(url).status_code == 200
+
+@pytest.mark.parametrize('url', PATIENT_PAGES)
+def test_patient_pages(patient_client, url):
+    assert patient_client.get(url).status_code == 200
+
+def test_listings_show_seeded_rows(admin_client, patient_client):
+    assert b'Dr. Raghav Sharma' in admin_client.get('/admin/doctors').data
+    assert b'Parth Joshi' in admin_client.get('/admin/patients?search=parth').data
+    assert b'Dr. Raghav Sharma' in patient_client.get('/patient/appointments').data
+    assert b'Patient examined and diagnosed' in patient_client.get('/patient/history').data
+
+def test_roles_are_enforced(patient_client):
+    response = patient_client.get('/admin/dashboard')
+    assert response.status_code == 302
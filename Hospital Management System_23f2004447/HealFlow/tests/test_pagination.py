@@ -0,0 +1,73 @@
+import html
+import re
+from datetime import time
+import pytest
+from models import db, Appointment, Patient
+from pagination import keyset_paginate, encode_cursor, decode_cursor, InvalidCursor
+from queries import APPOINTMENT_SORT_KEY, appointment_listing
+from conftest import patient_id
+
+@pytest.fixture
+def tied_rows(ctx, open_day):
+    # Several appointments on one date and time: only the id orders them.
+    doctor_id, day = open_day
+    db.session.add_all([Appointment(patient_id=patient_id(), doctor_id=doctor_id, appointment_date=day,
+                                    appointment_time=time(9), status='Cancelled') for _ in range(4)])
+    db.session.commit()
+
+def walk(query, columns, descending, per_page=3):
+    pages, args = [], {'per_page': per_page}
+    while True:
+        page = keyset_paginate(query, columns, args, descending=descending)
+        pages.append([row.id for row in page.items])
+        if not page.has_next:
+            return pages, page
+        args = {'per_page': per_page, 'after': page.next_cursor}
+
+def walk_back(query, columns, descending, page, per_page=3):
+    pages = []
+    while page.has_prev:
+        page = keyset_paginate(query, columns, {'per_page': per_page, 'before': page.prev_cursor},
+                               descending=descending)
+        pages.append([row.id for row in page.items])
+    return pages
+
+def test_appointment_pages_match_one_ordered_query(tied_rows):
+    expected = [row.id for row in appointment_listing().order_by(
+        *[column.desc() for column in APPOINTMENT_SORT_KEY]).all()]
+    pages, last = walk(appointment_listing(), APPOINTMENT_SORT_KEY, descending=True)
+    assert [row_id for page in pages for row_id in page] == expected
+    assert all(len(page) == 3 for page in pages[:-1]) and 1 <= len(pages[-1]) <= 3
+    # Walking back from the last page visits the same pages in reverse.
+    assert walk_back(appointment_listing(), APPOINTMENT_SORT_KEY, True, last) == pages[-2::-1]
+
+def test_ascending_pages_in_both_directions(ctx):
+    expected = [row.id for row in Patient.query.order_by(Patient.id)]
+    pages, last = walk(Patient.query, (Patient.id,), descending=False, per_page=5)
+    assert [row_id for page in pages for row_id in page] == expected
+    assert walk_back(Patient.query, (Patient.id,), False, last, per_page=5) == pages[-2::-1]
+
+def test_first_page_has_no_previous(ctx):
+    page = keyset_paginate(Patient.query, (Patient.id,), {'per_page': 'lots'})
+    assert not page.has_prev and page.per_page == 25
+
+@pytest.mark.parametrize('cursor', ['!!!', encode_cursor(['2030-01-01']), encode_cursor(['x', '09:00', 1]),
+                                    'eyJhIjoxfQ'])
+def test_malformed_cursors_raise(ctx, cursor):
+    with pytest.raises(InvalidCursor):
+        keyset_paginate(appointment_listing(), APPOINTMENT_SORT_KEY, {'after': cursor}, descending=True)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(APPOINTMENT_SORT_KEY, cursor)
+
+@pytest.mark.parametrize('url', ['/admin/appointments?after=!!!', '/admin/patients?before=junk&search=joshi',
+                                 '/admin/doctors?after=e30'])
+def test_listing_views_reject_malformed_cursors(admin_client, url):
+    response = admin_client.get(url)
+    assert response.status_code == 302 and 'after' not in response.location and 'before' not in response.location
+    assert b'Invalid page link.' in admin_client.get(response.location).data
+
+def test_listing_view_follows_its_links(admin_client):
+    first = admin_client.get('/admin/appointments?per_page=3').data.decode()
+    next_url = html.unescape(re.search(r'href="([^"]*after=[^"]*)"', first).group(1))
+    second = admin_client.get(next_url)
+    assert second.status_code == 200 and 'before=' in second.data.decode()
@@ -0,0 +1,34 @@
+import pytest
+import sqlalchemy
+from flask import g
+from app import app
+
+LISTINGS = {
+    'admin': ['/admin/doctors', '/admin/patients', '/admin/appointments', '/admin/dashboard'],
+    'doctor': ['/doctor/appointments', '/doctor/dashboard'],
+    'patient': ['/patient/doctors', '/patient/appointments', '/patient/history', '/patient/dashboard'],
+}
+
+@pytest.fixture
+def clients(admin_client, doctor_client, patient_client):
+    return {'admin': admin_client, 'doctor': doctor_client, 'patient': patient_client}
+
+@pytest.mark.parametrize('role,url', [(role, url) for role, urls in LISTINGS.items() for url in urls])
+def test_listing_stays_within_query_budget(clients, role, url):
+    # app.testing is on, so check_query_budget raises for a page that goes over.
+    assert app.testing
+    response = clients[role].get(url)
+    assert response.status_code == 200
+    queries = int(response.headers['Server-Timing'].split('desc="')[1].split(' ')[0])
+    assert 0 < queries <= app.config['SQL_QUERY_BUDGET']
+
+def test_going_over_budget_fails_the_request(admin_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'SQL_QUERY_BUDGET', 1)
+    with pytest.raises(AssertionError, match='admin_doctors issued'):
+        admin_client.get('/admin/doctors')
+
+def test_other_engines_are_not_counted(ctx):
+    engine = sqlalchemy.create_engine('sqlite://')
+    with app.test_request_context(), engine.connect() as conn:
+        conn.execute(sqlalchemy.text('SELECT 1'))
+        assert g.get('sql_query_count', 0) == 0
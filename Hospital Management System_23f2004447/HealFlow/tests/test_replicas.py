@@ -0,0 +1,109 @@
+import shutil
+import sqlite3
+import pytest
+from flask import g
+from sqlalchemy import text
+from app import app
+from directory import invalidate_directory
+from models import db, User, Patient, Department
+from seed_data import seed_database
+from conftest import use_database, login
+
+@pytest.fixture(scope='module')
+def replica(database, tmp_path_factory):
+    # Two SQLite files: the replica is a copy of the primary in which one
+    # patient has a different name, so each page shows which one it read.
+    workdir = tmp_path_factory.mktemp('replicas')
+    primary, copy = workdir / 'primary.db', workdir / 'replica.db'
+    use_database(f'sqlite:///{primary}')
+    with app.app_context():
+        seed_database()
+        admin = User(username='admin', email='admin@hospital.com', role='admin')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        db.engine.dispose()
+    shutil.copy(primary, copy)
+    with sqlite3.connect(copy) as conn:
+        conn.execute("UPDATE patients SET full_name = 'Replica Joshi' WHERE full_name = 'Parth Joshi'")
+    use_database(f'sqlite:///{primary}', binds={'replica_0': f'sqlite:///{copy}'})
+    invalidate_directory()
+    yield
+    use_database(database)
+    invalidate_directory()
+
+def patient_name():
+    return db.session.execute(db.select(Patient.full_name).where(Patient.full_name.in_(
+        ['Parth Joshi', 'Replica Joshi']))).scalar()
+
+def test_read_only_view_reads_the_replica(replica):
+    client = login(app.test_client(), 'admin', 'admin123')
+    page = client.get('/admin/patients?search=joshi').data
+    assert b'Replica Joshi' in page and b'Parth Joshi' not in page
+
+def test_other_requests_read_the_primary(replica):
+    with app.test_request_context():
+        assert patient_name() == 'Parth Joshi'
+
+def test_flush_pins_the_request_to_the_primary(replica):
+    with app.test_request_context():
+        g.replica = 'replica_0'
+        assert patient_name() == 'Replica Joshi'
+        db.session.add(Department(name='Replica Routing'))
+        db.session.flush()
+        assert g.db_wrote and patient_name() == 'Parth Joshi'
+        db.session.rollback()
+
+@pytest.mark.parametrize('statement', [
+    "UPDATE departments SET description = description WHERE id = 0",
+    "DELETE FROM departments WHERE id = 0",
+    "SELECT id FROM departments WHERE id = 0 FOR UPDATE",
+])
+def test_text_writes_pin_the_primary(replica, statement):
+    with app.test_request_context():
+        g.replica = 'replica_0'
+        try:
+            db.session.execute(text(statement))
+        except Exception:
+            pass  # SQLite has no FOR UPDATE; the routing has happened by then
+        assert g.db_wrote and patient_name() == 'Parth Joshi'
+        db.session.rollback()
+
+def test_text_reads_go_to_the_primary_without_pinning(replica):
+    with app.test_request_context():
+        g.replica = 'replica_0'
+        name = db.session.execute(text("SELECT full_name FROM patients WHERE full_name LIKE '%Joshi'")).scalar()
+        assert name == 'Parth Joshi'
+        assert not g.get('db_wrote') and patient_name() == 'Replica Joshi'
+
+def test_core_dml_pins_the_primary(replica):
+    with app.test_request_context():
+        g.replica = 'replica_0'
+        db.session.execute(db.update(Department).where(Department.id == 0).values(description='x'))
+        assert g.db_wrote and patient_name() == 'Parth Joshi'
+        db.session.rollback()
+
+def test_directory_search_is_not_a_write(replica):
+    client = login(app.test_client(), 'parth.joshi', 'patient123')
+    assert client.get('/patient/doctors?search=sharma').status_code == 200
+    with client.session_transaction() as session:
+        assert 'primary_until' not in session
+
+def test_select_for_update_goes_to_the_primary(replica):
+    with app.test_request_context():
+        g.replica = 'replica_0'
+        db.session.execute(db.select(Department.id).with_for_update()).all()
+        assert g.db_wrote
+
+def test_recent_write_keeps_reading_the_primary(replica):
+    client = login(app.test_client(), 'admin', 'admin123')
+    response = client.post('/admin/department/add', data={'name': 'Replica Lag', 'description': 'x'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert session['primary_until'] > 0
+    page = client.get('/admin/patients?search=joshi').data
+    assert b'Parth Joshi' in page and b'Replica Joshi' not in page
+
+    with client.session_transaction() as session:
+        session['primary_until'] = 0
+    assert b'Replica Joshi' in client.get('/admin/patients?search=joshi').data
@@ -0,0 +1,35 @@
+import sqlite3
+import pytest
+import sqlalchemy
+import search
+from models import db
+from queries import patient_listing, doctor_listing
+
+@pytest.fixture(params=[True, False], ids=['trigram', 'no-trigram'])
+def trigram(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(search, 'trigram_supported', lambda: False)
+    return request.param
+
+def test_probe_matches_the_sqlite_library():
+    search.trigram_supported.cache_clear()
+    assert search.trigram_supported() == (sqlite3.sqlite_version_info >= (3, 34, 0))
+
+def test_search_with_and_without_trigram_index(ctx, trigram):
+    names = [p.full_name for p in search.filter_patients(patient_listing(), 'joshi').all()]
+    assert 'Parth Joshi' in names
+    doctors = [d.full_name for d in search.filter_doctors(doctor_listing(), 'sharma').all()]
+    assert 'Dr. Raghav Sharma' in doctors
+
+def test_search_pages_without_trigram(admin_client, trigram):
+    assert b'Parth Joshi' in admin_client.get('/admin/patients?search=joshi').data
+    assert b'Dr. Raghav Sharma' in admin_client.get('/admin/doctors?search=sharma').data
+
+def test_create_all_skips_the_index_without_trigram(tmp_path, monkeypatch):
+    # An older SQLite would reject the CREATE VIRTUAL TABLE inside create_all.
+    monkeypatch.setattr(search, 'trigram_supported', lambda: False)
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    db.metadata.create_all(engine)
+    tables = sqlalchemy.inspect(engine).get_table_names()
+    engine.dispose()
+    assert 'patients' in tables and 'patients_fts' not in tables
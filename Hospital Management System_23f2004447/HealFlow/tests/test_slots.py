@@ -0,0 +1,136 @@
+from datetime import date, time, timedelta
+import pytest
+from app import app
+from booking import book_slot
+from models import db, Appointment, Doctor, DoctorAvailability, FreeSlot
+from slots import expand_window, free_times, free_slots_for_doctor, rebuild_slot_index
+from conftest import patient_id
+
+MORNING = [time(9), time(9, 30), time(10), time(10, 30), time(11), time(11, 30)]
+
+def free(doctor_id, day):
+    return [slot.start_time for slot in free_slots_for_doctor(doctor_id, day, day)]
+
+def test_expand_window_and_overlaps():
+    day = date(2030, 1, 7)
+    assert list(expand_window(day, time(9), time(10, 45))) == [time(9), time(9, 30), time(10)]
+    # An off-grid booking blocks both slots it overlaps.
+    assert free_times(day, [(time(9), time(11))], [time(9, 45)]) == [time(9), time(10, 30)]
+    assert free_times(day, [(time(9), time(10)), (time(9, 30), time(10, 30))], []) == [time(9), time(9, 30), time(10)]
+
+def test_window_is_indexed(ctx, open_day):
+    doctor_id, day = open_day
+    assert free(doctor_id, day) == MORNING
+
+def test_booking_and_cancelling_update_the_index(ctx, open_day):
+    doctor_id, day = open_day
+    appointment = book_slot(patient_id(), doctor_id, day, time(10))
+    assert time(10) not in free(doctor_id, day) and len(free(doctor_id, day)) == 5
+
+    appointment.status = 'Cancelled'
+    db.session.commit()
+    assert free(doctor_id, day) == MORNING
+
+    appointment.status = 'Booked'
+    db.session.commit()
+    db.session.delete(appointment)
+    db.session.commit()
+    assert free(doctor_id, day) == MORNING
+
+def test_off_grid_and_moved_bookings(ctx, open_day):
+    doctor_id, day = open_day
+    appointment = Appointment(patient_id=patient_id(), doctor_id=doctor_id, appointment_date=day,
+                              appointment_time=time(10, 15), status='Booked')
+    db.session.add(appointment)
+    db.session.commit()
+    assert free(doctor_id, day) == [time(9), time(9, 30), time(11), time(11, 30)]
+
+    appointment.appointment_time = time(11, 30)
+    db.session.commit()
+    assert free(doctor_id, day) == MORNING[:-1]
+
+def test_availability_changes_update_the_index(ctx, open_day):
+    doctor_id, day = open_day
+    window = DoctorAvailability.query.filter_by(doctor_id=doctor_id, date=day).one()
+    window.end_time = time(10)
+    db.session.commit()
+    assert free(doctor_id, day) == MORNING[:2]
+
+    window.is_available = False
+    db.session.commit()
+    assert free(doctor_id, day) == []
+
+    db.session.delete(window)
+    db.session.commit()
+    assert FreeSlot.query.filter_by(doctor_id=doctor_id, date=day).count() == 0
+
+def test_department_move_follows_the_doctor(ctx, open_day):
+    doctor_id, day = open_day
+    doctor = db.session.get(Doctor, doctor_id)
+    old, new = doctor.department_id, doctor.department_id % 8 + 1
+    doctor.department_id = new
+    db.session.commit()
+    try:
+        assert {slot.department_id for slot in FreeSlot.query.filter_by(doctor_id=doctor_id)} == {new}
+    finally:
+        doctor.department_id = old
+        db.session.commit()
+
+def test_rebuild_matches_the_incremental_index(ctx, open_day):
+    doctor_id, day = open_day
+    book_slot(patient_id(), doctor_id, day, time(9, 30))
+    before = free(doctor_id, day)
+    rebuild_slot_index()
+    assert free(doctor_id, day) == before == [t for t in MORNING if t != time(9, 30)]
+
+def earliest(client, department_id, **args):
+    query = '&'.join(f'{key}={value}' for key, value in args.items())
+    return client.get(f'/departments/{department_id}/earliest-slots?{query}')
+
+@pytest.fixture
+def two_doctors(open_day):
+    # Dr. Iyer shares dr.sharma's department; her window starts off the
+    # half hour so the two doctors' slots interleave.
+    doctor_id, day = open_day
+    with app.app_context():
+        sharma = db.session.get(Doctor, doctor_id)
+        iyer = Doctor.query.filter_by(full_name='Dr. Aditi Iyer').one()
+        db.session.add(DoctorAvailability(doctor_id=iyer.id, date=day, start_time=time(9, 15), end_time=time(10, 15)))
+        db.session.commit()
+        return sharma.department_id, sharma.id, iyer.id, day
+
+def test_earliest_slots_merge_doctors_in_time_order(patient_client, two_doctors):
+    department_id, sharma, iyer, day = two_doctors
+    body = earliest(patient_client, department_id, start=day, end=day, limit=5).get_json()
+    assert [(s['time'], s['doctor_id']) for s in body['slots']] == [
+        ('09:00', sharma), ('09:15', iyer), ('09:30', sharma), ('09:45', iyer), ('10:00', sharma)]
+    assert body['slots'][1]['doctor_name'] == 'Dr. Aditi Iyer'
+    assert body['slots'][0]['book_url'] == f'/patient/book-appointment/{sharma}'
+
+def test_booked_and_cancelled_slots(patient_client, two_doctors):
+    department_id, sharma, iyer, day = two_doctors
+    with app.app_context():
+        appointment_id = book_slot(patient_id(), iyer, day, time(9, 15)).id
+    times = [s['time'] for s in earliest(patient_client, department_id, start=day, end=day).get_json()['slots']]
+    assert '09:15' not in times and '09:45' in times
+
+    patient_client.post(f'/patient/appointment/{appointment_id}/cancel')
+    times = [s['time'] for s in earliest(patient_client, department_id, start=day, end=day).get_json()['slots']]
+    assert times[:4] == ['09:00', '09:15', '09:30', '09:45']
+
+def test_earliest_slots_clamp_their_arguments(patient_client, two_doctors):
+    department_id, _, _, day = two_doctors
+    today = date.today()
+    body = earliest(patient_client, department_id, start='2000-01-01', end='2999-01-01', limit=1000).get_json()
+    assert body['start'] == today.isoformat()
+    assert body['end'] == (today + timedelta(days=31)).isoformat()
+    assert len(body['slots']) <= 50
+    assert len(earliest(patient_client, department_id, start=day, end=day, limit=0).get_json()['slots']) == 1
+    default = earliest(patient_client, department_id, start=day).get_json()
+    # open_day hands out ever later days, so the week after `day` holds only its two windows.
+    assert default['end'] == (day + timedelta(days=7)).isoformat() and len(default['slots']) == 8
+
+@pytest.mark.parametrize('args', [{'start': 'soon'}, {'end': '2030-13-01'}, {'limit': 'ten'}])
+def test_earliest_slots_reject_malformed_arguments(patient_client, args):
+    response = earliest(patient_client, 1, **args)
+    assert response.status_code == 400 and 'error' in response.get_json()
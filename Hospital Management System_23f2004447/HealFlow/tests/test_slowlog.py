@@ -0,0 +1,35 @@
+import os
+import pytest
+from sqlalchemy import text
+import slowlog
+from models import db
+
+@pytest.fixture
+def restore_log():
+    handlers, path = slowlog.logger.handlers, slowlog._settings['path']
+    yield
+    for handler in slowlog.logger.handlers:
+        handler.close()
+    slowlog.logger.handlers, slowlog._settings['path'] = handlers, path
+
+def test_bare_filename_logs_to_working_directory(tmp_path, monkeypatch, restore_log):
+    monkeypatch.chdir(tmp_path)
+    slowlog.open_log('slow.log')
+    slowlog.logger.warning('{"statement": "SELECT 1", "duration_ms": 1, "endpoint": "x"}')
+    assert os.path.exists(tmp_path / 'slow.log')
+    assert slowlog.read_entries()[0]['statement'] == 'SELECT 1'
+
+def test_nested_directory_is_created(tmp_path, restore_log):
+    slowlog.open_log(str(tmp_path / 'logs' / 'slow.log'))
+    assert (tmp_path / 'logs').is_dir()
+
+def test_explain_plans_the_statement(ctx):
+    plan = slowlog.explain(db.session.connection(), 'SELECT id FROM patients', {})
+    assert plan and not plan[0].startswith('EXPLAIN failed')
+
+def test_failed_explain_keeps_the_transaction_usable(ctx):
+    conn = db.session.connection()
+    conn.execute(text('SELECT 1'))
+    plan = slowlog.explain(conn, 'SELECT no_such_column FROM patients', {})
+    assert plan[0].startswith('EXPLAIN failed')
+    assert conn.execute(text('SELECT count(*) FROM patients')).scalar() > 0
@@ -0,0 +1,120 @@
+import pytest
+import typeahead
+from app import app
+from typeahead import PrefixIndex, name_keys, suggest_doctors, suggest_patients, refresh_indexes
+from models import db, User, Doctor, Patient
+
+def index_of(rows):
+    index = PrefixIndex()
+    index.rebuild(lambda: [(row_id, name_keys(name)) for row_id, name in rows])
+    return index
+
+def test_lookup_matches_word_prefixes_in_key_order():
+    index = index_of([(3, 'Dr. Raghav Sharma'), (1, 'Dr. Priya Sharan'), (2, 'Shaan Rao')])
+    # "dr priya sharan" < "dr raghav sharma" < "shaan rao" < "sharan" < "sharma"
+    assert index.lookup('sha', 10) == [2, 1, 3]
+    assert index.lookup('Raghav Sh', 10) == [3]
+    assert index.lookup('dr', 10) == [1, 3]
+    assert index.lookup('sha', 2) == [2, 1]
+    assert index.lookup('  ', 10) == [] and index.lookup('zzz', 10) == []
+
+def test_upsert_and_remove():
+    index = index_of([(1, 'Riya Shah'), (2, 'Diya Menon')])
+    index.upsert(1, name_keys('Riya Kapoor'))
+    assert index.lookup('shah', 10) == [] and index.lookup('kap', 10) == [1]
+    index.remove(2)
+    assert index.lookup('diya', 10) == [] and len(index) == 1
+    index.upsert(7, name_keys('Diya Nair'))
+    assert index.lookup('diya', 10) == [7] and index.max_id == 7
+
+def test_rebuild_replays_changes_made_while_loading():
+    index = index_of([(1, 'Riya Shah')])
+
+    def load():
+        # A commit in this process lands while the rows are being read.
+        index.upsert(2, name_keys('Tanmaya Rao'))
+        index.remove(1)
+        return [(1, name_keys('Riya Shah'))]
+
+    index.rebuild(load)
+    assert index.lookup('tan', 10) == [2] and index.lookup('riya', 10) == []
+
+def test_catch_up_loads_newer_rows_only():
+    loads = []
+    index = PrefixIndex()
+
+    def load(since):
+        loads.append(since)
+        return [(5, name_keys('Aayushi Chopra'))]
+
+    index.catch_up(load)
+    assert loads == []  # nothing to catch up before the first build
+    index.rebuild(lambda: [(4, name_keys('Diya Menon'))])
+    index.catch_up(load)
+    assert loads == [4] and index.lookup('aay', 10) == [5] and index.max_id == 5
+
+def rebuild():
+    with app.app_context():
+        refresh_indexes()
+
+@pytest.fixture
+def indexes(database):
+    # No app context is held open: requests made by the test client would
+    # share its g, and with it the logged-in user.
+    rebuild()
+    yield
+    rebuild()
+
+def test_committed_rename_is_suggested_without_a_rebuild(indexes, ctx):
+    built_at = typeahead.doctor_index.built_at
+    doctor = Doctor.query.filter_by(full_name='Dr. Manav Singh').one()
+    doctor.full_name = 'Dr. Manav Sodhi'
+    db.session.commit()
+    try:
+        assert [d['name'] for d in suggest_doctors('sodhi')] == ['Dr. Manav Sodhi']
+        assert suggest_doctors('manav singh') == []
+        assert typeahead.doctor_index.built_at == built_at
+    finally:
+        doctor.full_name = 'Dr. Manav Singh'
+        db.session.commit()
+
+def test_rolled_back_rename_is_not_indexed(indexes, ctx):
+    Doctor.query.filter_by(full_name='Dr. Manav Singh').one().full_name = 'Dr. Manav Rollback'
+    db.session.flush()
+    db.session.rollback()
+    assert suggest_doctors('rollback') == []
+    assert [d['name'] for d in suggest_doctors('manav')] == ['Dr. Manav Singh']
+
+def test_rows_from_other_workers_are_caught_up(indexes, ctx):
+    # Core inserts skip the session events, like a commit in another process.
+    user_id = db.session.execute(db.insert(User).values(
+        username='pt.catchup', email='pt.catchup@example.com', password_hash='x', role='patient'
+    ).returning(User.id)).scalar()
+    patient_id = db.session.execute(db.insert(Patient).values(
+        user_id=user_id, full_name='Zubin Catchup', phone='555-9999'
+    ).returning(Patient.id)).scalar()
+    db.session.commit()
+    try:
+        assert suggest_patients('zubin') == [{'id': patient_id, 'name': 'Zubin Catchup', 'phone': '555-9999'}]
+        assert [p['id'] for p in suggest_patients('5559999')] == [patient_id]
+    finally:
+        db.session.execute(db.delete(Patient).where(Patient.id == patient_id))
+        db.session.execute(db.delete(User).where(User.id == user_id))
+        db.session.commit()
+
+def test_doctor_endpoint(patient_client, indexes):
+    results = patient_client.get('/typeahead/doctors?q=sharma').get_json()['results']
+    assert results[0]['name'] == 'Dr. Raghav Sharma' and results[0]['department'] == 'Cardiology'
+    assert len(patient_client.get('/typeahead/doctors?q=dr&limit=2').get_json()['results']) == 2
+    with app.app_context():
+        doctors = Doctor.query.count()
+    assert len(patient_client.get('/typeahead/doctors?q=dr&limit=500').get_json()['results']) == min(
+        doctors, typeahead.MAX_LIMIT)
+    response = patient_client.get('/typeahead/doctors?q=dr&limit=abc')
+    assert response.status_code == 400 and 'limit' in response.get_json()['error']
+
+def test_patient_endpoint_is_admin_only(patient_client, admin_client, indexes):
+    response = patient_client.get('/typeahead/patients?q=parth')
+    assert response.status_code == 403 and response.get_json() == {'error': 'Admin privileges required'}
+    assert admin_client.get('/typeahead/patients?q=parth').get_json()['results'][0]['name'] == 'Parth Joshi'
+    assert admin_client.get('/typeahead/patients?q=parth&limit=abc').status_code == 400
@@ -0,0 +1,114 @@
+from datetime import date, time, timedelta
+import pytest
+import app as views
+from app import app
+from booking import book_slot
+from catalog import OPEN_STATUS
+from database import write_transaction
+from models import db, User, Doctor, Patient, Department, Appointment, DoctorAvailability, LabTest, LabBooking
+from conftest import login, patient_id
+
+# Every view that writes must go through write_transaction (the SQLite
+# single-writer path); the recorder counts how often each request used it.
+
+@pytest.fixture
+def writes(monkeypatch):
+    calls = []
+
+    def recording(work, *args, **kwargs):
+        calls.append(work.__name__)
+        return write_transaction(work, *args, **kwargs)
+
+    monkeypatch.setattr(views, 'write_transaction', recording)
+    return calls
+
+def post(client, url, data=None):
+    response = client.post(url, data=data or {})
+    assert response.status_code == 302, response.data[:500]
+    return response
+
+def profile(**overrides):
+    data = {'full_name': 'Write Path', 'phone': '9800000000', 'date_of_birth': '1990-01-01', 'gender': 'Other'}
+    data.update(overrides)
+    return data
+
+def test_register(client, writes):
+    post(client, '/register', profile(username='write.path', email='write.path@example.com',
+                                      password='secret123', confirm_password='secret123'))
+    assert writes == ['create_patient']
+    response = client.post('/register', data=profile(username='write.path', email='other@example.com',
+                                                      password='secret123', confirm_password='secret123'))
+    assert b'already exists' in response.data and len(writes) == 2
+    with app.app_context():
+        assert User.query.filter_by(username='write.path').count() == 1
+
+def test_admin_department_and_catalog(admin_client, writes):
+    post(admin_client, '/admin/department/add', {'name': 'Write Path Dept'})
+    post(admin_client, '/admin/lab-catalog/test/add', {'test-name': 'Write Path Test', 'test-price': '120'})
+    post(admin_client, '/admin/lab-catalog/package/add', {'package-name': 'Write Path Package', 'package-price': '900'})
+    with app.app_context():
+        test_id = LabTest.query.filter_by(name='Write Path Test').one().id
+    post(admin_client, f'/admin/lab-catalog/test/{test_id}', {'price': '150', 'active': 'on'})
+    assert writes == ['create_department', 'create_test', 'create_package', 'update_item']
+    with app.app_context():
+        assert Department.query.filter_by(name='Write Path Dept').count() == 1
+        assert db.session.get(LabTest, test_id).price == 150
+
+def test_admin_doctor_lifecycle(admin_client, writes):
+    with app.app_context():
+        department_id = Department.query.first().id
+    doctor = {'username': 'dr.writepath', 'email': 'dr.writepath@example.com', 'full_name': 'Dr. Write Path',
+              'department_id': department_id, 'phone': '9800000001', 'qualification': 'MBBS',
+              'experience_years': '3', 'consultation_fee': '500'}
+    post(admin_client, '/admin/doctor/add', doctor)
+    with app.app_context():
+        doctor_id = Doctor.query.filter_by(full_name='Dr. Write Path').one().id
+    post(admin_client, f'/admin/doctor/edit/{doctor_id}', dict(doctor, full_name='Dr. Written Path'))
+    post(admin_client, f'/admin/doctor/delete/{doctor_id}')
+    assert writes == ['create_doctor', 'save_doctor', 'delete_doctor']
+    with app.app_context():
+        assert db.session.get(Doctor, doctor_id) is None
+
+def test_admin_delete_patient(admin_client, writes):
+    with app.app_context():
+        user = User(username='delete.me', email='delete.me@example.com', role='patient', password_hash='-')
+        db.session.add(Patient(user=user, full_name='Delete Me'))
+        db.session.commit()
+        removed = patient_id('delete.me')
+    post(admin_client, f'/admin/patient/delete/{removed}')
+    assert writes == ['delete_patient']
+
+def test_cancel_appointments(doctor_client, patient_client, open_day, writes):
+    doctor_id, day = open_day
+    with app.app_context():
+        first = book_slot(patient_id(), doctor_id, day, time(9)).id
+        second = book_slot(patient_id(), doctor_id, day, time(10)).id
+    post(doctor_client, f'/doctor/appointment/{first}/cancel')
+    post(patient_client, f'/patient/appointment/{second}/cancel')
+    assert writes == ['cancel', 'cancel']
+    with app.app_context():
+        assert {a.status for a in Appointment.query.filter(Appointment.id.in_([first, second]))} == {'Cancelled'}
+
+def test_doctor_availability_and_patient_profile(doctor_client, patient_client, writes):
+    day = date.today() + timedelta(days=4500)
+    post(doctor_client, '/doctor/availability', {'date': day.isoformat(), 'start_time': '09:00', 'end_time': '10:00'})
+    post(patient_client, '/patient/profile', profile(full_name='Parth Joshi', email='parth.joshi@example.com'))
+    assert writes == ['add_availability', 'save_profile']
+    with app.app_context():
+        assert DoctorAvailability.query.filter_by(date=day).count() == 1
+
+def test_cart(patient_client, writes):
+    with app.app_context():
+        tests = [t.id for t in LabTest.query.filter_by(active=True).order_by(LabTest.id).limit(2)]
+    post(patient_client, '/patient/add-lab-test', {'test_id': tests[0]})
+    with app.app_context():
+        booking_id = LabBooking.query.filter_by(patient_id=patient_id(), status=OPEN_STATUS).order_by(
+            LabBooking.id.desc()).first().id
+    post(patient_client, f'/patient/remove-lab-test/{booking_id}')
+    with app.app_context():
+        assert db.session.get(LabBooking, booking_id) is None
+    post(patient_client, '/patient/add-lab-test', {'test_id': tests[1]})
+    post(patient_client, '/patient/cart/checkout')
+    assert writes == ['<lambda>', 'remove_booking', '<lambda>', '<lambda>']
+    with app.app_context():
+        assert LabBooking.query.filter_by(patient_id=patient_id(), status=OPEN_STATUS).count() == 0
@@ -0,0 +1,220 @@
+import bisect
+import heapq
+import re
+import threading
+import time as clock
+from sqlalchemy import event
+from models import db, Doctor, Patient, Department
+
+TYPEAHEAD_MAX_AGE = 300
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+SORT_CHUNK = 20000
+
+def normalize(text):
+    return ' '.join(re.findall(r'[a-z0-9]+', (text or '').lower()))
+
+def name_keys(name):
+    # Every word suffix of the name, so "sha" and "raghav sh" both hit
+    # "Dr. Raghav Sharma".
+    words = normalize(name).split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+class PrefixIndex:
+    # A sorted array of (key, id) pairs; a prefix lookup is one bisect plus
+    # a short forward scan. Single rows are inserted/removed with insort.
+    # Full rebuilds run on the background refresher thread only; lookups keep
+    # using the current array until the new one is swapped in.
+    def __init__(self):
+        self._entries = []
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+        self._catching_up = threading.Lock()
+        self._pending = None
+        self.built_at = 0
+        self.max_id = 0
+
+    def rebuild(self, load):
+        # Changes committed in this process while `load` runs are queued and
+        # replayed onto the new array, so the swap never loses them.
+        with self._lock:
+            self._pending = []
+        try:
+            rows = load()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        chunks, chunk, keys_by_id, max_id = [], [], {}, 0
+        for row_id, keys in rows:
+            keys_by_id[row_id] = keys
+            chunk.extend((key, row_id) for key in keys)
+            max_id = max(max_id, row_id)
+            if len(chunk) >= SORT_CHUNK:
+                chunks.append(sorted(chunk))
+                chunk = []
+        chunks.append(sorted(chunk))
+        # One big list.sort() holds the GIL for seconds at a million rows and
+        # stalls every request thread; small sorts plus a (pure Python)
+        # heapq.merge let the interpreter switch threads throughout.
+        entries = list(heapq.merge(*chunks))
+        with self._lock:
+            pending, self._pending = self._pending, None
+            self._entries, self._keys_by_id = entries, keys_by_id
+            self.max_id = max_id
+            for row_id, keys in pending:
+                self._apply(row_id, keys)
+            self.built_at = clock.monotonic()
+
+    def _remove(self, row_id):
+        for key in self._keys_by_id.pop(row_id, ()):
+            i = bisect.bisect_left(self._entries, (key, row_id))
+            if i < len(self._entries) and self._entries[i] == (key, row_id):
+                del self._entries[i]
+
+    def _apply(self, row_id, keys):
+        self._remove(row_id)
+        if keys is not None:
+            self._keys_by_id[row_id] = keys
+            for key in keys:
+                bisect.insort(self._entries, (key, row_id))
+            self.max_id = max(self.max_id, row_id)
+
+    def upsert(self, row_id, keys):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((row_id, keys))
+            self._apply(row_id, keys)
+
+    def remove(self, row_id):
+        self.upsert(row_id, None)
+
+    def catch_up(self, load):
+        # Rows other workers inserted since the last look (an indexed
+        # id > max_id range query). One thread at a time; the others just
+        # read the index as it is.
+        if not self.built_at or not self._catching_up.acquire(blocking=False):
+            return
+        try:
+            for row_id, keys in load(self.max_id):
+                self.upsert(row_id, keys)
+        finally:
+            self._catching_up.release()
+
+    def lookup(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        found = []
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (prefix,))
+            while i < len(self._entries) and len(found) < limit:
+                key, row_id = self._entries[i]
+                if not key.startswith(prefix):
+                    break
+                if row_id not in found:
+                    found.append(row_id)
+                i += 1
+        return found
+
+    def __len__(self):
+        return len(self._keys_by_id)
+
+def _doctor_keys(full_name):
+    return name_keys(full_name)
+
+def _patient_keys(full_name, phone):
+    keys = name_keys(full_name)
+    digits = re.sub(r'\D', '', phone or '')
+    if digits:
+        keys.append(digits)
+    return keys
+
+doctor_index = PrefixIndex()
+patient_index = PrefixIndex()
+
+def _load_doctors(since=0):
+    rows = db.session.query(Doctor.id, Doctor.full_name).filter(Doctor.id > since)
+    return [(row_id, _doctor_keys(name)) for row_id, name in rows]
+
+def _load_patients(since=0):
+    rows = db.session.query(Patient.id, Patient.full_name, Patient.phone).filter(Patient.id > since)
+    return [(row_id, _patient_keys(name, phone)) for row_id, name, phone in rows]
+
+def _fresh(index, loader):
+    index.catch_up(loader)
+    return index
+
+def refresh_indexes():
+    doctor_index.rebuild(_load_doctors)
+    patient_index.rebuild(_load_patients)
+
+def _refresh_forever(app, interval):
+    # Full rebuilds pick up renames and deletes made by other workers.
+    while True:
+        with app.app_context():
+            try:
+                refresh_indexes()
+            except Exception:
+                app.logger.exception('typeahead index rebuild failed')
+            finally:
+                db.session.remove()
+        clock.sleep(interval)
+
+def _limit(limit):
+    return max(1, min(limit or DEFAULT_LIMIT, MAX_LIMIT))
+
+def suggest_doctors(prefix, limit=DEFAULT_LIMIT):
+    ids = _fresh(doctor_index, _load_doctors).lookup(prefix, _limit(limit))
+    if not ids:
+        return []
+    # Re-read the few matched rows so a doctor deleted or renamed in another
+    # worker never shows up with stale data.
+    rows = {row.id: row for row in db.session.query(Doctor.id, Doctor.full_name, Department.name.label('department'))
+            .join(Department).filter(Doctor.id.in_(ids))}
+    return [{'id': i, 'name': rows[i].full_name, 'department': rows[i].department} for i in ids if i in rows]
+
+def suggest_patients(prefix, limit=DEFAULT_LIMIT):
+    ids = _fresh(patient_index, _load_patients).lookup(prefix, _limit(limit))
+    if not ids:
+        return []
+    rows = {row.id: row for row in db.session.query(Patient.id, Patient.full_name, Patient.phone).filter(Patient.id.in_(ids))}
+    return [{'id': i, 'name': rows[i].full_name, 'phone': rows[i].phone} for i in ids if i in rows]
+
+def _collect_changes(session, flush_context):
+    changes = session.info.setdefault('typeahead_changes', [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Doctor):
+            changes.append((doctor_index, obj.id, _doctor_keys(obj.full_name)))
+        elif isinstance(obj, Patient):
+            changes.append((patient_index, obj.id, _patient_keys(obj.full_name, obj.phone)))
+    for obj in session.deleted:
+        if isinstance(obj, (Doctor, Patient)):
+            changes.append((doctor_index if isinstance(obj, Doctor) else patient_index, obj.id, None))
+
+def _apply_changes(session):
+    for index, row_id, keys in session.info.pop('typeahead_changes', []):
+        index.upsert(row_id, keys)
+
+def _discard_changes(session):
+    session.info.pop('typeahead_changes', None)
+
+def init_typeahead(app):
+    event.listen(db.session, 'after_flush', _collect_changes)
+    event.listen(db.session, 'after_commit', _apply_changes)
+    event.listen(db.session, 'after_rollback', _discard_changes)
+    refresher = []
+    starting = threading.Lock()
+
+    @app.before_request
+    def start_refresher():
+        # Started by the worker's first request (not at import, so scripts
+        # that import app never spawn it). Until the first build finishes,
+        # suggestions are empty rather than blocking a request on the build.
+        if not refresher and app.config.get('TYPEAHEAD_BACKGROUND', True):
+            with starting:
+                if not refresher:
+                    thread = threading.Thread(target=_refresh_forever, daemon=True, name='typeahead-refresh',
+                                              args=(app, app.config.get('TYPEAHEAD_MAX_AGE', TYPEAHEAD_MAX_AGE)))
+                    thread.start()
+                    refresher.append(thread)